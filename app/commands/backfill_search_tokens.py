@@ -0,0 +1,52 @@
+"""Add search_tokens to messages inserted before full-text search existed.
+
+    python -m app.commands.backfill_search_tokens [--tenant <tenant_id>] [--all] [--batch-size 1000]
+
+--all recomputes the tokens of every message, e.g. after the tokenizer changed.
+
+Archived (cold) messages are not searchable.
+"""
+import argparse
+import asyncio
+import logging
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from app.db.mongo_connection import messages_collection
+from app.utils.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+async def main(args) -> None:
+    query = {"content.text": {"$type": "string"}}
+    if not args.all:
+        query["search_tokens"] = {"$exists": False}
+    if args.tenant:
+        query["tenant_id"] = ObjectId(args.tenant)
+
+    ops, updated = [], 0
+    async for msg in messages_collection.find(query, {"content.text": 1}).batch_size(args.batch_size):
+        ops.append(UpdateOne({"_id": msg["_id"]}, {"$set": {"search_tokens": tokenize(msg["content"]["text"])}}))
+        if len(ops) >= args.batch_size:
+            await messages_collection.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+            logger.info("Indexed %d messages", updated)
+    if ops:
+        await messages_collection.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    logger.info("Backfill done: %d messages indexed", updated)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenant", help="Only backfill this tenant")
+    parser.add_argument("--all", action="store_true", help="Recompute tokens of messages that already have them")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,40 @@
+"""Move old messages into compressed per-conversation, per-day archive buckets.
+
+    python -m app.commands.compact_messages --tenant <tenant_id>
+    python -m app.commands.compact_messages --all
+
+Uses the same batching and pacing as the background job (COMPACTION_* env vars).
+"""
+import argparse
+import asyncio
+import logging
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+from bson.objectid import ObjectId
+from app.db.mongo_connection import tenants_collection
+from app.services.compaction import compact_tenant, compact_all
+
+logger = logging.getLogger(__name__)
+
+
+async def main(args) -> None:
+    if args.all:
+        moved = await compact_all()
+    else:
+        tenant = await tenants_collection.find_one({"_id": ObjectId(args.tenant)}, {"_id": 1, "settings": 1})
+        if not tenant:
+            raise SystemExit(f"Tenant {args.tenant} not found")
+        moved = await compact_tenant(tenant)
+    logger.info("Moved %d messages to cold storage", moved)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--tenant", help="Tenant id to compact")
+    target.add_argument("--all", action="store_true", help="Compact every tenant")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,45 @@
+"""Regenerate dashboard stats rollups from raw messages.
+
+    python -m app.commands.rebuild_stats --tenant <tenant_id> [--since 2025-01-01]
+    python -m app.commands.rebuild_stats --all
+
+Rollups for the selected range are deleted and recomputed. Messages inserted
+while the rebuild runs may be counted twice, so run it during a quiet period.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+from bson.objectid import ObjectId
+from app.db.mongo_connection import tenants_collection
+from app.services.stats import rebuild_stats
+
+logger = logging.getLogger(__name__)
+
+
+async def main(args) -> None:
+    since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+    if args.all:
+        tenant_ids = [t["_id"] async for t in tenants_collection.find({}, {"_id": 1})]
+    else:
+        tenant_ids = [ObjectId(args.tenant)]
+
+    for tenant_id in tenant_ids:
+        scanned = await rebuild_stats(tenant_id, since=since, batch_size=args.batch_size)
+        logger.info("Rebuilt stats for tenant %s from %d messages", tenant_id, scanned)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--tenant", help="Tenant id to rebuild")
+    target.add_argument("--all", action="store_true", help="Rebuild every tenant")
+    parser.add_argument("--since", help="Only rebuild buckets from this day (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,441 @@
+"""Record real inbound traffic and replay it through the webhook handler.
+
+    python -m app.commands.replay export traffic.jsonl.gz [--tenant <tenant_id>] [--since 2025-01-01] [--until ...] [--limit N]
+    python -m app.commands.replay export traffic.jsonl.gz --webhooks captured.jsonl
+    DB_NAME=whatsapp_ai_replay python -m app.commands.replay run traffic.jsonl.gz --speed 10 --out a.jsonl
+    python -m app.commands.replay diff a.jsonl b.jsonl
+
+export writes inbound text messages (from `messages`, or from a file of
+captured webhook bodies, one per line, either raw or {"received_at": <unix>,
+"body": {...}}) with their arrival times, plus the tenants and knowledge
+chunks they need. Sender numbers are replaced by stable pseudonyms unless
+--keep-numbers; message text is kept as is, so treat the file like the
+database. Archived (cold) messages are not exported.
+
+run drops and reseeds the database named by DB_NAME (it must contain
+"replay" or "bench", or pass --force), then feeds each message to
+handle_incoming_message as its own webhook: at the recorded pace (--speed 1),
+N times faster (--speed N) or as fast as possible (--speed 0, keeping each
+sender's messages in order, --concurrency senders at a time). Replies are
+never sent to WhatsApp: --send capture (default) records them in-process,
+--send forward also posts them to WHATSAPP_API_URL, which must not be the
+Graph API (point it at benchmarks.fakes.serve to include send latency).
+AI calls go wherever GROQ_API_URL points. The summary has throughput and
+latency; --out keeps each message's latency and replies for diff.
+
+diff compares two run outputs message by message: replies that changed,
+went missing or appeared, and the latency percentiles of both.
+"""
+import os
+import json
+import gzip
+import time
+import random
+import asyncio
+import difflib
+import hashlib
+import argparse
+import logging
+from contextvars import ContextVar
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+# handle_incoming_message needs some WhatsApp configuration; tenants carry their own tokens
+os.environ.setdefault("WHATSAPP_TOKEN", "replay-token")
+
+from bson import json_util
+from bson.objectid import ObjectId
+from app.db import mongo_connection
+from app.db.mongo_connection import (
+    db, tenants_collection, contacts_collection, messages_collection, kb_chunks_collection, ensure_indexes,
+)
+from app.services import replies
+from app.services.scheduler import _percentile
+from app.services.usage import usage_buffer
+from app.services.stats import stats_buffer
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Tenant fields that never leave the database
+_SECRET_FIELDS = ("access_token", "access_token_enc", "verify_token_enc", "password", "phone_e164_enc")
+_JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+# The replayed message a reply belongs to, set around each handle_incoming_message call
+_replaying: ContextVar[Optional[Dict[str, Any]]] = ContextVar("replaying", default=None)
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _write(f, record: Dict[str, Any]) -> None:
+    f.write(json_util.dumps(record, json_options=_JSON_OPTIONS, separators=(",", ":")) + "\n")
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    return {f"p{q}_ms": round(1000 * _percentile(samples, q / 100), 1) for q in (50, 95, 99)}
+
+
+class _Pseudonyms:
+    """Stable fake numbers for real senders; the salt is not written out, so they can't be reversed."""
+
+    def __init__(self, keep: bool):
+        self.keep = keep
+        self.salt = os.urandom(16)
+        self.known: Dict[str, str] = {}
+
+    def __call__(self, sender: str) -> str:
+        if self.keep:
+            return sender
+        fake = self.known.get(sender)
+        if fake is None:
+            digest = hashlib.sha256(self.salt + sender.encode()).digest()
+            fake = self.known[sender] = "99" + str(int.from_bytes(digest[:8], "big") % 10**10).zfill(10)
+        return fake
+
+
+async def _export_messages(args, out, pseudonym, tenant_ids: set) -> int:
+    query: Dict[str, Any] = {"direction": "inbound", "content.text": {"$type": "string"}}
+    if args.tenant:
+        query["tenant_id"] = ObjectId(args.tenant)
+    if args.since or args.until:
+        query["created_at"] = {}
+        if args.since:
+            query["created_at"]["$gte"] = datetime.fromisoformat(args.since)
+        if args.until:
+            query["created_at"]["$lt"] = datetime.fromisoformat(args.until)
+    projection = {"tenant_id": 1, "contact_id": 1, "wa_message_id": 1, "content.text": 1, "created_at": 1}
+    cursor = messages_collection.find(query, projection).sort("created_at", 1).batch_size(args.batch_size)
+    if args.limit:
+        cursor = cursor.limit(args.limit)
+
+    phone_number_ids: Dict[Any, Optional[str]] = {}
+    senders: Dict[Any, Optional[str]] = {}
+    written = 0
+    first: Optional[datetime] = None
+
+    async def flush(batch: List[Dict[str, Any]]) -> None:
+        nonlocal written, first
+        missing = list({m["contact_id"] for m in batch if m.get("contact_id") not in senders})
+        async for c in contacts_collection.find({"_id": {"$in": missing}}, {"wa_phone_hash": 1}):
+            senders[c["_id"]] = c.get("wa_phone_hash")
+        for m in batch:
+            tenant_id = m.get("tenant_id")
+            if tenant_id not in phone_number_ids:
+                tenant = await tenants_collection.find_one({"_id": tenant_id}, {"phone_number_id": 1})
+                phone_number_ids[tenant_id] = (tenant or {}).get("phone_number_id")
+            sender, phone_number_id = senders.get(m.get("contact_id")), phone_number_ids[tenant_id]
+            if not sender or not phone_number_id:
+                continue
+            first = first or m["created_at"]
+            tenant_ids.add(tenant_id)
+            _write(out, {
+                "kind": "message",
+                "t": round((m["created_at"] - first).total_seconds(), 3),
+                "pn": phone_number_id,
+                "from": pseudonym(sender),
+                "id": m.get("wa_message_id") or f"wamid.REPLAY{written:012d}",
+                "text": m["content"]["text"],
+            })
+            written += 1
+
+    batch: List[Dict[str, Any]] = []
+    async for m in cursor:
+        batch.append(m)
+        if len(batch) >= args.batch_size:
+            await flush(batch)
+            batch = []
+            logger.info("Exported %d messages", written)
+    if batch:
+        await flush(batch)
+    return written
+
+
+async def _export_webhooks(args, out, pseudonym, tenant_ids: set) -> int:
+    records = []
+    with _open(args.webhooks, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            captured = json.loads(line)
+            body = captured.get("body", captured) if "entry" not in captured else captured
+            received_at = captured.get("received_at")
+            for m in replies._extract_messages(body):
+                text = replies._extract_user_message(m)
+                if not text or not m.get("from") or not m.get("phone_number_id"):
+                    continue
+                at = float(received_at if received_at is not None else m.get("timestamp") or 0)
+                records.append((at, m["phone_number_id"], m["from"], m.get("id"), text))
+    records.sort(key=lambda r: r[0])
+
+    phone_number_ids = {r[1] for r in records}
+    async for t in tenants_collection.find({"phone_number_id": {"$in": list(phone_number_ids)}}, {"_id": 1}):
+        tenant_ids.add(t["_id"])
+    first = records[0][0] if records else 0.0
+    for i, (at, phone_number_id, sender, message_id, text) in enumerate(records[:args.limit or None]):
+        _write(out, {
+            "kind": "message",
+            "t": round(at - first, 3),
+            "pn": phone_number_id,
+            "from": pseudonym(sender),
+            "id": message_id or f"wamid.REPLAY{i:012d}",
+            "text": text,
+        })
+    return min(len(records), args.limit or len(records))
+
+
+async def export(args) -> None:
+    pseudonym = _Pseudonyms(args.keep_numbers)
+    tenant_ids: set = set()
+    with _open(args.file, "w") as out:
+        _write(out, {"kind": "replay", "version": FORMAT_VERSION, "exported_at": datetime.now(),
+                     "source": "webhooks" if args.webhooks else "messages"})
+        if args.webhooks:
+            count = await _export_webhooks(args, out, pseudonym, tenant_ids)
+        else:
+            count = await _export_messages(args, out, pseudonym, tenant_ids)
+
+        async for tenant in tenants_collection.find({"_id": {"$in": list(tenant_ids)}}):
+            _write(out, {"kind": "tenant", "doc": {k: v for k, v in tenant.items() if k not in _SECRET_FIELDS}})
+        chunks = 0
+        if not args.no_knowledge:
+            tenant_keys = [str(t) for t in tenant_ids]
+            async for business in db.businesses.find({"tenant_id": {"$in": tenant_keys}}):
+                _write(out, {"kind": "business", "doc": business})
+            async for chunk in kb_chunks_collection.find({"tenant_id": {"$in": tenant_keys}}, {"tenant_id": 1, "document_id": 1, "text": 1, "tokens": 1}):
+                _write(out, {"kind": "kb_chunk", "doc": chunk})
+                chunks += 1
+    logger.info("Exported %d messages from %d tenants (%d knowledge chunks) to %s", count, len(tenant_ids), chunks, args.file)
+
+
+def load(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    records: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                record = json_util.loads(line)
+                records[record.get("kind")].append(record)
+    header = (records.get("replay") or [{}])[0]
+    if header.get("version") != FORMAT_VERSION:
+        raise SystemExit(f"{path} is not a replay file (version {header.get('version')!r})")
+    records["message"].sort(key=lambda m: m["t"])
+    return records
+
+
+async def _seed(records: Dict[str, List[Dict[str, Any]]]) -> None:
+    await mongo_connection.client.drop_database(mongo_connection.DB_NAME)
+    await ensure_indexes()
+    tenants = [dict(r["doc"], access_token="replay-token") for r in records["tenant"]]
+    if tenants:
+        await tenants_collection.insert_many(tenants)
+    if records["business"]:
+        await db.businesses.insert_many([r["doc"] for r in records["business"]])
+    if records["kb_chunk"]:
+        await kb_chunks_collection.insert_many([r["doc"] for r in records["kb_chunk"]], ordered=False)
+
+
+def _webhook(message: Dict[str, Any]) -> Dict[str, Any]:
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"phone_number_id": message["pn"]},
+        "contacts": [{"wa_id": message["from"]}],
+        "messages": [{"from": message["from"], "id": message["id"], "timestamp": str(int(time.time())),
+                      "type": "text", "text": {"body": message["text"]}}],
+    }
+    return {"object": "whatsapp_business_account", "entry": [{"id": "replay", "changes": [{"field": "messages", "value": value}]}]}
+
+
+def _install_sender(mode: str, latency: float):
+    """Replace the Graph API call used for every reply with one that records it (and forwards it in forward mode)."""
+    forward = replies.send_message
+    captured = {"sent": 0}
+
+    async def send_message(phone_number_id, to, payload, access_token, api_url):
+        result = _replaying.get()
+        if result is not None:
+            result["replies"].append((payload.get("text") or {}).get("body"))
+        captured["sent"] += 1
+        if mode == "forward":
+            return await forward(phone_number_id, to, payload, access_token, api_url)
+        if latency:
+            await asyncio.sleep(latency)
+        return {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.REPLAYOUT{captured['sent']:012d}"}]}
+
+    replies.send_message = send_message
+    return captured
+
+
+async def _replay_one(message: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+    result = {"id": message["id"], "pn": message["pn"], "from": message["from"], "text": message["text"], "replies": []}
+    token = _replaying.set(result)
+    started = time.perf_counter()
+    try:
+        await replies.handle_incoming_message(_webhook(message))
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        result["latency_ms"] = round(1000 * (time.perf_counter() - started), 1)
+        _replaying.reset(token)
+        results.append(result)
+
+
+async def run(args) -> None:
+    if not any(word in mongo_connection.DB_NAME for word in ("replay", "bench")) and not args.force:
+        raise SystemExit(f"Refusing to drop database {mongo_connection.DB_NAME!r}; set DB_NAME to a *replay* database or use --force")
+    if args.send == "forward" and "graph.facebook.com" in replies.WHATSAPP_API_URL:
+        raise SystemExit("--send forward would message real customers; point WHATSAPP_API_URL at a fake Graph API")
+
+    records = load(args.file)
+    messages = records["message"][:args.limit or None]
+    if args.max_gap:
+        # Squeeze idle stretches (nights, weekends) down to --max-gap seconds
+        shift, last = 0.0, 0.0
+        for m in messages:
+            shift += max(0.0, m["t"] - last - args.max_gap)
+            last = m["t"]
+            m["t"] -= shift
+    await _seed(records)
+    captured = _install_sender(args.send, args.send_latency_ms / 1000)
+    usage_buffer.start()
+    stats_buffer.start()
+    logger.info("Replaying %d messages from %d tenants into %s", len(messages), len(records["tenant"]), mongo_connection.DB_NAME)
+
+    results: List[Dict[str, Any]] = []
+    lags: List[float] = []
+    started = time.perf_counter()
+    if args.speed > 0:
+        tasks = []
+        for m in messages:
+            delay = started + m["t"] / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # How far behind the recording the replayer itself is running
+            lags.append(max(0.0, time.perf_counter() - started - m["t"] / args.speed))
+            tasks.append(asyncio.create_task(_replay_one(m, results)))
+        await asyncio.gather(*tasks)
+    else:
+        by_sender: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for m in messages:
+            by_sender[(m["pn"], m["from"])].append(m)
+        queue: asyncio.Queue = asyncio.Queue()
+        for conversation in by_sender.values():
+            queue.put_nowait(conversation)
+
+        async def worker():
+            while not queue.empty():
+                for m in queue.get_nowait():
+                    await _replay_one(m, results)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+    elapsed = time.perf_counter() - started
+
+    await usage_buffer.stop()
+    await stats_buffer.stop()
+
+    latencies = [r["latency_ms"] / 1000 for r in results]
+    summary = {
+        "messages": len(results),
+        "elapsed_s": round(elapsed, 2),
+        "recorded_s": round(messages[-1]["t"], 2) if messages else 0,
+        "speed": args.speed or "max",
+        "messages_per_s": round(len(results) / elapsed, 2) if elapsed else None,
+        "latency": _percentiles(latencies),
+        "dispatch_lag": _percentiles(lags) if lags else None,
+        "replied": sum(1 for r in results if r["replies"]),
+        "no_reply": sum(1 for r in results if not r["replies"]),
+        "errors": sum(1 for r in results if "error" in r),
+        "sent": captured["sent"],
+    }
+    if args.out:
+        with _open(args.out, "w") as f:
+            for r in sorted(results, key=lambda r: r["id"]):
+                _write(f, r)
+    print(json.dumps(summary, indent=2))
+
+
+def _load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    with _open(path, "r") as f:
+        return {r["id"]: r for r in (json.loads(line) for line in f if line.strip())}
+
+
+def diff(args) -> None:
+    a, b = _load_results(args.a), _load_results(args.b)
+    counts: Dict[str, int] = defaultdict(int)
+    similarity: List[float] = []
+    examples: List[Dict[str, Any]] = []
+    for message_id in sorted(a.keys() & b.keys()):
+        reply_a, reply_b = " ".join(a[message_id]["replies"]), " ".join(b[message_id]["replies"])
+        if reply_a == reply_b:
+            counts["same"] += 1
+            continue
+        if not reply_b:
+            counts["lost_reply"] += 1
+        elif not reply_a:
+            counts["new_reply"] += 1
+        else:
+            counts["changed"] += 1
+            similarity.append(difflib.SequenceMatcher(None, reply_a, reply_b).ratio())
+        examples.append({"id": message_id, "text": a[message_id]["text"], "a": reply_a, "b": reply_b})
+    counts["only_in_a"] = len(a.keys() - b.keys())
+    counts["only_in_b"] = len(b.keys() - a.keys())
+    rng = random.Random(0)
+    report = {
+        "compared": len(a.keys() & b.keys()),
+        **counts,
+        "mean_similarity_of_changed": round(sum(similarity) / len(similarity), 3) if similarity else None,
+        "latency_a": _percentiles([r["latency_ms"] / 1000 for r in a.values()]),
+        "latency_b": _percentiles([r["latency_ms"] / 1000 for r in b.values()]),
+        "examples": rng.sample(examples, min(args.show, len(examples))),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("export", help="Write inbound messages to a replay file")
+    p.add_argument("file", help="Replay file to write (.gz to compress)")
+    p.add_argument("--webhooks", help="Export from this file of captured webhook bodies instead of the messages collection")
+    p.add_argument("--tenant", help="Only this tenant's messages")
+    p.add_argument("--since", help="Messages from this time (ISO date or datetime)")
+    p.add_argument("--until", help="Messages before this time (ISO date or datetime)")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--keep-numbers", action="store_true", help="Keep real sender numbers instead of pseudonyms")
+    p.add_argument("--no-knowledge", action="store_true", help="Leave out the tenants' knowledge base chunks")
+    p.add_argument("--batch-size", type=int, default=1000)
+
+    p = commands.add_parser("run", help="Replay a file through the webhook handler")
+    p.add_argument("file")
+    p.add_argument("--speed", type=float, default=1.0, help="1 = recorded pace, N = N times faster, 0 = as fast as possible")
+    p.add_argument("--concurrency", type=int, default=20, help="Senders replayed at once with --speed 0")
+    p.add_argument("--max-gap", type=float, default=0, help="Shorten recorded gaps longer than this many seconds")
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--send", choices=("capture", "forward"), default="capture")
+    p.add_argument("--send-latency-ms", type=float, default=0, help="Simulated Graph API latency in capture mode")
+    p.add_argument("--out", help="Write each message's latency and replies here, for diff")
+    p.add_argument("--force", action="store_true", help="Allow a DB_NAME without 'replay' or 'bench' in it (it is dropped)")
+    p.add_argument("--verbose", action="store_true", help="Keep the app's INFO logs")
+
+    p = commands.add_parser("diff", help="Compare the replies and latency of two runs")
+    p.add_argument("a")
+    p.add_argument("b")
+    p.add_argument("--show", type=int, default=10, help="Changed replies to print")
+
+    args = parser.parse_args()
+    if args.command == "diff":
+        diff(args)
+    elif args.command == "export":
+        asyncio.run(export(args))
+    else:
+        if not args.verbose:
+            logging.getLogger("app").setLevel(logging.WARNING)
+        asyncio.run(run(args))
@@ -0,0 +1,105 @@
+"""Run the API for production: uvloop + httptools, one worker per available core, graceful drain.
+
+    python -m app.commands.serve [--host 0.0.0.0] [--port 8000] [--workers N]
+
+Workers default to WEB_CONCURRENCY, else the cores this process may use
+(CPU affinity and the container's cgroup CPU quota, rounded up). Each worker
+is a separate process with its own event loop, Mongo client, HTTP pool and
+caches, set up in the app's lifespan. uvloop and httptools are used when
+installed, otherwise uvicorn's asyncio loop and h11 parser.
+
+On SIGTERM/SIGINT a worker stops accepting connections, answers webhooks
+that still arrive with 503 (Meta redelivers them) and /health with 503,
+waits up to SHUTDOWN_DRAIN_SECONDS for in-flight webhooks, then flushes
+usage/stats buffers and traces and closes its clients.
+"""
+import os
+import math
+import argparse
+import logging
+import importlib.util
+
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv())
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from app.utils.inflight import webhooks_in_flight, SHUTDOWN_DRAIN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """Cores this process can actually use: affinity mask, capped by a cgroup (v2 or v1) CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0 and period > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that starts turning webhooks away as soon as the stop signal arrives."""
+
+    def handle_exit(self, sig, frame) -> None:
+        webhooks_in_flight.begin_drain()
+        super().handle_exit(sig, frame)
+
+
+def main(args) -> None:
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    config = uvicorn.Config(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        # The app configures logging itself (app/utils/logging_config.py); uvicorn's records go through it
+        log_config=None,
+        access_log=args.access_log,
+        proxy_headers=True,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=SHUTDOWN_DRAIN_SECONDS,
+    )
+    server = DrainingServer(config)
+    logger.info("Serving on %s:%d with %d workers (%s, %s)", args.host, args.port, args.workers, loop, http)
+    if args.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 0)) or available_cpus())
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE_SECONDS", 5)),
+                        help="Seconds an idle client connection is kept open")
+    parser.add_argument("--access-log", action="store_true", help="Log every request (the metrics already count them)")
+    main(parser.parse_args())
@@ -1,8 +1,13 @@
 import json
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from pathlib import Path
 
+DEFAULT_CONTEXT_PREAMBLE = (
+    "Business information relevant to the customer's message. Use it for prices, stock and policies; "
+    "if the answer is not here, say you will check with the team instead of guessing."
+)
+
 class PromptLoader:
     """Utility class to load and cache prompt configurations from JSON files."""
     
@@ -43,8 +48,17 @@ class PromptLoader:
         config = self.load_config()
         return config.get("api_config", {})
     
-    def build_messages(self, user_message: str) -> List[Dict[str, str]]:
-        """Build the complete messages array for the API request."""
+    def get_context_preamble(self) -> str:
+        """Get the instruction placed above retrieved knowledge-base chunks."""
+        config = self.load_config()
+        return config.get("context_preamble", DEFAULT_CONTEXT_PREAMBLE)
+    
+    def build_messages(self, user_message: str, context: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """Build the complete messages array for the API request.
+        
+        Retrieved knowledge-base chunks (`context`) go after the static system
+        prompt and examples so that prefix stays identical across requests.
+        """
         messages = []
         
         # Add system prompt
@@ -59,6 +73,13 @@ class PromptLoader:
         examples = self.get_conversation_examples()
         messages.extend(examples)
         
+        # Add business knowledge relevant to this message
+        if context:
+            messages.append({
+                "role": "system",
+                "content": self.get_context_preamble() + "\n\n" + "\n\n".join(f"- {c}" for c in context)
+            })
+        
         # Add current user message
         messages.append({
             "role": "user",
@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 import logging
 from typing import Optional
+from app.utils.query_accounting import MONGO_QUERY_ACCOUNTING, query_listener
 
 load_dotenv()
 
@@ -13,7 +14,11 @@ DB_NAME = os.getenv("DB_NAME")
 if not DB_NAME:
     raise ValueError("DB_NAME environment variable is not set")
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+# Created at import because every service binds its collections at import time. Each uvicorn
+# worker imports the app in its own process, so workers still get separate clients and pools;
+# the app lifespan closes it on shutdown.
+# Every command is attributed to the request or trace that issued it (see app/utils/query_accounting.py)
+client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI, event_listeners=[query_listener] if MONGO_QUERY_ACCOUNTING else [])
 db = client[DB_NAME]
 
 # Collections following the requested design
@@ -21,6 +26,13 @@ tenants_collection = db["tenants"]
 contacts_collection = db["contacts"]
 conversations_collection = db["conversations"]
 messages_collection = db["messages"]
+usage_daily_collection = db["usage_daily"]
+stats_rollups_collection = db["stats_rollups"]
+messages_archive_collection = db["messages_archive"]
+kb_documents_collection = db["kb_documents"]
+kb_chunks_collection = db["kb_chunks"]
+kb_indexes_collection = db["kb_indexes"]
+timers_collection = db["timers"]
 
 # Backwards compatibility alias (existing code expects users_collection)
 users_collection = tenants_collection
@@ -45,10 +57,15 @@ async def ensure_indexes() -> None:
         await conversations_collection.create_index([("tenant_id", 1), ("contact_id", 1), ("channel", 1)])
         await conversations_collection.create_index([("tenant_id", 1), ("status", 1), ("last_message_at", -1)])
         await conversations_collection.create_index([("tenant_id", 1), ("last_message_at", -1)])
+        # Cheap ETag validator for dashboard reads
+        await conversations_collection.create_index([("tenant_id", 1), ("updated_at", -1)])
 
         # Messages indexes
         await messages_collection.create_index([("tenant_id", 1), ("conversation_id", 1), ("created_at", -1)])
         await messages_collection.create_index([("tenant_id", 1), ("contact_id", 1), ("created_at", -1)])
+        await messages_collection.create_index([("tenant_id", 1), ("created_at", -1)])
+        # Tenant-scoped inverted index: one multikey entry per (tenant, token), newest first
+        await messages_collection.create_index([("tenant_id", 1), ("search_tokens", 1), ("created_at", -1)])
 
         # Ensure uniqueness for wa_message_id but only when it exists.
         # Previous implementation enforced uniqueness even when wa_message_id was null,
@@ -77,6 +94,27 @@ async def ensure_indexes() -> None:
 
         await messages_collection.create_index([("tenant_id", 1), ("status", 1), ("created_at", -1)])
 
+        # Cold storage: one compressed bucket per conversation per day
+        await messages_archive_collection.create_index([("tenant_id", 1), ("conversation_id", 1), ("day", 1)], unique=True)
+        await messages_archive_collection.create_index([("tenant_id", 1), ("day", 1)])
+
+        # Usage rollups: one document per tenant per day
+        await usage_daily_collection.create_index([("tenant_id", 1), ("day", 1)], unique=True)
+
+        # Dashboard stats rollups: one document per tenant per hour/day bucket
+        await stats_rollups_collection.create_index([("tenant_id", 1), ("granularity", 1), ("bucket", 1)], unique=True)
+
+        # Knowledge base: documents and their chunks per tenant (kb_indexes is keyed by tenant)
+        await kb_documents_collection.create_index([("tenant_id", 1), ("created_at", -1)])
+        await kb_chunks_collection.create_index([("tenant_id", 1), ("document_id", 1)])
+
+        # Persisted timers (session expiry, follow-ups): loaded into the in-process wheel by due time
+        await timers_collection.create_index([("due_at", 1)])
+        await timers_collection.create_index(
+            [("tenant_id", 1), ("conversation_id", 1), ("kind", 1)],
+            partialFilterExpression={"kind": "followup"}
+        )
+
         logger.info("MongoDB indexes ensured")
     except Exception as e:
         logger.exception(f"Failed to ensure MongoDB indexes: {e}")
@@ -1,23 +1,103 @@
+import logging
+from contextlib import asynccontextmanager, AsyncExitStack
+
 from dotenv import load_dotenv, find_dotenv
 
 # Find and load the .env file
 dotenv_path = find_dotenv()
 load_dotenv(dotenv_path)
 
+from app.utils.logging_config import setup_logging, stop_logging
+
+# Everything below logs through the queue-backed JSON pipeline
+setup_logging()
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.message import message_router
 from app.routes.user import user_router
-from app.db.mongo_connection import ensure_indexes
+from app.db.mongo_connection import client as mongo_client, ensure_indexes
 from app.routes.business import business_router
 from app.routes.conversations import conversations_router
 from app.routes.dashboard import dashboard_router
+from app.routes.metrics import metrics_router
+from app.routes.debug import debug_router
+from app.routes.health import health_router
+from app.services.usage import usage_buffer
+from app.services.stats import stats_buffer
+from app.services.compaction import start_compaction, stop_compaction
+from app.services.events import start_event_fanout, stop_event_fanout
+from app.services.timers import start_timers, stop_timers
+from app.services.user import auth_pool
+from app.utils.metrics import MetricsMiddleware
+from app.utils.tracing import trace_exporter
+from app.utils.loop_monitor import loop_monitor, LOOP_MONITOR_ENABLED
+from app.utils.profiler import slow_request_profiler
+from app.utils.query_accounting import MONGO_QUERY_ACCOUNTING, QueryAccountingMiddleware
+from app.utils.http_client import get_client, close_client
+from app.utils.inflight import webhooks_in_flight, SHUTDOWN_DRAIN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+async def _drain_webhooks() -> None:
+    # New webhooks get 503 (Meta redelivers them); the ones being processed get until the deadline
+    left = await webhooks_in_flight.drain(SHUTDOWN_DRAIN_SECONDS)
+    if left:
+        logger.warning("Shutting down with %d webhooks still in flight after %.0fs", left, SHUTDOWN_DRAIN_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker resources and background tasks; on shutdown, drain webhooks and flush buffers before closing.
+
+    Each component's stop is registered as soon as it has started, so a
+    failure part-way through startup still stops what was already running.
+    Shutdown runs in reverse: webhooks drain first, logging stops last.
+    """
+    async with AsyncExitStack() as stack:
+        stack.callback(stop_logging)
+        stack.callback(mongo_client.close)
+        # Ensure MongoDB indexes are created on startup
+        try:
+            await ensure_indexes()
+        except Exception:
+            # ensure_indexes logs exceptions internally; don't crash startup here
+            pass
+
+        # One pooled client per worker for Groq and the Graph API
+        get_client()
+        stack.push_async_callback(close_client)
+        trace_exporter.start()
+        stack.push_async_callback(trace_exporter.stop)
+        # Flush buffered usage and stats counters so they aren't lost on restart
+        usage_buffer.start()
+        stack.push_async_callback(usage_buffer.stop)
+        stats_buffer.start()
+        stack.push_async_callback(stats_buffer.stop)
+        start_compaction()
+        stack.push_async_callback(stop_compaction)
+        start_event_fanout()
+        stack.push_async_callback(stop_event_fanout)
+        stack.callback(auth_pool.shutdown, wait=False)
+        await start_timers()
+        stack.push_async_callback(stop_timers)
+        if LOOP_MONITOR_ENABLED:
+            loop_monitor.start()
+        stack.push_async_callback(loop_monitor.stop)
+        slow_request_profiler.start()
+        stack.callback(slow_request_profiler.stop)
+        stack.push_async_callback(_drain_webhooks)
+
+        yield
+
 
 app = FastAPI(
     title="WhatsApp AI Assistant",
     description="A scalable FastAPI backend for auto-replying to WhatsApp messages using AI.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Allow all origins for local development
@@ -28,12 +108,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if MONGO_QUERY_ACCOUNTING:
+    app.add_middleware(QueryAccountingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content={"message": exc.detail},
+        headers=getattr(exc, "headers", None),
     )
 
 app.include_router(message_router)
@@ -41,13 +125,6 @@ app.include_router(user_router)
 app.include_router(business_router)
 app.include_router(conversations_router)
 app.include_router(dashboard_router)
-
-
-@app.on_event("startup")
-async def startup_event():
-    # Ensure MongoDB indexes are created on startup
-    try:
-        await ensure_indexes()
-    except Exception:
-        # ensure_indexes logs exceptions internally; don't crash startup here
-        pass
\ No newline at end of file
+app.include_router(metrics_router)
+app.include_router(debug_router)
+app.include_router(health_router)
@@ -1,8 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional
 
 class Business(BaseModel):
     business_name: str
     business_type: str
     email: str
     owner_name: str
+
+class KnowledgeDocument(BaseModel):
+    title: str
+    kind: Literal["faq", "catalogue", "text"] = "faq"
+    # Free text (FAQ paragraphs, or one catalogue item per line) and/or structured catalogue items
+    content: Optional[str] = Field(None, max_length=2_000_000)
+    items: Optional[List[Dict[str, Any]]] = Field(None, max_length=50_000)
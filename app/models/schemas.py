@@ -88,6 +88,53 @@ class MessageModel(BaseModel):
         from_attributes = True
         validate_by_name = True
 
+class MessageListItem(BaseModel):
+    """Compact message row returned by list endpoints; extra fields appear when requested with ?fields=."""
+    id: str
+    conversation_id: Optional[str] = None
+    contact_id: Optional[str] = None
+    direction: Optional[str] = None
+    wa_type: Optional[str] = None
+    content: Optional[Dict[str, Any]] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        extra = "allow"
+
+class ContactSummary(BaseModel):
+    id: str
+    display_name: Optional[str] = None
+    wa_phone_hash: Optional[str] = None
+
+    class Config:
+        extra = "allow"
+
+class ConversationListItem(BaseModel):
+    """Compact conversation row for the conversation list."""
+    id: str
+    contact_id: Optional[str] = None
+    mode: Optional[str] = None
+    status: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    contact_info: Optional[ContactSummary] = None
+    last_message: Optional[MessageListItem] = None
+
+    class Config:
+        extra = "allow"
+
+class FollowupCreate(BaseModel):
+    text: str = Field(..., min_length=1, max_length=4096)
+    send_at: Optional[datetime] = None
+    delay_minutes: Optional[int] = Field(None, ge=1, le=60 * 24 * 30)
+
+class HandoffRequest(BaseModel):
+    idle_minutes: Optional[int] = Field(None, ge=1, le=60 * 24)
+
+class AgentReplyRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=4096)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends
-from app.models.business import Business
+from bson.objectid import ObjectId
+from app.models.business import Business, KnowledgeDocument
 from app.db.mongo_connection import db
+from app.services.knowledge import add_document, delete_document, list_documents
+from app.utils.helpers import serialize_doc
 from app.utils.auth import get_current_tenant
-from app.utils.auth import TokenData
+from app.utils.auth import TenantContext
 
 business_router = APIRouter(prefix="/business", tags=["Business"])
 
 @business_router.post("/add")
-async def add_business(business: Business, current_tenant: TokenData = Depends(get_current_tenant)):
+async def add_business(business: Business, current_tenant: TenantContext = Depends(get_current_tenant)):
     business_data = business.model_dump()
     business_data["tenant_id"] = current_tenant.tenant_id
     
@@ -18,10 +21,33 @@ async def add_business(business: Business, current_tenant: TokenData = Depends(g
     raise HTTPException(status_code=500, detail="Failed to add business")
 
 @business_router.get("/")
-async def get_business(current_tenant: TokenData = Depends(get_current_tenant)):
+async def get_business(current_tenant: TenantContext = Depends(get_current_tenant)):
     collection = db.businesses
     business = await collection.find_one({"tenant_id": current_tenant.tenant_id})
     if business:
         business["_id"] = str(business["_id"])
         return business
-    raise HTTPException(status_code=404, detail="Business not found")
\ No newline at end of file
+    raise HTTPException(status_code=404, detail="Business not found")
+
+@business_router.post("/knowledge")
+async def add_knowledge_document(document: KnowledgeDocument, current_tenant: TenantContext = Depends(get_current_tenant)):
+    if not document.content and not document.items:
+        raise HTTPException(status_code=400, detail="Provide content or items")
+    business = await db.businesses.find_one({"tenant_id": current_tenant.tenant_id}, {"_id": 1})
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+
+    doc = await add_document(current_tenant.tenant_id, document.title, document.kind, document.content, document.items)
+    return {"message": "Document indexed successfully", "id": str(doc["_id"]), "chunks": doc["chunk_count"]}
+
+@business_router.get("/knowledge")
+async def get_knowledge_documents(current_tenant: TenantContext = Depends(get_current_tenant)):
+    return [serialize_doc(d) for d in await list_documents(current_tenant.tenant_id)]
+
+@business_router.delete("/knowledge/{document_id}")
+async def delete_knowledge_document(document_id: str, current_tenant: TenantContext = Depends(get_current_tenant)):
+    if not ObjectId.is_valid(document_id):
+        raise HTTPException(status_code=400, detail="Invalid document id")
+    if not await delete_document(current_tenant.tenant_id, ObjectId(document_id)):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"message": "Document deleted successfully"}
@@ -1,72 +1,185 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from typing import List, Optional
 from app.db.mongo_connection import db
-from app.utils.auth import get_current_tenant, TokenData
+from app.utils.auth import get_current_tenant, TenantContext
 from bson.objectid import ObjectId
+from app.services.messages import find_conversation_messages
+from app.services.conversations import latest_conversation_update
+from app.utils.http_cache import conditional_json
+from app.models.schemas import ConversationListItem, MessageListItem, FollowupCreate, HandoffRequest, AgentReplyRequest
+from app.services.handoff import take_over, release, agent_reply, SessionWindowClosed
+from app.services.replies import MessageProcessingError
+from app.services.conversations import is_session_open
+from app.services.followups import schedule_followup, list_followups, cancel_followup
 from app.utils.helpers import serialize_doc
+from datetime import datetime, timedelta
+from app.utils.projections import (
+    parse_fields, build_projection, FIELDS_DESCRIPTION,
+    MESSAGE_LIST_FIELDS, MESSAGE_DETAIL_FIELDS,
+    CONVERSATION_LIST_FIELDS, CONVERSATION_DETAIL_FIELDS,
+    CONTACT_SUMMARY_FIELDS, LAST_MESSAGE_SUMMARY_FIELDS,
+)
 
 conversations_router = APIRouter(prefix="/conversations", tags=["Conversations"])
 
-@conversations_router.get("/")
-async def get_conversations(current_tenant: TokenData = Depends(get_current_tenant)):
-    tenant_id = ObjectId(current_tenant.tenant_id)
-    
+@conversations_router.get("/", response_model=List[ConversationListItem])
+async def get_conversations(
+    request: Request,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    tenant_id = current_tenant.oid
+    extra = parse_fields(fields, CONVERSATION_DETAIL_FIELDS)
+
+    # Full contact / last message documents only when asked for
+    contact_pipeline = [] if "contact_info" in extra else [{"$project": build_projection(CONTACT_SUMMARY_FIELDS)}]
+    last_message_projection = [] if "last_message" in extra else [{"$project": build_projection(LAST_MESSAGE_SUMMARY_FIELDS)}]
+    conversation_fields = extra - {"contact_info", "last_message"}
+
     pipeline = [
         {"$match": {"tenant_id": tenant_id}},
+        {"$sort": {"last_message_at": -1}},
+        {"$project": build_projection(CONVERSATION_LIST_FIELDS, conversation_fields)},
         {
             "$lookup": {
                 "from": "contacts",
                 "localField": "contact_id",
                 "foreignField": "_id",
+                "pipeline": contact_pipeline,
                 "as": "contact_info"
             }
         },
         {"$unwind": "$contact_info"},
         {
+            # Only the newest message per conversation, instead of joining the whole history
             "$lookup": {
                 "from": "messages",
-                "localField": "_id",
-                "foreignField": "conversation_id",
-                "as": "messages"
+                "let": {"conv_id": "$_id"},
+                "pipeline": [
+                    {"$match": {"tenant_id": tenant_id, "$expr": {"$eq": ["$conversation_id", "$$conv_id"]}}},
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": 1},
+                    *last_message_projection,
+                ],
+                "as": "last_message"
             }
         },
-        {
-            "$addFields": {
-                "last_message": {"$last": "$messages"}
-            }
-        },
-        {
-            "$project": {
-                "messages": 0  # Exclude the full messages array
-            }
-        }
+        {"$unwind": {"path": "$last_message", "preserveNullAndEmptyArrays": True}},
     ]
     
-    conversations = await db.conversations.aggregate(pipeline).to_list(length=None)
-    
-    return [serialize_doc(conv) for conv in conversations]
+    async def build():
+        return await db.conversations.aggregate(pipeline).to_list(length=None)
 
-@conversations_router.get("/{conversation_id}/messages")
+    # 304 / cached body without running the aggregation when nothing changed
+    validator = await latest_conversation_update(tenant_id)
+    return await conditional_json(request, current_tenant.tenant_id, validator, build)
+
+@conversations_router.get("/{conversation_id}/messages", response_model=List[MessageListItem])
 async def get_messages(
+    request: Request,
     conversation_id: str,
-    current_tenant: TokenData = Depends(get_current_tenant),
+    current_tenant: TenantContext = Depends(get_current_tenant),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ):
-    tenant_id = ObjectId(current_tenant.tenant_id)
+    tenant_id = current_tenant.oid
+    projection = build_projection(MESSAGE_LIST_FIELDS, parse_fields(fields, MESSAGE_DETAIL_FIELDS))
     
     # First, verify that the conversation belongs to the tenant
     conversation = await db.conversations.find_one(
-        {"_id": ObjectId(conversation_id), "tenant_id": tenant_id}
+        {"_id": ObjectId(conversation_id), "tenant_id": tenant_id},
+        {"_id": 1, "updated_at": 1}
     )
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    messages = (
-        await db.messages.find({"conversation_id": ObjectId(conversation_id)})
-        .sort("created_at", 1)
-        .skip(offset)
-        .limit(limit)
-        .to_list(length=limit)
-    )
-    
-    return [serialize_doc(msg) for msg in messages]
+    async def build():
+        return await find_conversation_messages(tenant_id, conversation["_id"], skip=offset, limit=limit, projection=projection)
+
+    return await conditional_json(request, current_tenant.tenant_id, conversation.get("updated_at"), build)
+
+async def _get_conversation(conversation_id: str, tenant_id: ObjectId, projection: Optional[dict] = None):
+    if not ObjectId.is_valid(conversation_id):
+        raise HTTPException(status_code=400, detail="Invalid conversation id")
+    conversation = await db.conversations.find_one({"_id": ObjectId(conversation_id), "tenant_id": tenant_id}, projection)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+@conversations_router.post("/{conversation_id}/followups")
+async def create_followup(
+    conversation_id: str,
+    followup: FollowupCreate,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+):
+    tenant_id = current_tenant.oid
+    conversation = await _get_conversation(conversation_id, tenant_id)
+
+    if followup.send_at is not None:
+        send_at = followup.send_at
+        if send_at.tzinfo is not None:
+            # Stored datetimes are naive local time
+            send_at = send_at.astimezone().replace(tzinfo=None)
+    elif followup.delay_minutes is not None:
+        send_at = datetime.now() + timedelta(minutes=followup.delay_minutes)
+    else:
+        raise HTTPException(status_code=400, detail="Provide send_at or delay_minutes")
+    if send_at <= datetime.now():
+        raise HTTPException(status_code=400, detail="send_at must be in the future")
+
+    result = await schedule_followup(conversation, followup.text, send_at, created_by=current_tenant.tenant_id)
+    # Free-form follow-ups are only delivered while the customer's 24h session window is open
+    result["session_window_expires_at"] = conversation.get("session_window_expires_at")
+    result["session_open_at_send"] = is_session_open(conversation, send_at)
+    return serialize_doc(result)
+
+@conversations_router.get("/{conversation_id}/followups")
+async def get_followups(conversation_id: str, current_tenant: TenantContext = Depends(get_current_tenant)):
+    tenant_id = current_tenant.oid
+    conversation = await _get_conversation(conversation_id, tenant_id, {"_id": 1})
+    return serialize_doc(await list_followups(tenant_id, conversation["_id"]))
+
+@conversations_router.delete("/{conversation_id}/followups/{followup_id}")
+async def delete_followup(conversation_id: str, followup_id: str, current_tenant: TenantContext = Depends(get_current_tenant)):
+    tenant_id = current_tenant.oid
+    await _get_conversation(conversation_id, tenant_id, {"_id": 1})
+    if not ObjectId.is_valid(followup_id) or not await cancel_followup(tenant_id, ObjectId(followup_id)):
+        raise HTTPException(status_code=404, detail="Follow-up not found")
+    return {"message": "Follow-up cancelled"}
+
+def _handoff_view(conversation: dict) -> dict:
+    return serialize_doc({"id": conversation["_id"], "mode": conversation.get("mode"), "handoff": conversation.get("handoff")})
+
+@conversations_router.post("/{conversation_id}/takeover")
+async def takeover_conversation(
+    conversation_id: str,
+    request: Optional[HandoffRequest] = None,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+):
+    conversation = await _get_conversation(conversation_id, current_tenant.oid)
+    conversation = await take_over(conversation, agent=current_tenant.tenant_id, idle_minutes=request.idle_minutes if request else None)
+    return _handoff_view(conversation)
+
+@conversations_router.post("/{conversation_id}/release")
+async def release_conversation(conversation_id: str, current_tenant: TenantContext = Depends(get_current_tenant)):
+    conversation = await _get_conversation(conversation_id, current_tenant.oid)
+    return _handoff_view(await release(conversation))
+
+@conversations_router.post("/{conversation_id}/reply")
+async def reply_to_conversation(
+    conversation_id: str,
+    reply: AgentReplyRequest,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+):
+    conversation = await _get_conversation(conversation_id, current_tenant.oid)
+    try:
+        message = await agent_reply(conversation, reply.text, agent=current_tenant.tenant_id)
+    except SessionWindowClosed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except MessageProcessingError:
+        # The conversation's tenant or contact record is gone
+        raise HTTPException(status_code=404, detail="Conversation contact not found")
+    if message.get("status") != "sent":
+        raise HTTPException(status_code=502, detail="Failed to send WhatsApp message")
+    return serialize_doc(message)
@@ -1,9 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
-from app.db.mongo_connection import db
-from app.utils.auth import get_current_tenant, TokenData
-from bson.objectid import ObjectId
-from typing import List
-from app.models.schemas import MessageModel
+from app.utils.auth import get_current_tenant, TenantContext
+from typing import Optional
+from fastapi.responses import StreamingResponse
+from app.services.events import event_stream
+from app.services.scheduler import ai_scheduler
+from app.services.usage import get_usage
+from app.services.stats import get_stats
+from app.services.search import search_messages, InvalidCursor
+from app.utils.helpers import FastJSONResponse, rename_ids
+from datetime import datetime, timedelta
 
 dashboard_router = APIRouter(
     prefix="/tenants",
@@ -11,27 +16,93 @@ dashboard_router = APIRouter(
     dependencies=[Depends(get_current_tenant)]
 )
 
-@dashboard_router.get("/{tenant_id}/messages", response_model=List[MessageModel])
-async def get_tenant_messages(
+def _naive_local(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive local time; an aware query value (e.g. "...Z") is converted to match."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+@dashboard_router.get("/{tenant_id}/ai/queue")
+async def get_tenant_ai_queue(
+    tenant_id: str,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+):
+    if tenant_id != current_tenant.tenant_id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this tenant's queue")
+
+    stats = ai_scheduler.stats(tenant_id).get(tenant_id)
+    if stats is None:
+        stats = {"queued": 0, "running": 0, "submitted": 0, "completed": 0, "rejected": 0}
+    return {"tenant_id": tenant_id, "in_flight_total": ai_scheduler.in_flight(), **stats}
+
+
+@dashboard_router.get("/{tenant_id}/usage")
+async def get_tenant_usage(
+    tenant_id: str,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="First day (YYYY-MM-DD), defaults to 30 days before end"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="Last day (YYYY-MM-DD), defaults to today"),
+):
+    """AI token usage and latency per day. Counters are flushed in batches, so today's numbers can lag slightly."""
+    if tenant_id != current_tenant.tenant_id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this tenant's usage")
+
+    usage = await get_usage(current_tenant.oid, start, end)
+    return {"tenant_id": tenant_id, **usage}
+
+
+@dashboard_router.get("/{tenant_id}/stats")
+async def get_tenant_stats(
     tenant_id: str,
-    current_tenant: TokenData = Depends(get_current_tenant),
-    limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
+    current_tenant: TenantContext = Depends(get_current_tenant),
+    start: Optional[datetime] = Query(None, description="Range start, defaults to 7 days before end"),
+    end: Optional[datetime] = Query(None, description="Range end (exclusive), defaults to now"),
+    granularity: str = Query("day", pattern="^(hour|day)$"),
 ):
+    """Message volume, response times and active contacts (estimated, about 3% error) served from pre-aggregated rollups."""
     if tenant_id != current_tenant.tenant_id:
-        raise HTTPException(status_code=403, detail="Not authorized to access this tenant's messages")
-
-    messages = (
-        await db.messages.find({"tenant_id": ObjectId(tenant_id)})
-        .sort("created_at", -1)
-        .skip(offset)
-        .limit(limit)
-        .to_list(length=limit)
+        raise HTTPException(status_code=403, detail="Not authorized to access this tenant's stats")
+
+    end = _naive_local(end) or datetime.now()
+    start = _naive_local(start) or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    stats = await get_stats(current_tenant.oid, start, end, granularity)
+    return {"tenant_id": tenant_id, **stats}
+
+
+@dashboard_router.get("/{tenant_id}/events")
+async def stream_tenant_events(
+    tenant_id: str,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+):
+    """Server-sent events stream of new messages for the tenant's dashboard."""
+    if tenant_id != current_tenant.tenant_id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this tenant's events")
+
+    return StreamingResponse(
+        event_stream(tenant_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    
-    for msg in messages:
-        msg["_id"] = str(msg["_id"])
-        msg["conversation_id"] = str(msg["conversation_id"])
-        msg["tenant_id"] = str(msg["tenant_id"])
 
-    return messages
+
+@dashboard_router.get("/{tenant_id}/search")
+async def search_tenant_messages(
+    tenant_id: str,
+    current_tenant: TenantContext = Depends(get_current_tenant),
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    """Ranked full-text search over the tenant's message history (English, Hinglish and Devanagari)."""
+    if tenant_id != current_tenant.tenant_id:
+        raise HTTPException(status_code=403, detail="Not authorized to search this tenant's messages")
+
+    try:
+        result = await search_messages(current_tenant.oid, q, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(rename_ids(result))
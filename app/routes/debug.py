@@ -0,0 +1,121 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+from app.utils.auth import require_admin
+from app.utils.helpers import FastJSONResponse
+from app.utils.loop_monitor import loop_monitor
+from app.utils.query_accounting import flagged_scopes
+from app.utils.profiler import PROFILE_MAX_SECONDS, Profile, ProfilerBusy, profile, slow_request_profiler
+from app.utils.tracing import slowest_traces, trace_buffer, trace_exporter
+
+debug_router = APIRouter(prefix="/debug", tags=["Debug"], dependencies=[Depends(require_admin)])
+
+
+class LoopMonitorUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    threshold_ms: Optional[float] = Field(None, gt=0)
+    interval_ms: Optional[float] = Field(None, gt=0)
+
+
+class SlowProfileUpdate(BaseModel):
+    threshold_ms: float = Field(..., ge=0, description="Keep profiles of traces slower than this; 0 turns slow-request mode off")
+
+PROFILE_FORMAT = Query("collapsed", pattern="^(collapsed|json)$", description="collapsed (flamegraph.pl/speedscope) or json summary")
+
+
+def _render_profile(result: Profile, format: str, include_idle: bool):
+    if format == "json":
+        return FastJSONResponse(result.to_dict(include_idle=include_idle))
+    return PlainTextResponse(result.collapsed(include_idle=include_idle))
+
+
+@debug_router.get("/traces/slowest")
+async def get_slowest_traces(
+    limit: int = Query(20, ge=1, le=200),
+    name: Optional[str] = Query(None, description="Only traces whose root span has this name, e.g. whatsapp.message"),
+):
+    """The slowest traces still held in the in-memory ring buffer, with their spans."""
+    return FastJSONResponse({
+        "buffered": min(trace_buffer.written, trace_buffer.capacity),
+        "exported": trace_exporter.exported,
+        "dropped": trace_exporter.dropped,
+        "traces": slowest_traces(limit, name),
+    })
+
+
+@debug_router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    for trace in trace_buffer.recent():
+        if trace.root.trace_hex == trace_id:
+            return FastJSONResponse(trace.to_dict())
+    raise HTTPException(status_code=404, detail="Trace not found (it may have been evicted from the buffer)")
+
+
+@debug_router.get("/loop")
+async def get_loop_monitor():
+    """Loop lag percentiles and the stacks captured during recent stalls, newest first."""
+    return FastJSONResponse(loop_monitor.snapshot(stacks=True))
+
+
+@debug_router.post("/loop")
+async def update_loop_monitor(update: LoopMonitorUpdate):
+    """Turn the loop monitor on or off, or change its threshold, without a restart."""
+    loop_monitor.configure(
+        threshold_ms=update.threshold_ms,
+        interval=update.interval_ms / 1000 if update.interval_ms is not None else None,
+    )
+    if update.enabled is True:
+        loop_monitor.start()
+    elif update.enabled is False:
+        await loop_monitor.stop()
+    return FastJSONResponse(loop_monitor.snapshot())
+
+
+@debug_router.get("/profile")
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    format: str = PROFILE_FORMAT,
+    include_idle: bool = Query(False, description="Keep samples of threads waiting in select/locks/queues"),
+):
+    """Sample every thread of this worker (event loop and pools) for `seconds` and return the stacks."""
+    try:
+        result = await asyncio.to_thread(profile, seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _render_profile(result, format, include_idle)
+
+
+@debug_router.get("/profile/slow")
+async def get_slow_profiles():
+    """Slow-request mode settings and the profiles it kept, newest first."""
+    return FastJSONResponse(slow_request_profiler.summary())
+
+
+@debug_router.post("/profile/slow")
+async def update_slow_profiles(update: SlowProfileUpdate):
+    if update.threshold_ms > 0:
+        slow_request_profiler.start(update.threshold_ms)
+    else:
+        await asyncio.to_thread(slow_request_profiler.stop)
+    return FastJSONResponse(slow_request_profiler.summary())
+
+
+@debug_router.get("/profile/slow/{trace_id}")
+async def get_slow_profile(trace_id: str, format: str = PROFILE_FORMAT, include_idle: bool = Query(True)):
+    """Profile kept for one slow trace; idle samples are included by default since I/O waits explain most slow requests."""
+    entry = slow_request_profiler.find(trace_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No profile kept for this trace")
+    return _render_profile(entry["profile"], format, include_idle)
+
+
+@debug_router.get("/queries")
+async def get_flagged_queries(limit: int = Query(50, ge=1, le=100), scope: Optional[str] = None):
+    """Recent requests and traces that went over their Mongo query budget or repeated queries, newest first."""
+    entries = [e for e in reversed(list(flagged_scopes)) if scope is None or e["scope"] == scope]
+    return FastJSONResponse({"flagged": entries[:limit]})
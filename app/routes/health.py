@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.utils.inflight import webhooks_in_flight
+from app.utils.loop_monitor import loop_monitor
+
+health_router = APIRouter(tags=["Health"])
+
+
+@health_router.get("/health")
+async def health():
+    """Liveness plus event-loop lag over the last minute; "degraded" when p99 lag is over the stall threshold.
+
+    A worker that is shutting down answers 503 "draining" so load balancers stop routing to it.
+    """
+    if webhooks_in_flight.draining:
+        return JSONResponse(status_code=503, content={"status": "draining", "in_flight": webhooks_in_flight.count})
+    return {
+        "status": "ok" if loop_monitor.healthy() else "degraded",
+        "loop": loop_monitor.snapshot(),
+    }
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Query, Request, HTTPException
+from fastapi import APIRouter, Depends, Query, Request, HTTPException
 from fastapi.responses import JSONResponse
 import os
 import traceback
 from typing import Optional
 from app.services.replies import handle_incoming_message
 from app.db.mongo_connection import messages_collection
-from bson.objectid import ObjectId
 from app.utils.helpers import serialize_doc
+from app.utils.http_cache import conditional_json
+from app.utils.inflight import webhooks_in_flight
+from app.utils.auth import get_current_tenant, TenantContext
+from app.services.conversations import latest_conversation_update
+from app.utils.projections import parse_fields, build_projection, FIELDS_DESCRIPTION, MESSAGE_LIST_FIELDS, MESSAGE_DETAIL_FIELDS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,9 +37,13 @@ async def verify_webhook(
 
 @message_router.post("/webhook")
 async def receive_message(request: Request):
+    if webhooks_in_flight.draining:
+        # Shutting down: Meta retries non-2xx deliveries, so the message isn't lost
+        return JSONResponse(status_code=503, content={"success": False, "error": "Shutting down"}, headers={"Retry-After": "5"})
     try:
         body = await request.json()
-        await handle_incoming_message(body)
+        with webhooks_in_flight.track():
+            await handle_incoming_message(body)
         return JSONResponse(status_code=200, content={"success": True, "message": "Message processed."})
 
     except Exception as e:
@@ -48,20 +56,24 @@ async def receive_message(request: Request):
 
 @message_router.get("/tenants/{tenant_id}/messages")
 async def get_tenant_messages(
+    request: Request,
     tenant_id: str,
+    current_tenant: TenantContext = Depends(get_current_tenant),
     limit: int = Query(50, ge=1, le=1000),
-    skip: int = Query(0, ge=0)
+    skip: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
-    """Return messages for a given tenant."""
-    try:
-        query = {"tenant_id": ObjectId(tenant_id)}
-    except Exception:
-        # tenant_id might be stored as string; fall back
-        query = {"tenant_id": tenant_id}
+    """Return messages for the authenticated tenant, newest first."""
+    if tenant_id != current_tenant.tenant_id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this tenant's messages")
 
-    logger.info(f"Querying messages with: {query}")
-    cursor = messages_collection.find(query).sort("created_at", -1).skip(skip).limit(limit)
-    docs = await cursor.to_list(length=limit)
-    return {"count": len(docs), "messages": [_serialize_doc(d) for d in docs]}
+    query = {"tenant_id": current_tenant.oid}
+    projection = build_projection(MESSAGE_LIST_FIELDS, parse_fields(fields, MESSAGE_DETAIL_FIELDS))
 
+    async def build():
+        cursor = messages_collection.find(query, projection).sort("created_at", -1).skip(skip).limit(limit)
+        docs = await cursor.to_list(length=limit)
+        return {"count": len(docs), "messages": docs}
 
+    validator = await latest_conversation_update(current_tenant.oid)
+    return await conditional_json(request, tenant_id, validator, build)
@@ -0,0 +1,51 @@
+import os
+import hmac
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from app.utils.metrics import registry
+from app.services.scheduler import ai_scheduler
+from app.services.conversations import conversation_cache
+from app.services.user import auth_pool
+from app.utils.logging_config import logging_stats
+
+metrics_router = APIRouter(tags=["Metrics"])
+
+# Scrapers must send "Authorization: Bearer <METRICS_TOKEN>"; without a token the endpoint is off,
+# since the series carry tenant ids and message volumes
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+AI_CALLS_IN_FLIGHT = registry.gauge("ai_calls_in_flight", "AI calls currently holding a scheduler slot")
+AUTH_POOL_PENDING = registry.gauge("auth_pool_pending", "Password hashing jobs running or queued")
+AUTH_POOL_REJECTED = registry.counter("auth_pool_rejected_total", "Password hashing jobs rejected because the pool was full")
+CONVERSATION_CACHE = registry.counter("conversation_cache_lookups_total", "Conversation cache lookups by result", ("result",))
+LOG_RECORDS_DROPPED = registry.counter("log_records_dropped_total", "Log records not written, by reason", ("reason",))
+LOG_QUEUE_DEPTH = registry.gauge("log_queue_depth", "Log records waiting for the writer thread")
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus scrape endpoint."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Metrics are disabled; set METRICS_TOKEN")
+    supplied = request.headers.get("authorization", "")
+    if not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    # Point-in-time values owned by other components are read at scrape time
+    AI_CALLS_IN_FLIGHT.set(ai_scheduler.in_flight())
+    pool = auth_pool.stats()
+    AUTH_POOL_PENDING.set(pool["pending"])
+    AUTH_POOL_REJECTED.set_total(pool["rejected"])
+    CONVERSATION_CACHE.set_total(conversation_cache.hits, "hit")
+    CONVERSATION_CACHE.set_total(conversation_cache.misses, "miss")
+    logs = logging_stats()
+    LOG_QUEUE_DEPTH.set(logs["queued"])
+    LOG_RECORDS_DROPPED.set_total(logs["dropped_queue_full"], "queue_full")
+    LOG_RECORDS_DROPPED.set_total(logs["dropped_sampled"], "sampled")
+
+    # With thousands of tenant series rendering takes tens of milliseconds; keep it off the loop
+    body = await asyncio.to_thread(registry.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -3,6 +3,9 @@ from fastapi.responses import HTMLResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional
 from app.services.user import register_user, UserRegistrationError, upsert_user_with_onboarding, discover_and_upsert_tenant, verify_password
+from app.services.user import login_ip_throttle, login_phone_throttle
+from app.utils.offload import OffloadRejected
+import math
 from app.models.schemas import LoginRequest, LoginResponse, TenantResponse
 from bson.objectid import ObjectId
 from datetime import datetime
@@ -12,6 +15,7 @@ import os
 from app.utils.auth import create_access_token
 
 user_router = APIRouter(tags=["Auth"])
+logger = logging.getLogger(__name__)
 
 class SignupRequest(BaseModel):
   # Used for user registration (keeps facebook access token for /signup)
@@ -74,15 +78,30 @@ async def signup_tenant(request: TenantSignupRequest):
         token_type="bearer"
     )
 
+  except HTTPException:
+    raise
+  except OffloadRejected:
+    raise HTTPException(status_code=503, detail="Signup is busy. Please try again shortly.", headers={"Retry-After": "1"})
   except Exception as e:
     raise HTTPException(status_code=500, detail=str(e))
 
 @user_router.post("/login")
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, http_request: Request):
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    for throttle, key in ((login_ip_throttle, client_ip), (login_phone_throttle, request.phone_number)):
+        retry_after = throttle.hit(key)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
     try:
         tenant = await verify_password(request.phone_number, request.password)
         if not tenant:
             raise HTTPException(status_code=401, detail="Invalid credentials")
+        login_phone_throttle.reset(request.phone_number)
         
         # Create access token
         access_token = create_access_token(
@@ -96,6 +115,10 @@ async def login(request: LoginRequest):
             "access_token": access_token,
             "token_type": "bearer"
         }
+    except HTTPException:
+        raise
+    except OffloadRejected:
+        raise HTTPException(status_code=503, detail="Login is busy. Please try again shortly.", headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -111,8 +134,12 @@ async def signup(request: SignupRequest):
         tenant_copy.pop("password", None)
         tenant_copy = serialize_tenant(tenant_copy)
         return {"success": True, "tenant": tenant_copy}
+    except HTTPException:
+        raise
     except UserRegistrationError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except OffloadRejected:
+        raise HTTPException(status_code=503, detail="Signup is busy. Please try again shortly.", headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
@@ -122,7 +149,7 @@ async def embedded_signup_page():
     # This is the config_id from your Facebook Login for Business configuration
     config_id = os.getenv("FB_LOGIN_CONFIG_ID")  # Add this to your .env
     graph_api_version = "v19.0"  # Or latest supported version
-    print(f"app_id: {app_id}, config_id: {config_id}")
+    logger.debug("Embedded signup page: app_id=%s config_id=%s", app_id, config_id)
     if not app_id or not config_id:
         return HTMLResponse(
             "<h2>Configuration Error</h2><p>FACEBOOK_APP_ID or FB_LOGIN_CONFIG_ID not set in .env.</p>",
@@ -204,7 +231,7 @@ async def embedded_signup_page():
 @user_router.post("/facebook/onboarding-result")
 async def facebook_onboarding_result(request: Request):
     data = await request.json()
-    print(f"Received onboarding data: {data}")
+    logger.info("Received onboarding data: %s", data, extra={"category": "payload"})
     # Extract the relevant info from the data object
     # Example structure: data = { "data": { "phone_number_id": "...", "waba_id": "...", ... }, "type": "WA_EMBEDDED_SIGNUP", "event": "FINISH" }
     onboarding = data.get("data", {})
@@ -213,7 +240,6 @@ async def facebook_onboarding_result(request: Request):
     business_id = onboarding.get("business_id")
     # You may want to store these in your DB, or trigger further onboarding steps
     # For now, just acknowledge receipt
-    print("Received onboarding data:", onboarding)
     return PlainTextResponse("Onboarding data received. You can now complete backend onboarding steps.")
 
 @user_router.get("/facebook/callback")
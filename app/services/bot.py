@@ -1,16 +1,29 @@
 import os
+import time
 import httpx
 import asyncio
-from typing import Dict, Any
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
 from app.config.prompt_loader import prompt_loader
+from app.services.model_router import route_model, record_latency, remaining_budget, expected_latency
+from app.utils.tracing import span, traceparent
+from app.utils.http_client import get_client
+
+logger = logging.getLogger(__name__)
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Any OpenAI-compatible chat-completions URL; benchmarks point it at benchmarks/fakes/groq.py
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 
 class GroqAPIError(Exception):
     """Custom exception for Groq API errors."""
     pass
 
+class DeadlineExceeded(GroqAPIError):
+    """Raised instead of starting (or waiting for) a call that cannot finish within the latency budget."""
+    pass
+
 # List of fallback models in priority order
 MODEL_FALLBACKS = [
     "llama3-70b-8192",
@@ -18,32 +31,96 @@ MODEL_FALLBACKS = [
     "llama3-8b-8192"
 ]
 
-async def generate_ai_reply(user_message: str) -> str:
+@dataclass
+class AIReply:
+    text: str
+    model: Optional[str] = None
+    reason: Optional[str] = None
+    error: Optional[str] = None
+    routing: Dict[str, Any] = field(default_factory=dict)
+    usage: Dict[str, int] = field(default_factory=dict)
+    latency_ms: Optional[float] = None
+    cache_hit: bool = False
+
+    def to_doc(self) -> Dict[str, Any]:
+        """Metadata stored in the outbound message's `ai` field."""
+        return {
+            "model": self.model,
+            "route_reason": self.reason,
+            "routing": self.routing,
+            "usage": self.usage,
+            "latency_ms": self.latency_ms,
+            "cache_hit": self.cache_hit,
+            "error": self.error,
+        }
+
+
+async def generate_ai_reply(user_message: str, context: Optional[List[str]] = None) -> str:
     """
     Try generating reply using fallback models if primary fails.
     """
+    return (await generate_ai_response(user_message, context=context)).text
+
+async def generate_ai_response(user_message: str, deadline: Optional[float] = None, queue_depth: int = 0,
+                               context: Optional[List[str]] = None) -> AIReply:
+    """
+    Route the request to a model based on the latency budget, then fall back
+    through the remaining models that can still finish before `deadline`.
+
+    `context` holds the knowledge-base chunks retrieved for this message.
+    """
     if not GROQ_API_KEY:
-        return "Error: GROQ_API_KEY not configured"
+        return AIReply("Error: GROQ_API_KEY not configured", error="GROQ_API_KEY not configured")
 
+    started = time.monotonic()
+    decision = route_model(user_message, MODEL_FALLBACKS, deadline, queue_depth)
+    routing = dict(decision.signals)
+    if context:
+        routing["kb_chunks"] = len(context)
     last_error = None
+    reason = decision.reason
 
-    for model in MODEL_FALLBACKS:
+    for model in decision.models:
+        budget = remaining_budget(deadline)
+        if budget is not None and budget < expected_latency(model):
+            last_error = DeadlineExceeded(f"{budget:.1f}s left, {model} needs ~{expected_latency(model):.1f}s")
+            continue
         try:
-            payload = await _build_request_payload(user_message, model)
-            response = await _make_api_request(payload)
-            return _parse_response(response)
+            payload = await _build_request_payload(user_message, model, context)
+            call_started = time.monotonic()
+            response = await _make_api_request(payload, deadline)
+            record_latency(model, time.monotonic() - call_started)
+            usage = _parse_usage(response)
+            return AIReply(
+                _parse_response(response),
+                model=response.get("model") or model,
+                reason=reason,
+                routing=routing,
+                usage=usage,
+                latency_ms=round(1000 * (time.monotonic() - started), 1),
+                cache_hit=usage.get("cached_tokens", 0) > 0,
+            )
 
         except GroqAPIError as e:
-            print(f"⚠️ Model {model} failed: {e}")
+            logger.warning("⚠️ Model %s failed: %s", model, e)
             last_error = e
+            reason = f"fallback after {model} failed"
             continue
 
-    return f"Sorry, I couldn't process your message right now. Please try again later. ({last_error})"
-
-async def _build_request_payload(user_message: str, model_name: str) -> Dict[str, Any]:
+    if not decision.models:
+        last_error = DeadlineExceeded(decision.reason)
+    return AIReply(
+        f"Sorry, I couldn't process your message right now. Please try again later. ({last_error})",
+        reason=reason,
+        error=str(last_error),
+        routing=routing,
+        latency_ms=round(1000 * (time.monotonic() - started), 1),
+    )
+
+async def _build_request_payload(user_message: str, model_name: str, context: Optional[List[str]] = None) -> Dict[str, Any]:
     """Build the API request payload using specified model."""
     api_config = prompt_loader.get_api_config()
-    messages = prompt_loader.build_messages(user_message)
+    messages = prompt_loader.build_messages(user_message, context)
 
     return {
         "model": model_name,
@@ -52,50 +129,72 @@ async def _build_request_payload(user_message: str, model_name: str) -> Dict[str
         "temperature": api_config.get("temperature", 0.7)
     }
 
-async def _make_api_request(payload: Dict[str, Any]) -> Dict[str, Any]:
+async def _make_api_request(payload: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
     """
     Make the API request to Groq with retry logic on rate limit.
+
+    With a `deadline` (time.monotonic() based) the request timeout is capped to
+    the remaining budget and rate-limit sleeps that would overrun it fail fast.
     """
     retries = 3
     backoff = 5  # fallback backoff in case the API doesn't suggest retry time
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for attempt in range(retries):
-            response = await client.post(
-                GROQ_API_URL,
-                headers={
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json=payload
-            )
-
-            if response.status_code == 200:
-                return response.json()
-
-            elif response.status_code == 429:
-                error_data = response.json()
-                error_message = error_data.get("error", {}).get("message", "")
-                print(f"⚠️ Rate limit hit: {error_message}")
-
-                # Try to extract retry time from message
-                try:
-                    retry_seconds = float(error_message.split("try again in ")[-1].split("s")[0])
-                except Exception:
-                    retry_seconds = backoff
-
+    client = get_client()
+    for attempt in range(retries):
+        timeout = 30.0
+        budget = remaining_budget(deadline)
+        if budget is not None:
+            if budget <= 0:
+                raise DeadlineExceeded("Latency budget exhausted before request")
+            timeout = min(timeout, budget)
+
+        headers = {
+            "Authorization": f"Bearer {GROQ_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        try:
+            with span("groq.request", model=payload.get("model"), attempt=attempt) as request_span:
+                parent = traceparent()
+                if parent:
+                    headers["traceparent"] = parent
+                response = await client.post(GROQ_API_URL, headers=headers, json=payload, timeout=timeout)
+                request_span.set(status=response.status_code)
+        except httpx.TimeoutException as e:
+            if budget is not None:
+                raise DeadlineExceeded(f"Request timed out after {timeout:.1f}s")
+            raise GroqAPIError(f"Request timed out: {e}")
+
+        if response.status_code == 200:
+            return response.json()
+
+        elif response.status_code == 429:
+            error_data = response.json()
+            error_message = error_data.get("error", {}).get("message", "")
+            logger.warning("⚠️ Rate limit hit: %s", error_message)
+
+            # Try to extract retry time from message
+            try:
+                retry_seconds = float(error_message.split("try again in ")[-1].split("s")[0])
+            except Exception:
+                retry_seconds = backoff
+
+            budget = remaining_budget(deadline)
+            if budget is not None and retry_seconds >= budget:
+                raise DeadlineExceeded(f"Rate limited for {retry_seconds:.1f}s with {budget:.1f}s left")
+
+            with span("groq.rate_limit_wait", seconds=retry_seconds):
                 await asyncio.sleep(retry_seconds)
-                continue  # retry again
+            continue  # retry again
 
-            else:
-                error_data = response.json() if response.content else {}
-                raise GroqAPIError(f"HTTP {response.status_code}: {error_data}")
+        else:
+            error_data = response.json() if response.content else {}
+            raise GroqAPIError(f"HTTP {response.status_code}: {error_data}")
 
-        raise GroqAPIError("Retry limit exceeded due to rate limiting.")
+    raise GroqAPIError("Retry limit exceeded due to rate limiting.")
 
 def _parse_response(response_data: Dict[str, Any]) -> str:
     """Parse the API response and extract the generated text."""
-    print("📤 Groq raw response:", response_data)
+    logger.debug("Groq raw response: %s", response_data)
 
     if "choices" not in response_data or not response_data["choices"]:
         return "Sorry, I couldn't generate a valid reply. (No 'choices' found)"
@@ -105,3 +204,15 @@ def _parse_response(response_data: Dict[str, Any]) -> str:
         return content.strip()
     except (KeyError, IndexError) as e:
         return f"Sorry, I couldn't parse the response. Error: {str(e)}"
+
+
+def _parse_usage(response_data: Dict[str, Any]) -> Dict[str, int]:
+    """Extract token counts from the OpenAI-compatible `usage` block."""
+    usage = response_data.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+        "completion_tokens": int(usage.get("completion_tokens") or 0),
+        "total_tokens": int(usage.get("total_tokens") or 0),
+        "cached_tokens": int(details.get("cached_tokens") or 0),
+    }
@@ -0,0 +1,193 @@
+import os
+import zlib
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import bson
+from bson.binary import Binary
+
+from app.db.mongo_connection import messages_collection, messages_archive_collection, tenants_collection
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "false").lower() in ("1", "true", "yes")
+# Messages older than this many days move to cold storage (tenant.settings.hot_message_days overrides)
+COMPACTION_HOT_DAYS = int(os.getenv("COMPACTION_HOT_DAYS", 90))
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", 500))
+# Pause between batches so compaction never competes with webhook traffic for long
+COMPACTION_BATCH_PAUSE = float(os.getenv("COMPACTION_BATCH_PAUSE", 0.5))
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", 3600))
+
+# Fields not worth keeping once a message is cold (archived messages are not searchable)
+_DROP_FIELDS: Tuple[str, ...] = ("search_tokens",)
+
+_task: Optional[asyncio.Task] = None
+
+
+def decode_bucket(bucket: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Messages stored in an archive bucket, oldest first."""
+    data = bucket.get("data")
+    if not data:
+        return []
+    return bson.decode(zlib.decompress(data))["m"]
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _hot_days(tenant: Dict[str, Any]) -> int:
+    settings = tenant.get("settings") or {}
+    try:
+        return int(settings.get("hot_message_days", COMPACTION_HOT_DAYS))
+    except (TypeError, ValueError):
+        return COMPACTION_HOT_DAYS
+
+
+async def _merge_into_bucket(tenant_id, conversation_id, day: datetime, messages: List[Dict[str, Any]]) -> None:
+    key = {"tenant_id": tenant_id, "conversation_id": conversation_id, "day": day}
+    existing = await messages_archive_collection.find_one(key)
+
+    # Merge by _id so a batch that was archived but not yet deleted (crash, retry) isn't duplicated
+    merged = {m["_id"]: m for m in decode_bucket(existing)} if existing else {}
+    for msg in messages:
+        for field in _DROP_FIELDS:
+            msg.pop(field, None)
+        merged[msg["_id"]] = msg
+    ordered = sorted(merged.values(), key=lambda m: m.get("created_at") or day)
+
+    raw = bson.encode({"m": ordered})
+    data = Binary(zlib.compress(raw, 6))
+    await messages_archive_collection.replace_one(
+        key,
+        {
+            **key,
+            "count": len(ordered),
+            "first_at": ordered[0].get("created_at"),
+            "last_at": ordered[-1].get("created_at"),
+            "raw_bytes": len(raw),
+            "compressed_bytes": len(data),
+            "data": data,
+            "updated_at": datetime.now(),
+        },
+        upsert=True,
+    )
+
+
+async def compact_tenant(tenant: Dict[str, Any], now: Optional[datetime] = None) -> int:
+    """Move a tenant's messages older than its hot window into archive buckets. Returns messages moved."""
+    tenant_id = tenant["_id"]
+    cutoff = (now or datetime.now()) - timedelta(days=_hot_days(tenant))
+    moved = 0
+
+    while True:
+        batch = await (
+            messages_collection.find({"tenant_id": tenant_id, "created_at": {"$lt": cutoff}})
+            .sort("created_at", 1)
+            .limit(COMPACTION_BATCH_SIZE)
+            .to_list(length=COMPACTION_BATCH_SIZE)
+        )
+        if not batch:
+            break
+
+        groups: Dict[Tuple[Any, datetime], List[Dict[str, Any]]] = {}
+        for msg in batch:
+            groups.setdefault((msg.get("conversation_id"), _day(msg["created_at"])), []).append(msg)
+        for (conversation_id, day), messages in groups.items():
+            await _merge_into_bucket(tenant_id, conversation_id, day, messages)
+
+        # Only delete once every message of the batch is safely in a bucket
+        await messages_collection.delete_many({"_id": {"$in": [m["_id"] for m in batch]}})
+        moved += len(batch)
+
+        if len(batch) < COMPACTION_BATCH_SIZE:
+            break
+        await asyncio.sleep(COMPACTION_BATCH_PAUSE)
+
+    if moved:
+        logger.info("Compacted %d messages for tenant %s (older than %s)", moved, tenant_id, cutoff)
+    return moved
+
+
+async def compact_all() -> int:
+    moved = 0
+    async for tenant in tenants_collection.find({}, {"_id": 1, "settings": 1}):
+        try:
+            moved += await compact_tenant(tenant)
+        except Exception:
+            logger.exception("Compaction failed for tenant %s", tenant.get("_id"))
+    return moved
+
+
+async def iter_archived_messages(tenant_id, since: Optional[datetime] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Yield a tenant's archived messages in day order (within a day, per conversation)."""
+    query: Dict[str, Any] = {"tenant_id": tenant_id}
+    if since is not None:
+        query["day"] = {"$gte": _day(since)}
+    async for bucket in messages_archive_collection.find(query).sort("day", 1):
+        for msg in decode_bucket(bucket):
+            yield msg
+
+
+async def read_conversation_archive(
+    tenant_id, conversation_id, skip: int, limit: int
+) -> Tuple[int, Optional[datetime], List[Dict[str, Any]]]:
+    """Return (total archived count, newest archived created_at, page of archived messages oldest first).
+
+    Only the bucket metadata is read to locate the page; compressed data is
+    fetched for the buckets that overlap it.
+    """
+    query = {"tenant_id": tenant_id, "conversation_id": conversation_id}
+    meta = await messages_archive_collection.find(query, {"count": 1, "day": 1, "last_at": 1}).sort("day", 1).to_list(length=None)
+    total = sum(b.get("count", 0) for b in meta)
+    until = max((b["last_at"] for b in meta if b.get("last_at") is not None), default=None)
+    if skip >= total or limit <= 0:
+        return total, until, []
+
+    wanted = []
+    position = 0
+    first_offset = None
+    for bucket in meta:
+        count = bucket.get("count", 0)
+        if position + count > skip and position < skip + limit:
+            if first_offset is None:
+                first_offset = skip - position
+            wanted.append(bucket["_id"])
+        position += count
+        if position >= skip + limit:
+            break
+
+    buckets = await messages_archive_collection.find({"_id": {"$in": wanted}}).sort("day", 1).to_list(length=None)
+    messages: List[Dict[str, Any]] = []
+    for bucket in buckets:
+        messages.extend(decode_bucket(bucket))
+    start = first_offset or 0
+    return total, until, messages[start:start + limit]
+
+
+async def _run() -> None:
+    while True:
+        try:
+            await compact_all()
+        except Exception:
+            logger.exception("Compaction run failed")
+        await asyncio.sleep(COMPACTION_INTERVAL_SECONDS)
+
+
+def start_compaction() -> None:
+    global _task
+    if COMPACTION_ENABLED and (_task is None or _task.done()):
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop_compaction() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
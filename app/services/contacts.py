@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime
+from pymongo import ReturnDocument
 from app.db.mongo_connection import contacts_collection
 
 logger = logging.getLogger(__name__)
@@ -16,9 +17,8 @@ async def upsert_contact(tenant_id, wa_phone_hash, display_name: str | None = No
         if display_name:
             update["$set"]["display_name"] = display_name
 
-        await contacts_collection.update_one(query, update, upsert=True)
-        doc = await contacts_collection.find_one(query)
-        return doc
+        # One round trip: upsert and read back the stored document
+        return await contacts_collection.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
     except Exception as e:
         logger.exception("Failed to upsert contact: %s", e)
         return None
@@ -1,14 +1,37 @@
+import os
 import logging
 from datetime import datetime
+from typing import Any, Dict, Optional
+from pymongo import ReturnDocument
 from app.db.mongo_connection import conversations_collection
+from app.services.timers import register_timer_handler, schedule_timer, session_timer_key, SESSION_WINDOW
+from app.utils.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", 50000))
+# Upper bound on how long another worker's mode change (takeover/release) can go unseen by the
+# webhook's early human-mode skip; bot replies re-check the stored mode before sending (current_mode)
+CONVERSATION_CACHE_TTL = float(os.getenv("CONVERSATION_CACHE_TTL", 15))
+
+# (tenant_id, contact_id, channel) -> conversation document; carries `mode` for the webhook path
+conversation_cache = TTLCache(maxsize=CONVERSATION_CACHE_SIZE, ttl=CONVERSATION_CACHE_TTL)
+
+
+def _cache_key(conv: Dict[str, Any]):
+    return (conv.get("tenant_id"), conv.get("contact_id"), conv.get("channel", "whatsapp"))
+
 
 async def get_or_create_conversation(tenant_id, contact_id, channel: str = "whatsapp"):
+    key = (tenant_id, contact_id, channel)
+    conv = conversation_cache.get(key)
+    if conv is not None:
+        return conv
+
     query = {"tenant_id": tenant_id, "contact_id": contact_id, "channel": channel}
     conv = await conversations_collection.find_one(query)
     if conv:
+        conversation_cache.set(key, conv)
         return conv
 
     conv_doc = {
@@ -20,15 +43,117 @@ async def get_or_create_conversation(tenant_id, contact_id, channel: str = "what
         "created_at": datetime.now(),
         "updated_at": datetime.now()
     }
-    res = await conversations_collection.insert_one(conv_doc)
-    conv = await conversations_collection.find_one({"_id": res.inserted_id})
+    # insert_one sets conv_doc["_id"]; the inserted document is what a re-read would return
+    await conversations_collection.insert_one(conv_doc)
+    conversation_cache.set(key, conv_doc)
+    return conv_doc
+
+
+async def set_conversation_mode(tenant_id, conv_id, mode: str, handoff: Optional[Dict[str, Any]] = None,
+                                expect_mode: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Switch a conversation between "bot" and "human" and refresh this worker's cached copy.
+
+    With `expect_mode` the switch only happens if the conversation is still in
+    that mode. Returns the updated conversation, or None if nothing matched.
+    """
+    query: Dict[str, Any] = {"_id": conv_id, "tenant_id": tenant_id}
+    if expect_mode is not None:
+        query["mode"] = expect_mode
+    update: Dict[str, Any] = {"$set": {"mode": mode, "updated_at": datetime.now()}}
+    if handoff is not None:
+        update["$set"]["handoff"] = handoff
+    else:
+        update["$unset"] = {"handoff": ""}
+    conv = await conversations_collection.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    if conv:
+        conversation_cache.set(_cache_key(conv), conv)
     return conv
 
 
-async def touch_conversation(conv_id):
-    """Update last_message_at and updated_at to now."""
+async def current_mode(conv: Dict[str, Any]) -> str:
+    """The conversation's mode as stored right now, bypassing the cache.
+
+    A takeover on another worker only reaches this worker's cache when the
+    entry expires, so anything that must not happen once an agent owns the
+    conversation (sending a bot reply) checks here first. A changed mode is
+    written back to the cached copy.
+    """
+    doc = await conversations_collection.find_one({"_id": conv["_id"]}, {"mode": 1, "handoff": 1})
+    if doc is None:
+        return conv.get("mode", "bot")
+    mode = doc.get("mode", "bot")
+    if mode != conv.get("mode"):
+        fresh = {k: v for k, v in conv.items() if k != "handoff"}
+        fresh["mode"] = mode
+        if doc.get("handoff") is not None:
+            fresh["handoff"] = doc["handoff"]
+        conversation_cache.set(_cache_key(fresh), fresh)
+    return mode
+
+
+async def touch_conversation(conv_id, session_window_expires_at: Optional[datetime] = None,
+                             inbound_at: Optional[datetime] = None, reply: bool = False) -> Optional[datetime]:
+    """Update last_message_at and updated_at to now (and reopen the session window on inbound messages).
+
+    The conversation also records when it started waiting for a reply: an
+    inbound message (`inbound_at`) starts the wait unless one is pending, and
+    a reply ends it and returns when it started. Kept on the document so any
+    worker can measure the response time.
+    """
     try:
         now = datetime.now()
-        await conversations_collection.update_one({"_id": conv_id}, {"$set": {"last_message_at": now, "updated_at": now}})
+        update = {"last_message_at": now, "updated_at": now}
+        if session_window_expires_at is not None:
+            update["session_window_expires_at"] = session_window_expires_at
+            update["session_window_open"] = True
+        if reply:
+            before = await conversations_collection.find_one_and_update(
+                {"_id": conv_id}, {"$set": update, "$unset": {"awaiting_reply_since": ""}}, projection={"awaiting_reply_since": 1},
+            )
+            return (before or {}).get("awaiting_reply_since")
+        change = {"$set": update}
+        if inbound_at is not None:
+            change["$min"] = {"awaiting_reply_since": inbound_at}
+        await conversations_collection.update_one({"_id": conv_id}, change)
     except Exception:
         logger.exception("Failed to touch conversation %s", conv_id)
+    return None
+
+
+async def open_session_window(tenant_id, conv_id, inbound_at: datetime) -> datetime:
+    """Extend the 24h customer-service window from an inbound message and (re)arm its expiry timer."""
+    expires_at = inbound_at + SESSION_WINDOW
+    await touch_conversation(conv_id, expires_at, inbound_at=inbound_at)
+    try:
+        await schedule_timer(session_timer_key(conv_id), "session_expiry", expires_at, tenant_id=tenant_id, conversation_id=conv_id)
+    except Exception:
+        logger.exception("Failed to schedule session expiry for conversation %s", conv_id)
+    return expires_at
+
+
+def is_session_open(conv: Optional[Dict[str, Any]], at: Optional[datetime] = None) -> bool:
+    """Whether free-form (non-template) messages may still be sent in this conversation."""
+    expires_at = (conv or {}).get("session_window_expires_at")
+    return expires_at is not None and expires_at > (at or datetime.now())
+
+
+async def _expire_session(timer: Dict[str, Any]) -> None:
+    now = datetime.now()
+    await conversations_collection.update_one(
+        # A newer inbound message may have extended the window after this timer was claimed
+        {"_id": timer["conversation_id"], "session_window_expires_at": {"$lte": now}},
+        {"$set": {"session_window_open": False, "updated_at": now}},
+    )
+
+
+register_timer_handler("session_expiry", _expire_session)
+
+
+async def latest_conversation_update(tenant_id):
+    """Newest `updated_at` across a tenant's conversations (bumped by touch_conversation on every message)."""
+    doc = await conversations_collection.find_one(
+        {"tenant_id": tenant_id},
+        {"updated_at": 1, "_id": 0},
+        sort=[("updated_at", -1)]
+    )
+    return doc.get("updated_at") if doc else None
@@ -0,0 +1,99 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from app.db.mongo_connection import messages_collection
+from app.utils.helpers import dumps, rename_ids
+from app.utils.projections import build_projection, project_doc, MESSAGE_LIST_FIELDS
+from app.utils.pubsub import Broker
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per dashboard connection before it is dropped as a slow consumer
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", 100))
+# Comment frames keep idle connections (and proxies) alive
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+# With several workers, fan out via a Mongo change stream (replica set required) instead of in-process publish
+EVENTS_CHANGE_STREAM = os.getenv("EVENTS_CHANGE_STREAM", "false").lower() in ("1", "true", "yes")
+
+message_broker = Broker(buffer_size=EVENTS_BUFFER_SIZE)
+_EVENT_PROJECTION = build_projection(MESSAGE_LIST_FIELDS)
+_watch_task: Optional[asyncio.Task] = None
+
+
+def _sse_frame(msg_doc: Dict[str, Any]) -> bytes:
+    event = rename_ids(project_doc(msg_doc, _EVENT_PROJECTION))
+    return b"event: message\nid: " + str(event.get("id", "")).encode() + b"\ndata: " + dumps(event) + b"\n\n"
+
+
+def _publish_local(msg_doc: Dict[str, Any]) -> int:
+    tenant_id = msg_doc.get("tenant_id")
+    if tenant_id is None or not message_broker.subscriber_count(str(tenant_id)):
+        return 0
+    # Encoded once, shared by every subscriber of the tenant
+    return message_broker.publish(str(tenant_id), _sse_frame(msg_doc))
+
+
+def publish_message(msg_doc: Dict[str, Any]) -> None:
+    """Notify the tenant's dashboard streams about a newly inserted message."""
+    if EVENTS_CHANGE_STREAM:
+        # Every worker (including this one) receives the insert through the change stream
+        return
+    try:
+        _publish_local(msg_doc)
+    except Exception:
+        logger.exception("Failed to publish message event")
+
+
+async def _watch_inserts() -> None:
+    resume_token = None
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    while True:
+        try:
+            async with messages_collection.watch(pipeline, resume_after=resume_token) as stream:
+                logger.info("Watching messages change stream for dashboard events")
+                async for change in stream:
+                    resume_token = change.get("_id")
+                    _publish_local(change["fullDocument"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Messages change stream failed; retrying")
+            await asyncio.sleep(5)
+
+
+def start_event_fanout() -> None:
+    global _watch_task
+    if EVENTS_CHANGE_STREAM and (_watch_task is None or _watch_task.done()):
+        _watch_task = asyncio.get_running_loop().create_task(_watch_inserts())
+
+
+async def stop_event_fanout() -> None:
+    global _watch_task
+    message_broker.close_all()
+    if _watch_task is not None:
+        _watch_task.cancel()
+        try:
+            await _watch_task
+        except asyncio.CancelledError:
+            pass
+        _watch_task = None
+
+
+async def event_stream(tenant_key: str):
+    """Server-sent events for one dashboard connection."""
+    sub = message_broker.subscribe(tenant_key)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            frame = await sub.next(timeout=EVENTS_HEARTBEAT_SECONDS)
+            if frame is not None:
+                yield frame
+            elif sub.closed:
+                yield b"event: close\ndata: " + dumps({"reason": sub.reason}) + b"\n\n"
+                break
+            else:
+                yield b": keepalive\n\n"
+    finally:
+        message_broker.unsubscribe(sub)
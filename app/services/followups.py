@@ -0,0 +1,70 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from bson.objectid import ObjectId
+
+from app.db.mongo_connection import conversations_collection, timers_collection
+from app.services.conversations import is_session_open
+from app.services.messages import insert_message
+from app.services.replies import send_outbound_text
+from app.services.timers import register_timer_handler, schedule_timer, cancel_timer, followup_timer_key
+
+logger = logging.getLogger(__name__)
+
+
+async def schedule_followup(conv: Dict[str, Any], text: str, send_at: datetime, created_by=None) -> Dict[str, Any]:
+    """Schedule an outbound text (e.g. an order reminder) into a conversation."""
+    followup_id = ObjectId()
+    await schedule_timer(
+        followup_timer_key(followup_id), "followup", send_at,
+        tenant_id=conv["tenant_id"], conversation_id=conv["_id"], followup_id=followup_id,
+        text=text, created_by=created_by,
+    )
+    return {"id": followup_id, "conversation_id": conv["_id"], "send_at": send_at, "text": text}
+
+
+async def list_followups(tenant_id, conv_id) -> List[Dict[str, Any]]:
+    cursor = timers_collection.find(
+        {"kind": "followup", "tenant_id": tenant_id, "conversation_id": conv_id},
+        {"followup_id": 1, "due_at": 1, "text": 1, "created_at": 1},
+    ).sort("due_at", 1)
+    return [
+        {"id": t["followup_id"], "send_at": t["due_at"], "text": t.get("text"), "created_at": t.get("created_at")}
+        async for t in cursor
+    ]
+
+
+async def cancel_followup(tenant_id, followup_id: ObjectId) -> bool:
+    key = followup_timer_key(followup_id)
+    if not await timers_collection.find_one({"_id": key, "tenant_id": tenant_id}, {"_id": 1}):
+        return False
+    return await cancel_timer(key)
+
+
+async def _send_followup(timer: Dict[str, Any]) -> None:
+    conv = await conversations_collection.find_one({"_id": timer["conversation_id"]})
+    if not conv:
+        return
+    text = timer.get("text", "")
+    if not is_session_open(conv):
+        # Free-form messages are rejected by WhatsApp outside the 24h window; keep a record for the dashboard
+        logger.warning("Follow-up %s skipped: session window closed for conversation %s", timer["_id"], conv["_id"])
+        await insert_message({
+            "tenant_id": conv["tenant_id"],
+            "conversation_id": conv["_id"],
+            "contact_id": conv.get("contact_id"),
+            "direction": "outbound",
+            "wa_type": "text",
+            "channel": conv.get("channel", "whatsapp"),
+            "content": {"text": text},
+            "status": "failed",
+            "error": "session window closed",
+            "followup_id": timer.get("followup_id"),
+            "created_at": datetime.now(),
+        })
+        return
+    await send_outbound_text(conv, text, followup_id=timer.get("followup_id"))
+
+
+register_timer_handler("followup", _send_followup)
@@ -0,0 +1,68 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from app.services.conversations import set_conversation_mode, is_session_open
+from app.services.replies import send_outbound_text
+from app.services.timers import register_timer_handler, schedule_timer, cancel_timer
+
+logger = logging.getLogger(__name__)
+
+# The bot takes the conversation back after this long without agent activity
+HANDOFF_IDLE_MINUTES = int(os.getenv("HANDOFF_IDLE_MINUTES", 30))
+
+
+class SessionWindowClosed(Exception):
+    pass
+
+
+def handoff_timer_key(conversation_id) -> str:
+    return f"handoff:{conversation_id}"
+
+
+async def take_over(conv: Dict[str, Any], agent: Optional[str] = None, idle_minutes: Optional[int] = None) -> Dict[str, Any]:
+    """Put a human agent in charge: inbound messages are stored but no AI reply is generated.
+
+    Calling it again (e.g. on every agent reply) pushes the automatic bot resume further out.
+    """
+    now = datetime.now()
+    previous = (conv.get("handoff") or {}) if conv.get("mode") == "human" else {}
+    idle_minutes = idle_minutes or previous.get("idle_minutes") or HANDOFF_IDLE_MINUTES
+    resume_at = now + timedelta(minutes=idle_minutes)
+    handoff = {
+        "agent": agent,
+        "since": previous.get("since", now),
+        "last_activity_at": now,
+        "idle_minutes": idle_minutes,
+        "resume_at": resume_at,
+    }
+    updated = await set_conversation_mode(conv["tenant_id"], conv["_id"], "human", handoff) or conv
+    await schedule_timer(
+        handoff_timer_key(conv["_id"]), "handoff_resume", resume_at,
+        tenant_id=conv["tenant_id"], conversation_id=conv["_id"],
+    )
+    return updated
+
+
+async def release(conv: Dict[str, Any]) -> Dict[str, Any]:
+    """Hand the conversation back to the bot."""
+    await cancel_timer(handoff_timer_key(conv["_id"]))
+    return await set_conversation_mode(conv["tenant_id"], conv["_id"], "bot") or conv
+
+
+async def agent_reply(conv: Dict[str, Any], text: str, agent: Optional[str] = None) -> Dict[str, Any]:
+    """Send an agent's message (taking the conversation over if the bot still had it) and persist it."""
+    if not is_session_open(conv):
+        raise SessionWindowClosed("The customer's 24h session window is closed; only template messages can be sent")
+    conv = await take_over(conv, agent)
+    return await send_outbound_text(conv, text, sender={"type": "agent", "id": agent})
+
+
+async def _resume_bot(timer: Dict[str, Any]) -> None:
+    conv = await set_conversation_mode(timer["tenant_id"], timer["conversation_id"], "bot", expect_mode="human")
+    if conv:
+        logger.info("Conversation %s returned to the bot after agent inactivity", timer["conversation_id"])
+
+
+register_timer_handler("handoff_resume", _resume_bot)
@@ -0,0 +1,252 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson.binary import Binary
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+
+from app.db.mongo_connection import db, kb_documents_collection, kb_chunks_collection, kb_indexes_collection
+from app.utils.bm25 import BM25Index
+from app.utils.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Chunks injected into the prompt per reply
+KB_TOP_K = int(os.getenv("KB_TOP_K", 4))
+# Target size of a free-text chunk (catalogue items are always one chunk each)
+KB_CHUNK_CHARS = int(os.getenv("KB_CHUNK_CHARS", 600))
+# How often a worker checks the businesses record for uploads made by other workers
+KB_REFRESH_SECONDS = float(os.getenv("KB_REFRESH_SECONDS", 30))
+# Tenants whose index is kept in memory (least recently used are dropped)
+KB_MAX_TENANTS = int(os.getenv("KB_MAX_TENANTS", 200))
+
+KB_CHUNK_TOKENS = 256
+KB_QUERY_TOKENS = 16
+# Stay clear of the 16MB document limit; larger indexes are rebuilt from kb_chunks instead
+KB_MAX_SNAPSHOT_BYTES = 15 * 1024 * 1024
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?।])\s+")
+
+
+class _LoadedIndex:
+    __slots__ = ("index", "version", "checked_at")
+
+    def __init__(self, index: Optional[BM25Index], version: int):
+        self.index = index
+        self.version = version
+        self.checked_at = time.monotonic()
+
+
+_indexes: "OrderedDict[str, _LoadedIndex]" = OrderedDict()
+# Per-tenant load/update locks; dropped with the tenant's index once nobody holds them
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _item_chunk(item: Dict[str, Any]) -> Tuple[str, str]:
+    # Field names ("price", "stock") repeat on every item, so only the values are searchable
+    fields = [(k, v) for k, v in item.items() if v not in (None, "") and not str(k).startswith("_")]
+    return "; ".join(f"{k}: {v}" for k, v in fields), " ".join(str(v) for _, v in fields)
+
+
+def _pack(paragraphs: List[str], limit: int) -> List[str]:
+    chunks: List[str] = []
+    current = ""
+    for para in paragraphs:
+        pieces = [para] if len(para) <= limit else _SENTENCE_RE.split(para)
+        for piece in pieces:
+            while len(piece) > limit:
+                cut = piece.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+                chunks.append(piece[:cut].strip())
+                piece = piece[cut:].strip()
+            if current and len(current) + len(piece) + 1 > limit:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return [c for c in chunks if c]
+
+
+def chunk_document(kind: str, content: Optional[str] = None, items: Optional[List[Dict[str, Any]]] = None) -> List[Tuple[str, str]]:
+    """Split an uploaded document into (prompt text, searchable text) chunks.
+
+    Catalogue items (and catalogue text, one item per line) become one chunk
+    each so a price or stock answer never mixes two products; FAQ and free
+    text are packed paragraph by paragraph up to KB_CHUNK_CHARS.
+    """
+    chunks = [_item_chunk(item) for item in items or []]
+    if content:
+        if kind == "catalogue":
+            lines = [line.strip() for line in content.splitlines()]
+        else:
+            paragraphs = [p.strip() for p in re.split(r"\n\s*\n", content)]
+            lines = _pack([p for p in paragraphs if p], KB_CHUNK_CHARS)
+        chunks.extend((line, line) for line in lines)
+    return [c for c in chunks if c[0]]
+
+
+def _remember(tenant_key: str, loaded: _LoadedIndex) -> None:
+    _indexes[tenant_key] = loaded
+    _indexes.move_to_end(tenant_key)
+    while len(_indexes) > KB_MAX_TENANTS:
+        _indexes.popitem(last=False)
+    for key in [key for key, lock in _locks.items() if key not in _indexes and not lock.locked()]:
+        del _locks[key]
+
+
+async def _save_snapshot(tenant_key: str, index: BM25Index, version: int) -> None:
+    # Encoding a large index takes hundreds of milliseconds; keep it off the event loop
+    data = await asyncio.to_thread(index.to_bytes)
+    if len(data) > KB_MAX_SNAPSHOT_BYTES:
+        logger.info("Knowledge index for %s is %d bytes; not snapshotting", tenant_key, len(data))
+        await kb_indexes_collection.delete_one({"_id": tenant_key})
+        return
+    await kb_indexes_collection.update_one(
+        {"_id": tenant_key},
+        {"$set": {"version": version, "data": Binary(data), "chunks": len(index), "built_at": datetime.now()}},
+        upsert=True,
+    )
+
+
+def _index_chunks(chunks: List[Dict[str, Any]]) -> BM25Index:
+    index = BM25Index()
+    for chunk in chunks:
+        index.add(chunk["_id"], chunk.get("tokens") or [], chunk.get("text"))
+    return index
+
+
+async def _build_index(tenant_key: str) -> BM25Index:
+    cursor = kb_chunks_collection.find({"tenant_id": tenant_key}, {"text": 1, "tokens": 1}).sort("_id", 1)
+    chunks = await cursor.to_list(length=None)
+    return await asyncio.to_thread(_index_chunks, chunks)
+
+
+async def _load_index(tenant_key: str, version: int) -> BM25Index:
+    snapshot = await kb_indexes_collection.find_one({"_id": tenant_key})
+    if snapshot and snapshot.get("version") == version:
+        try:
+            return await asyncio.to_thread(BM25Index.from_bytes, snapshot["data"], ObjectId)
+        except Exception:
+            logger.exception("Corrupt knowledge index snapshot for %s; rebuilding", tenant_key)
+
+    started = time.monotonic()
+    index = await _build_index(tenant_key)
+    logger.info("Rebuilt knowledge index for %s: %d chunks in %.2fs", tenant_key, len(index), time.monotonic() - started)
+    await _save_snapshot(tenant_key, index, version)
+    return index
+
+
+async def get_index(tenant_key: str) -> Optional[BM25Index]:
+    """The tenant's BM25 index, loaded from its snapshot (or rebuilt) when the KB version changed."""
+    loaded = _indexes.get(tenant_key)
+    if loaded is not None and time.monotonic() - loaded.checked_at < KB_REFRESH_SECONDS:
+        _indexes.move_to_end(tenant_key)
+        return loaded.index
+
+    lock = _locks.setdefault(tenant_key, asyncio.Lock())
+    async with lock:
+        loaded = _indexes.get(tenant_key)
+        if loaded is not None and time.monotonic() - loaded.checked_at < KB_REFRESH_SECONDS:
+            return loaded.index
+
+        business = await db.businesses.find_one({"tenant_id": tenant_key}, {"kb_version": 1})
+        version = (business or {}).get("kb_version", 0)
+        if loaded is not None and loaded.version == version:
+            loaded.checked_at = time.monotonic()
+            return loaded.index
+
+        index = await _load_index(tenant_key, version) if version else None
+        _remember(tenant_key, _LoadedIndex(index, version))
+        return index
+
+
+async def retrieve_context(tenant_key: str, query: str, k: int = KB_TOP_K) -> List[str]:
+    """Texts of the top-k knowledge chunks for `query` (empty when the tenant has no knowledge base)."""
+    if not query or k <= 0:
+        return []
+    index = await get_index(tenant_key)
+    if index is None or not len(index):
+        return []
+    return [text for _, _, text in index.search(tokenize(query, KB_QUERY_TOKENS), k) if text]
+
+
+async def _bump_version(tenant_key: str) -> int:
+    # Only scalars go on the business record, which GET /business/ returns as is; the documents
+    # themselves are listed from kb_documents. The $unset clears an id list older versions kept here.
+    update = {"$set": {"kb_updated_at": datetime.now()}, "$inc": {"kb_version": 1}, "$unset": {"kb_document_ids": ""}}
+    business = await db.businesses.find_one_and_update(
+        {"tenant_id": tenant_key}, update, projection={"kb_version": 1}, return_document=ReturnDocument.AFTER
+    )
+    return business["kb_version"] if business else 0
+
+
+async def _apply(tenant_key: str, version: int, change) -> None:
+    # Update this worker's index in place when it is exactly one version behind;
+    # otherwise drop it and let the next retrieval reload it.
+    lock = _locks.setdefault(tenant_key, asyncio.Lock())
+    async with lock:
+        loaded = _indexes.get(tenant_key)
+        if loaded is None or loaded.version != version - 1:
+            _indexes.pop(tenant_key, None)
+            return
+        if loaded.index is None:
+            loaded.index = BM25Index()
+        change(loaded.index)
+        loaded.version = version
+        loaded.checked_at = time.monotonic()
+        await _save_snapshot(tenant_key, loaded.index, version)
+
+
+async def add_document(tenant_key: str, title: str, kind: str, content: Optional[str] = None,
+                       items: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Store, chunk and index a knowledge document on the tenant's business record."""
+    pieces = chunk_document(kind, content, items)
+    now = datetime.now()
+    doc = {"tenant_id": tenant_key, "title": title, "kind": kind, "chunk_count": len(pieces), "created_at": now}
+    result = await kb_documents_collection.insert_one(doc)
+    document_id = result.inserted_id
+
+    chunks = [
+        {"tenant_id": tenant_key, "document_id": document_id, "text": text, "tokens": tokenize(searchable, KB_CHUNK_TOKENS)}
+        for text, searchable in pieces
+    ]
+    if chunks:
+        await kb_chunks_collection.insert_many(chunks, ordered=False)
+
+    version = await _bump_version(tenant_key)
+
+    def change(index: BM25Index) -> None:
+        for chunk in chunks:
+            index.add(chunk["_id"], chunk["tokens"], chunk["text"])
+
+    await _apply(tenant_key, version, change)
+    logger.info("Indexed knowledge document %s for %s: %d chunks", document_id, tenant_key, len(chunks))
+    return doc
+
+
+async def delete_document(tenant_key: str, document_id: ObjectId) -> bool:
+    doc = await kb_documents_collection.find_one_and_delete({"_id": document_id, "tenant_id": tenant_key})
+    if not doc:
+        return False
+    chunk_ids = [c["_id"] async for c in kb_chunks_collection.find({"tenant_id": tenant_key, "document_id": document_id}, {"_id": 1})]
+    await kb_chunks_collection.delete_many({"tenant_id": tenant_key, "document_id": document_id})
+    version = await _bump_version(tenant_key)
+
+    def change(index: BM25Index) -> None:
+        for chunk_id in chunk_ids:
+            index.remove(chunk_id)
+
+    await _apply(tenant_key, version, change)
+    return True
+
+
+async def list_documents(tenant_key: str) -> List[Dict[str, Any]]:
+    cursor = kb_documents_collection.find({"tenant_id": tenant_key}).sort("created_at", -1)
+    return await cursor.to_list(length=None)
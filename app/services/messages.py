@@ -1,7 +1,13 @@
 import logging
 from datetime import datetime
 from app.db.mongo_connection import messages_collection
-from app.services.conversations import touch_conversation
+from app.services.conversations import touch_conversation, open_session_window
+from app.services.stats import record_message
+from app.services.compaction import read_conversation_archive
+from app.utils.projections import project_doc
+from app.services.events import publish_message
+from app.utils.http_cache import response_cache
+from app.services.search import index_fields
 
 logger = logging.getLogger(__name__)
 
@@ -11,11 +17,19 @@ async def insert_message(msg_doc: dict):
     try:
         # Ensure created_at exists
         msg_doc.setdefault("created_at", datetime.now())
+        index_fields(msg_doc)
         res = await messages_collection.insert_one(msg_doc)
         # Update conversation last_message_at
         conv_id = msg_doc.get("conversation_id")
-        if conv_id:
-            await touch_conversation(conv_id)
+        awaiting_since = None
+        if conv_id and msg_doc.get("direction") == "inbound":
+            await open_session_window(msg_doc.get("tenant_id"), conv_id, msg_doc["created_at"])
+        elif conv_id:
+            awaiting_since = await touch_conversation(conv_id, reply=msg_doc.get("direction") == "outbound")
+        record_message(msg_doc, awaiting_since=awaiting_since)
+        publish_message(msg_doc)
+        if msg_doc.get("tenant_id") is not None:
+            response_cache.invalidate(str(msg_doc["tenant_id"]))
         return res
     except Exception:
         logger.exception("Failed to insert message")
@@ -25,3 +39,34 @@ async def insert_message(msg_doc: dict):
 async def find_messages(query: dict, limit: int = 50, skip: int = 0):
     cursor = messages_collection.find(query).sort("created_at", -1).skip(skip).limit(limit)
     return await cursor.to_list(length=limit)
+
+
+async def find_conversation_messages(tenant_id, conversation_id, skip: int = 0, limit: int = 100, projection: dict | None = None):
+    """Messages of one conversation, oldest first, read across cold (archived) and hot storage.
+
+    The archive holds the older part of a conversation, so a page is served
+    from it first and continued from the messages collection. Hot messages
+    that are not newer than the archive (inserted late, backfilled, or in
+    both stores while compaction is mid-batch) are merged in by created_at;
+    that path decodes the whole archive, but it is rare.
+    """
+    base = {"tenant_id": tenant_id, "conversation_id": conversation_id}
+    archived_total, archived_until, page = await read_conversation_archive(tenant_id, conversation_id, skip, limit)
+    hot_query = dict(base)
+    if archived_until is not None:
+        hot_query["created_at"] = {"$gt": archived_until}
+        early = await messages_collection.find({**base, "created_at": {"$lte": archived_until}}).to_list(length=None)
+        if early:
+            _, _, archived = await read_conversation_archive(tenant_id, conversation_id, 0, archived_total)
+            merged = {m["_id"]: m for m in archived}
+            merged.update((m["_id"], m) for m in early)
+            ordered = sorted(merged.values(), key=lambda m: m.get("created_at") or datetime.min)
+            archived_total, page = len(ordered), ordered[skip:skip + limit]
+    if projection:
+        page = [project_doc(m, projection) for m in page]
+    remaining = limit - len(page)
+    if remaining > 0:
+        hot_skip = max(skip - archived_total, 0)
+        cursor = messages_collection.find(hot_query, projection).sort("created_at", 1).skip(hot_skip).limit(remaining)
+        page.extend(await cursor.to_list(length=remaining))
+    return page
@@ -0,0 +1,140 @@
+import os
+import re
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# End-to-end latency budget for a reply, measured from when the webhook message is picked up
+AI_LATENCY_SLO_SECONDS = float(os.getenv("AI_LATENCY_SLO_SECONDS", 12.0))
+# Queue depth (pending AI requests on this worker) above which we prefer the fast model
+AI_ROUTER_QUEUE_THRESHOLD = int(os.getenv("AI_ROUTER_QUEUE_THRESHOLD", 8))
+# Messages at or below this many characters are answered by the fast model unless they look complex
+AI_ROUTER_SHORT_MESSAGE_CHARS = int(os.getenv("AI_ROUTER_SHORT_MESSAGE_CHARS", 40))
+
+# Expected latency (seconds) per model, used until we have observations.
+# Ordered best quality first, same order as MODEL_FALLBACKS.
+MODEL_PROFILES: Dict[str, Dict[str, Any]] = {
+    "llama3-70b-8192": {"expected_latency": 4.0, "tier": "large"},
+    "mixtral-8x7b-32768": {"expected_latency": 3.0, "tier": "medium"},
+    "llama3-8b-8192": {"expected_latency": 1.0, "tier": "small"},
+}
+
+# Weight of the newest observation in the latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+
+_SMALLTALK_RE = re.compile(
+    r"^\s*(hi+|hello+|hey+|namaste|thanks?|thank you|thx|ok+|okay|bye|good (morning|evening|night)|"
+    r"dhanyavad|shukriya|theek hai|thik hai|haan|ha+|ji|👍|🙏)[\s!.?]*$",
+    re.IGNORECASE,
+)
+_COMPLEX_RE = re.compile(
+    r"\b(complain\w*|refund|return|cancel\w*|wrong|damaged|broken|not (received|working)|problem|issue|"
+    r"why|compare|difference|bulk|wholesale|invoice|gst|kharab|galat|shikayat)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class RoutingDecision:
+    models: List[str]
+    reason: str
+    deadline: Optional[float] = None
+    hint: Optional[str] = None
+    signals: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.models[0] if self.models else None
+
+
+def classify_message(text: str) -> str:
+    """Cheap classifier hint for routing: 'smalltalk', 'complex' or 'general'."""
+    if not text:
+        return "general"
+    if _SMALLTALK_RE.match(text):
+        return "smalltalk"
+    if _COMPLEX_RE.search(text):
+        return "complex"
+    return "general"
+
+
+def expected_latency(model: str) -> float:
+    profile = MODEL_PROFILES.get(model)
+    return profile["expected_latency"] if profile else AI_LATENCY_SLO_SECONDS
+
+
+def record_latency(model: str, seconds: float) -> None:
+    """Fold an observed call latency into the model's moving average."""
+    profile = MODEL_PROFILES.get(model)
+    if profile is None:
+        return
+    profile["expected_latency"] += LATENCY_EWMA_ALPHA * (seconds - profile["expected_latency"])
+
+
+def remaining_budget(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def make_deadline(settings: Optional[Dict[str, Any]] = None) -> float:
+    """Absolute (monotonic) deadline for a reply, honouring tenant.settings['ai_latency_slo']."""
+    slo = AI_LATENCY_SLO_SECONDS
+    if settings and settings.get("ai_latency_slo"):
+        try:
+            slo = float(settings["ai_latency_slo"])
+        except (TypeError, ValueError):
+            pass
+    return time.monotonic() + slo
+
+
+def route_model(
+    user_message: str,
+    models: List[str],
+    deadline: Optional[float] = None,
+    queue_depth: int = 0,
+) -> RoutingDecision:
+    """Pick the model order for one request.
+
+    The large model is preferred. We move to the fastest model when the message
+    is short or small talk, when the AI queue is backed up, or when the large
+    model's expected latency does not fit in the remaining budget. Models that
+    cannot finish before the deadline are dropped from the fallback list.
+    """
+    hint = classify_message(user_message)
+    budget = remaining_budget(deadline)
+    signals = {
+        "hint": hint,
+        "length": len(user_message or ""),
+        "queue_depth": queue_depth,
+        "budget_s": round(budget, 3) if budget is not None else None,
+    }
+
+    fitting = [m for m in models if budget is None or expected_latency(m) <= budget]
+    if not fitting:
+        return RoutingDecision([], "no model fits the remaining latency budget", deadline, hint, signals)
+
+    fastest = min(fitting, key=expected_latency)
+    preferred = fitting[0]
+
+    if preferred != models[0]:
+        reason = f"budget {budget:.1f}s too small for {models[0]}"
+    elif hint == "complex":
+        reason = "complex message"
+    elif queue_depth >= AI_ROUTER_QUEUE_THRESHOLD:
+        preferred = fastest
+        reason = f"queue depth {queue_depth} >= {AI_ROUTER_QUEUE_THRESHOLD}"
+    elif hint == "smalltalk":
+        preferred = fastest
+        reason = "small talk"
+    elif len(user_message or "") <= AI_ROUTER_SHORT_MESSAGE_CHARS:
+        preferred = fastest
+        reason = f"short message ({len(user_message or '')} chars)"
+    else:
+        reason = "default"
+
+    ordered = [preferred] + [m for m in fitting if m != preferred]
+    return RoutingDecision(ordered, reason, deadline, hint, signals)
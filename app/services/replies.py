@@ -1,20 +1,27 @@
 import os
+import time
 import httpx
 import logging
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timezone
-from app.services.bot import generate_ai_reply
-from app.db.mongo_connection import tenants_collection
+from app.services.bot import generate_ai_response, AIReply
+from app.services.model_router import make_deadline
+from app.services.scheduler import ai_scheduler, SchedulerQuotaExceeded
+from app.db.mongo_connection import tenants_collection, contacts_collection
 from app.models.message import MessageModel
 from app.services.user import get_user_by_whatsapp, get_tenant_by_phone_number_id
 from app.utils.whatsapp import send_message
 from app.services.contacts import upsert_contact
-from app.services.conversations import get_or_create_conversation
+from app.services.conversations import get_or_create_conversation, current_mode
 from app.services.messages import insert_message
+from app.services.usage import record_usage
+from app.services.knowledge import retrieve_context
 from app.models.schemas import ContactModel, ConversationModel, MessageModel as NewMessageModel
+from app.utils.metrics import registry
+from app.utils.tracing import start_trace, span, current_span
+from app.utils.query_accounting import query_scope
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Environment variables
@@ -23,6 +30,19 @@ PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
 WHATSAPP_API_VERSION = os.getenv("WHATSAPP_API_VERSION", "v19.0")
 WHATSAPP_API_URL = os.getenv("WHATSAPP_API_URL", f"https://graph.facebook.com/{WHATSAPP_API_VERSION}")
 
+AI_BUSY_REPLY = "Sorry, we're receiving a lot of messages right now. Please try again in a few minutes."
+
+STAGE_SECONDS = registry.histogram(
+    "whatsapp_message_stage_seconds", "Time spent in each stage of handling an inbound message", ("stage", "tenant")
+)
+MESSAGES_TOTAL = registry.counter("whatsapp_messages_total", "Inbound messages handled, by outcome", ("tenant", "outcome"))
+MESSAGES_IN_FLIGHT = registry.gauge("whatsapp_messages_in_flight", "Inbound messages currently being handled", ("tenant",))
+AI_REPLY_SECONDS = registry.histogram(
+    "ai_reply_duration_seconds", "AI reply generation time once a scheduler slot is held, including fallbacks and rate-limit waits",
+    ("tenant", "model"),
+)
+AI_REPLIES_TOTAL = registry.counter("ai_replies_total", "AI replies by model and outcome", ("tenant", "model", "outcome"))
+
 class WhatsAppAPIError(Exception):
     pass
 
@@ -43,25 +63,15 @@ async def handle_incoming_message(data: Dict[str, Any]) -> None:
         for message_data in messages:
             sender_id = message_data.get("from")
             phone_number_id = message_data.get("phone_number_id") or PHONE_NUMBER_ID
-            logger.info(f"[p:{phone_number_id}] Processing message: {message_data}")
+            logger.info("Processing webhook message %s", message_data, extra={"phone_number_id": phone_number_id, "category": "payload"})
             if not sender_id:
-                logger.warning(f"[p:{phone_number_id}] Message missing sender_id. Skipping.")
-                continue
-
-            tenant = await get_tenant_by_phone_number_id(phone_number_id)
-            if not tenant:
-                logger.warning(f"[p:{phone_number_id}] Received message for unknown tenant. Skipping.")
+                logger.warning("Message missing sender_id. Skipping.", extra={"phone_number_id": phone_number_id})
                 continue
 
-            access_token = tenant.get("access_token") or tenant.get("access_token_enc") or WHATSAPP_TOKEN
-            if not access_token:
-                logger.error(f"[p:{phone_number_id}] Tenant has no access token configured. Skipping reply.")
-                continue
-
-            await _process_single_message(message_data, phone_number_id, access_token)
+            await _process_single_message(message_data, phone_number_id)
             
     except Exception as e:
-        logger.error(f"❌ Error handling incoming message: {e}", exc_info=True)
+        logger.error("❌ Error handling incoming message: %s", e, exc_info=True)
         raise MessageProcessingError(f"Failed to process incoming message: {e}")
 
 def _extract_messages(data: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -78,84 +88,168 @@ def _extract_messages(data: Dict[str, Any]) -> List[Dict[str, Any]]:
                         m["phone_number_id"] = phone_number_id
                     messages.append(m)
     except Exception as e:
-        logger.error(f"Error extracting messages: {e}", exc_info=True)
+        logger.error("Error extracting messages: %s", e, exc_info=True)
         return []
     return messages
 
-async def _process_single_message(message_data: Dict[str, Any], phone_number_id: str, access_token: str) -> bool:
+async def _process_single_message(message_data: Dict[str, Any], phone_number_id: str) -> bool:
     sender_id = message_data.get("from")
     message_id = message_data.get("id", "unknown")
+    tenant_id = None
     try:
         user_message = _extract_user_message(message_data)
 
         if not user_message or not sender_id:
-            logger.warning(f"[p:{phone_number_id}] ⚠️ Incomplete message data: sender={sender_id}, message={user_message}")
+            logger.warning("⚠️ Incomplete message data: sender=%s, message=%s", sender_id, user_message, extra={"phone_number_id": phone_number_id})
             return False
 
-        tenant = await get_tenant_by_phone_number_id(phone_number_id)
-        tenant_id = tenant.get("_id") if tenant else None
+        with start_trace("whatsapp.message", message_id=message_id, phone_number_id=phone_number_id) as trace, \
+                query_scope("whatsapp.message"):
+            with span("tenant_lookup") as lookup:
+                tenant = await get_tenant_by_phone_number_id(phone_number_id)
+            if not tenant:
+                logger.warning("Received message for unknown tenant. Skipping.", extra={"phone_number_id": phone_number_id})
+                trace.set(outcome="unknown_tenant")
+                return False
+            tenant_id = tenant.get("_id")
+            tenant_label = str(tenant_id)
+            STAGE_SECONDS.observe(lookup.duration, "tenant_lookup", tenant_label)
+            trace.set(tenant=tenant_label)
 
+            access_token = tenant.get("access_token") or tenant.get("access_token_enc") or WHATSAPP_TOKEN
+            if not access_token:
+                logger.error("Tenant has no access token configured. Skipping reply.", extra={"phone_number_id": phone_number_id, "tenant_id": tenant_label})
+                trace.set(outcome="no_access_token")
+                return False
+
+            with MESSAGES_IN_FLIGHT.track(tenant_label):
+                outcome = await _reply_to_message(
+                    user_message, sender_id, message_id, phone_number_id, access_token, tenant, tenant_label
+                )
+            trace.set(outcome=outcome)
+        MESSAGES_TOTAL.inc(tenant_label, outcome)
+        return True
+
+    except Exception as e:
+        MESSAGES_TOTAL.inc(str(tenant_id) if tenant_id else "unknown", "error")
+        logger.error("💥 Error processing message from %s: %s", sender_id, e, exc_info=True, extra={"message_id": message_id})
+        return False
+
+def _stage(name: str, tenant_label: str, **attrs: Any):
+    """Trace span for one stage of handling a message, also recorded in the stage latency histogram."""
+    return span(name, STAGE_SECONDS, (name, tenant_label), **attrs)
+
+async def _reply_to_message(
+    user_message: str, sender_id: str, message_id: str, phone_number_id: str, access_token: str,
+    tenant: Optional[Dict[str, Any]], tenant_label: str,
+) -> str:
+    """Store the inbound message and, unless an agent owns the conversation, generate and send the AI reply."""
+    tenant_id = tenant.get("_id") if tenant else None
+    deadline = make_deadline((tenant or {}).get("settings"))
+
+    with _stage("upsert_contact", tenant_label):
         contact = await upsert_contact(tenant_id, sender_id)
-        contact_id = contact.get("_id") if contact else None
+    contact_id = contact.get("_id") if contact else None
 
+    with _stage("get_conversation", tenant_label):
         conv = await get_or_create_conversation(tenant_id, contact_id, "whatsapp")
-        conv_id = conv.get("_id")
-
-        logger.info(f"[t:{tenant_id}, c:{contact_id}, conv:{conv_id}, m:{message_id}] 📩 Incoming from {sender_id}: {user_message}")
-
-        msg_doc = {
-            "tenant_id": tenant_id,
-            "conversation_id": conv_id,
-            "contact_id": contact_id,
-            "direction": "inbound",
-            "wa_message_id": message_id,
-            "wa_timestamp": datetime.now(),
-            "wa_type": "text",
-            "channel": "whatsapp",
-            "content": {"text": user_message},
-            "status": "received",
-            "created_at": datetime.now()
-        }
-        try:
+    conv_id = conv.get("_id")
+    current_span().set(conversation_id=str(conv_id), contact_id=str(contact_id))
+
+    log_ctx = {"tenant_id": tenant_label, "conversation_id": str(conv_id)}
+    logger.info("📩 Incoming from %s: %s", sender_id, user_message,
+                extra={**log_ctx, "contact_id": str(contact_id), "message_id": message_id, "category": "content"})
+
+    msg_doc = {
+        "tenant_id": tenant_id,
+        "conversation_id": conv_id,
+        "contact_id": contact_id,
+        "direction": "inbound",
+        "wa_message_id": message_id,
+        "wa_timestamp": datetime.now(),
+        "wa_type": "text",
+        "channel": "whatsapp",
+        "content": {"text": user_message},
+        "status": "received",
+        "created_at": datetime.now()
+    }
+    try:
+        with _stage("insert_inbound", tenant_label):
             await insert_message(msg_doc)
-        except Exception:
-            logger.warning(f"[t:{tenant_id}, conv:{conv_id}] Failed to insert inbound message (likely duplicate).", exc_info=True)
-            pass
-
-        ai_reply = await generate_ai_reply(user_message)
-
-        ai_msg_doc = {
-            "tenant_id": tenant_id,
-            "conversation_id": conv_id,
-            "contact_id": contact_id,
-            "direction": "outbound",
-            "wa_type": "text",
-            "channel": "whatsapp",
-            "content": {"text": ai_reply},
-            "status": "sent",
-            "created_at": datetime.now(),
-            "ai": {"model": None}
-        }
-        await insert_message(ai_msg_doc)
-        logger.info(f"[t:{tenant_id}, conv:{conv_id}] 🤖 Reply to {sender_id}: {ai_reply}")
+    except Exception:
+        logger.warning("Failed to insert inbound message (likely duplicate).", exc_info=True, extra=log_ctx)
+        pass
 
-        await send_whatsapp_reply(sender_id, ai_reply, phone_number_id, access_token, tenant_id, conv_id)
-        return True
+    if conv.get("mode") == "human":
+        # An agent owns this conversation; the message is stored for them and no AI work is done
+        logger.info("🙋 Human mode, skipping AI reply", extra=log_ctx)
+        return "human"
 
-    except Exception as e:
-        logger.error(f"[m:{message_id}] 💥 Error processing message from {sender_id}: {e}", exc_info=True)
-        return False
+    try:
+        with _stage("kb_retrieval", tenant_label):
+            kb_context = await retrieve_context(str(tenant_id), user_message)
+    except Exception:
+        logger.warning("Knowledge base retrieval failed; replying without it.", exc_info=True, extra=log_ctx)
+        kb_context = []
+
+    try:
+        queue_depth = ai_scheduler.queue_depth()
+        started = time.perf_counter()
+        async with ai_scheduler.slot(tenant):
+            waited = time.perf_counter() - started
+            STAGE_SECONDS.observe(waited, "ai_queue", tenant_label)
+            generating = time.perf_counter()
+            with _stage("ai_generate", tenant_label, queue_depth=queue_depth, queue_wait_ms=round(1000 * waited, 1)) as generate:
+                ai = await generate_ai_response(user_message, deadline=deadline, queue_depth=queue_depth, context=kb_context)
+                generate.set(model=ai.model, route_reason=ai.reason, error=ai.error)
+        model = ai.model or "none"
+        AI_REPLY_SECONDS.observe(time.perf_counter() - generating, tenant_label, model)
+        AI_REPLIES_TOTAL.inc(tenant_label, model, "error" if ai.error else "ok")
+    except SchedulerQuotaExceeded as e:
+        logger.warning("AI request rejected: %s", e, extra=log_ctx)
+        ai = AIReply(AI_BUSY_REPLY, reason="tenant AI quota exceeded", error=str(e))
+        AI_REPLIES_TOTAL.inc(tenant_label, "none", "rejected")
+    ai_reply = ai.text
+
+    # The cached mode can be up to CONVERSATION_CACHE_TTL old; an agent may have taken over on another worker
+    with _stage("check_mode", tenant_label):
+        mode = await current_mode(conv)
+    if mode == "human":
+        logger.info("🙋 Agent took over while the reply was generated; not sending it", extra=log_ctx)
+        return "human"
+
+    ai_msg_doc = {
+        "tenant_id": tenant_id,
+        "conversation_id": conv_id,
+        "contact_id": contact_id,
+        "direction": "outbound",
+        "wa_type": "text",
+        "channel": "whatsapp",
+        "content": {"text": ai_reply},
+        "status": "sent",
+        "created_at": datetime.now(),
+        "ai": ai.to_doc()
+    }
+    with _stage("insert_outbound", tenant_label):
+        await insert_message(ai_msg_doc)
+    if ai.routing:  # a model was actually routed/called (not rejected by the scheduler)
+        record_usage(tenant_id, ai_msg_doc["ai"], ai_msg_doc["created_at"])
+    logger.info("🤖 Reply to %s: %s", sender_id, ai_reply, extra={**log_ctx, "category": "content"})
+
+    with _stage("send", tenant_label):
+        sent = await send_whatsapp_reply(sender_id, ai_reply, phone_number_id, access_token, tenant_id, conv_id)
+    return "replied" if sent else "send_failed"
 
 def _extract_user_message(message_data: Dict[str, Any]) -> Optional[str]:
     try:
         return message_data.get("text", {}).get("body")
     except Exception as e:
-        logger.error(f"Error extracting user message: {e}", exc_info=True)
+        logger.error("Error extracting user message: %s", e, exc_info=True)
         return None
 
 async def send_whatsapp_reply(recipient_id: str, message: str, phone_number_id: str, access_token: str, tenant_id: str, conv_id: str) -> bool:
     if not access_token or not phone_number_id:
-        logger.error(f"[t:{tenant_id}, conv:{conv_id}] Missing WhatsApp credentials for user")
+        logger.error("Missing WhatsApp credentials for user", extra={"tenant_id": str(tenant_id), "conversation_id": str(conv_id)})
         return False
 
     url = f"{WHATSAPP_API_URL}/{phone_number_id}/messages"
@@ -173,8 +267,35 @@ async def send_whatsapp_reply(recipient_id: str, message: str, phone_number_id:
 
     try:
         resp = await send_message(phone_number_id, recipient_id, payload, access_token, WHATSAPP_API_URL)
-        logger.info(f"[t:{tenant_id}, conv:{conv_id}] ✅ Message sent to {recipient_id} resp=%s", resp)
+        logger.info("✅ Message sent to %s resp=%s", recipient_id, resp, extra={"tenant_id": str(tenant_id), "conversation_id": str(conv_id)})
         return True
     except Exception as e:
-        logger.error(f"[t:{tenant_id}, conv:{conv_id}] ❌ Failed to send WhatsApp message: %s", e, exc_info=True)
-        return False
\ No newline at end of file
+        logger.error("❌ Failed to send WhatsApp message: %s", e, exc_info=True, extra={"tenant_id": str(tenant_id), "conversation_id": str(conv_id)})
+        return False
+
+async def send_outbound_text(conv: Dict[str, Any], text: str, **fields: Any) -> Dict[str, Any]:
+    """Send a text into an existing conversation (outside the webhook flow) and store it as an outbound message."""
+    tenant_id, conv_id = conv.get("tenant_id"), conv.get("_id")
+    tenant = await tenants_collection.find_one({"_id": tenant_id})
+    contact = await contacts_collection.find_one({"_id": conv.get("contact_id")}, {"wa_phone_hash": 1})
+    if not tenant or not contact:
+        raise MessageProcessingError(f"Conversation {conv_id} has no tenant or contact")
+
+    phone_number_id = tenant.get("phone_number_id") or PHONE_NUMBER_ID
+    access_token = tenant.get("access_token") or tenant.get("access_token_enc") or WHATSAPP_TOKEN
+    sent = await send_whatsapp_reply(contact["wa_phone_hash"], text, phone_number_id, access_token, tenant_id, conv_id)
+
+    msg_doc = {
+        "tenant_id": tenant_id,
+        "conversation_id": conv_id,
+        "contact_id": conv.get("contact_id"),
+        "direction": "outbound",
+        "wa_type": "text",
+        "channel": conv.get("channel", "whatsapp"),
+        "content": {"text": text},
+        "status": "sent" if sent else "failed",
+        "created_at": datetime.now(),
+        **fields,
+    }
+    await insert_message(msg_doc)
+    return msg_doc
@@ -0,0 +1,262 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Global cap on concurrent Groq calls for this worker (all tenants share one API key)
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 8))
+# Defaults for tenants that don't override them in tenant.settings
+AI_TENANT_MAX_CONCURRENCY = int(os.getenv("AI_TENANT_MAX_CONCURRENCY", 4))
+AI_TENANT_MAX_QUEUE = int(os.getenv("AI_TENANT_MAX_QUEUE", 200))
+AI_SCHEDULER_QUANTUM = float(os.getenv("AI_SCHEDULER_QUANTUM", 1.0))
+
+# Number of recent wait samples kept per tenant for percentiles
+WAIT_SAMPLES = 1024
+
+
+class SchedulerQuotaExceeded(Exception):
+    """Raised when a tenant's queue or rate quota is exhausted."""
+    pass
+
+
+class _Ticket:
+    __slots__ = ("future", "cost", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, cost: float):
+        self.future = future
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+
+
+class _TenantState:
+    __slots__ = (
+        "queue", "deficit", "fresh", "running", "weight", "max_concurrency",
+        "max_queue", "requests_per_minute", "window_start", "window_count",
+        "submitted", "admitted", "completed", "rejected", "wait_total", "wait_max", "waits",
+    )
+
+    def __init__(self):
+        self.queue: Deque[_Ticket] = deque()
+        self.deficit = 0.0
+        self.fresh = True
+        self.running = 0
+        self.weight = 1.0
+        self.max_concurrency = AI_TENANT_MAX_CONCURRENCY
+        self.max_queue = AI_TENANT_MAX_QUEUE
+        self.requests_per_minute: Optional[int] = None
+        self.window_start = 0.0
+        self.window_count = 0
+        self.submitted = 0
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class FairScheduler:
+    """Deficit round robin admission of AI calls across tenants.
+
+    Every tenant has its own FIFO queue. Tenants with pending work are visited
+    in round robin order; each visit credits ``quantum * weight`` to the
+    tenant's deficit and admits queued requests while the deficit covers their
+    cost. A global concurrency limit bounds total in-flight calls and a
+    per-tenant limit stops a single tenant from holding every slot.
+
+    Per-tenant knobs are read from ``tenant["settings"]``:
+    ``ai_weight``, ``ai_max_concurrency``, ``ai_max_queue`` and
+    ``ai_requests_per_minute``.
+    """
+
+    def __init__(self, max_concurrency: int = AI_MAX_CONCURRENCY, quantum: float = AI_SCHEDULER_QUANTUM):
+        self.max_concurrency = max_concurrency
+        self.quantum = quantum
+        self._tenants: Dict[str, _TenantState] = {}
+        self._active: Deque[str] = deque()
+        # Membership of _active, so acquire doesn't scan the round robin queue
+        self._active_keys: Set[str] = set()
+        self._running_total = 0
+
+    def _state(self, key: str) -> _TenantState:
+        state = self._tenants.get(key)
+        if state is None:
+            state = self._tenants[key] = _TenantState()
+        return state
+
+    def configure(self, key: str, settings: Optional[Dict[str, Any]] = None) -> None:
+        """Apply tenant settings (weight, caps, quotas) to the tenant's queue."""
+        settings = settings or {}
+        state = self._state(key)
+        try:
+            state.weight = max(float(settings.get("ai_weight", 1.0)), 0.01)
+            state.max_concurrency = max(int(settings.get("ai_max_concurrency", AI_TENANT_MAX_CONCURRENCY)), 1)
+            state.max_queue = max(int(settings.get("ai_max_queue", AI_TENANT_MAX_QUEUE)), 0)
+            rpm = settings.get("ai_requests_per_minute")
+            state.requests_per_minute = int(rpm) if rpm else None
+        except (TypeError, ValueError):
+            logger.warning("Invalid AI scheduler settings for tenant %s: %s", key, settings)
+
+    def _check_quota(self, key: str, state: _TenantState) -> None:
+        if len(state.queue) >= state.max_queue:
+            state.rejected += 1
+            raise SchedulerQuotaExceeded(f"AI queue full for tenant {key} ({state.max_queue} pending)")
+
+        if state.requests_per_minute:
+            now = time.monotonic()
+            if now - state.window_start >= 60:
+                state.window_start = now
+                state.window_count = 0
+            if state.window_count >= state.requests_per_minute:
+                state.rejected += 1
+                raise SchedulerQuotaExceeded(f"AI rate quota exceeded for tenant {key} ({state.requests_per_minute}/min)")
+            state.window_count += 1
+
+    async def acquire(self, key: str, cost: float = 1.0) -> float:
+        """Wait for an AI slot for tenant ``key``. Returns the time spent queued in seconds."""
+        state = self._state(key)
+        self._check_quota(key, state)
+
+        ticket = _Ticket(asyncio.get_running_loop().create_future(), cost)
+        state.queue.append(ticket)
+        state.submitted += 1
+        if len(state.queue) == 1 and key not in self._active_keys:
+            self._active.append(key)
+            self._active_keys.add(key)
+            state.fresh = True
+        self._dispatch()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Slot was granted just before cancellation; hand it back without counting a completion
+                self.release(key, completed=False)
+            else:
+                try:
+                    state.queue.remove(ticket)
+                except ValueError:
+                    pass
+            raise
+
+        waited = time.monotonic() - ticket.enqueued_at
+        state.wait_total += waited
+        state.wait_max = max(state.wait_max, waited)
+        state.waits.append(waited)
+        return waited
+
+    def release(self, key: str, completed: bool = True) -> None:
+        """Free a slot taken by ``acquire``; ``completed`` is False for slots handed back unused."""
+        state = self._state(key)
+        state.running = max(state.running - 1, 0)
+        if completed:
+            state.completed += 1
+        self._running_total = max(self._running_total - 1, 0)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[Dict[str, Any]], cost: float = 1.0):
+        """Hold an AI slot for ``tenant`` for the duration of the block."""
+        key = str(tenant.get("_id")) if tenant else "default"
+        if tenant:
+            self.configure(key, tenant.get("settings"))
+        await self.acquire(key, cost)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def _dispatch(self) -> None:
+        active = self._active
+        blocked = 0
+        while active and self._running_total < self.max_concurrency and blocked < len(active):
+            key = active[0]
+            state = self._tenants[key]
+
+            # Drop cancelled tickets from the head of the queue
+            while state.queue and state.queue[0].future.done():
+                state.queue.popleft()
+
+            if not state.queue:
+                active.popleft()
+                self._active_keys.discard(key)
+                state.deficit = 0.0
+                state.fresh = True
+                continue
+
+            if state.running >= state.max_concurrency:
+                active.rotate(-1)
+                state.fresh = True
+                blocked += 1
+                continue
+
+            if state.fresh:
+                state.deficit += self.quantum * state.weight
+                state.fresh = False
+
+            ticket = state.queue[0]
+            if ticket.cost > state.deficit:
+                # Not enough credit this round; move on and top up next visit
+                active.rotate(-1)
+                state.fresh = True
+                continue
+
+            state.queue.popleft()
+            state.deficit -= ticket.cost
+            state.running += 1
+            state.admitted += 1
+            self._running_total += 1
+            ticket.future.set_result(None)
+            blocked = 0
+
+    def queue_depth(self, key: Optional[str] = None) -> int:
+        """Pending (not yet admitted) requests for one tenant, or for all tenants."""
+        if key is not None:
+            state = self._tenants.get(key)
+            return len(state.queue) if state else 0
+        return sum(len(s.queue) for s in self._tenants.values())
+
+    def in_flight(self) -> int:
+        return self._running_total
+
+    def stats(self, key: Optional[str] = None) -> Dict[str, Any]:
+        """Queue wait metrics per tenant."""
+        keys = [key] if key is not None else list(self._tenants.keys())
+        out = {}
+        for k in keys:
+            state = self._tenants.get(k)
+            if state is None:
+                continue
+            admitted = state.admitted
+            out[k] = {
+                "queued": len(state.queue),
+                "running": state.running,
+                "submitted": state.submitted,
+                "admitted": admitted,
+                "completed": state.completed,
+                "rejected": state.rejected,
+                "weight": state.weight,
+                "max_concurrency": state.max_concurrency,
+                "wait_avg_ms": round(1000 * state.wait_total / admitted, 3) if admitted else 0.0,
+                "wait_p50_ms": round(1000 * _percentile(state.waits, 0.50), 3),
+                "wait_p95_ms": round(1000 * _percentile(state.waits, 0.95), 3),
+                "wait_max_ms": round(1000 * state.wait_max, 3),
+            }
+        return out
+
+
+# Shared scheduler for this worker
+ai_scheduler = FairScheduler()
@@ -0,0 +1,109 @@
+import os
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson.objectid import ObjectId
+
+from app.db.mongo_connection import messages_collection, conversations_collection, contacts_collection
+from app.utils.projections import build_projection, MESSAGE_LIST_FIELDS, CONTACT_SUMMARY_FIELDS
+from app.utils.text import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Ranking considers the newest N messages matching any query token (read in index order)
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", 2000))
+SEARCH_MAX_QUERY_TOKENS = 8
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(score: int, created_at: datetime, message_id: ObjectId) -> str:
+    raw = f"{score}|{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        score, created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return int(score), datetime.fromisoformat(created_at), ObjectId(message_id)
+    except Exception:
+        raise InvalidCursor("Invalid search cursor")
+
+
+def index_fields(msg_doc: Dict[str, Any]) -> None:
+    """Add the tenant-scoped inverted index entry (search_tokens) to a message before insert."""
+    text = (msg_doc.get("content") or {}).get("text")
+    if text:
+        msg_doc["search_tokens"] = tokenize(text)
+
+
+async def search_messages(tenant_id, query: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Ranked message hits for `query` within one tenant.
+
+    Messages carry their normalized tokens in `search_tokens`, indexed together
+    with tenant_id and created_at, so each query token is a posting list read
+    newest-first from the index. The newest SEARCH_MAX_CANDIDATES matches are
+    scored by the number of distinct query tokens they contain.
+    """
+    tokens = tokenize(query)[:SEARCH_MAX_QUERY_TOKENS]
+    if not tokens:
+        return {"query": query, "tokens": [], "hits": [], "next_cursor": None}
+
+    after = decode_cursor(cursor) if cursor else None
+    projection = build_projection(MESSAGE_LIST_FIELDS)
+
+    pipeline: List[Dict[str, Any]] = [
+        {"$match": {"tenant_id": tenant_id, "search_tokens": {"$in": tokens}}},
+        {"$sort": {"created_at": -1}},
+        {"$limit": SEARCH_MAX_CANDIDATES},
+        {"$project": {**projection, "score": {"$size": {"$setIntersection": ["$search_tokens", tokens]}}}},
+    ]
+    if after is not None:
+        score, created_at, message_id = after
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": score}},
+            {"score": score, "created_at": {"$lt": created_at}},
+            {"score": score, "created_at": created_at, "_id": {"$lt": message_id}},
+        ]}})
+    pipeline += [
+        {"$sort": {"score": -1, "created_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+    ]
+
+    hits = await messages_collection.aggregate(pipeline).to_list(length=limit + 1)
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        last = hits[-1]
+        next_cursor = encode_cursor(last["score"], last["created_at"], last["_id"])
+
+    await _attach_context(tenant_id, hits)
+    return {"query": query, "tokens": tokens, "hits": hits, "next_cursor": next_cursor}
+
+
+async def _attach_context(tenant_id, hits: List[Dict[str, Any]]) -> None:
+    """Add conversation and contact summaries to each hit (two batched lookups)."""
+    conv_ids = list({h["conversation_id"] for h in hits if h.get("conversation_id")})
+    if not conv_ids:
+        return
+    conversations = {
+        c["_id"]: c async for c in conversations_collection.find(
+            {"_id": {"$in": conv_ids}, "tenant_id": tenant_id},
+            {"contact_id": 1, "mode": 1, "status": 1, "last_message_at": 1}
+        )
+    }
+    contact_ids = list({c["contact_id"] for c in conversations.values() if c.get("contact_id")})
+    contacts = {
+        c["_id"]: c async for c in contacts_collection.find(
+            {"_id": {"$in": contact_ids}, "tenant_id": tenant_id},
+            build_projection(CONTACT_SUMMARY_FIELDS)
+        )
+    }
+    for hit in hits:
+        conv = conversations.get(hit.get("conversation_id"))
+        hit["conversation"] = conv
+        hit["contact"] = contacts.get(conv.get("contact_id")) if conv else None
@@ -0,0 +1,193 @@
+import os
+import logging
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.db.mongo_connection import stats_rollups_collection, messages_collection
+from app.utils.aggregation import IncrementBuffer
+from app.utils.hll import hll_register, hll_merge, hll_count
+from app.services.compaction import iter_archived_messages
+
+logger = logging.getLogger(__name__)
+
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", 5.0))
+
+# Upper bounds (seconds) of the response-time histogram buckets; slower replies go to "gt_<last>"
+RESPONSE_TIME_BUCKETS = [1, 2, 5, 10, 30, 60, 300, 900, 3600]
+GRANULARITIES = ("hour", "day")
+
+# Conversations a rebuild tracks as waiting for a reply
+MAX_PENDING_CONVERSATIONS = 50000
+
+stats_buffer = IncrementBuffer(stats_rollups_collection, flush_interval=STATS_FLUSH_INTERVAL, name="stats_rollups")
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def histogram_field(seconds: float) -> str:
+    idx = bisect_left(RESPONSE_TIME_BUCKETS, seconds)
+    if idx == len(RESPONSE_TIME_BUCKETS):
+        return f"gt_{RESPONSE_TIME_BUCKETS[-1]}"
+    return f"le_{RESPONSE_TIME_BUCKETS[idx]}"
+
+
+def record_message(msg_doc: Dict[str, Any], buffer: IncrementBuffer = stats_buffer, awaiting: Optional[OrderedDict] = None,
+                   awaiting_since: Optional[datetime] = None) -> None:
+    """Fold one inserted message into its tenant's hourly and daily rollup buckets.
+
+    Response time is measured from the first unanswered inbound message of a
+    conversation to the next outbound message in the same conversation. Live
+    replies pass `awaiting_since`, which the conversation document keeps (see
+    touch_conversation); a rebuild replays messages in order and tracks the
+    waits itself in `awaiting`.
+
+    Active contacts are a HyperLogLog sketch per bucket (`contacts_hll`), so
+    a bucket stays a fixed size however many contacts write in it.
+    """
+    tenant_id = msg_doc.get("tenant_id")
+    created_at = msg_doc.get("created_at")
+    if tenant_id is None or not isinstance(created_at, datetime):
+        return
+
+    direction = msg_doc.get("direction") or "unknown"
+    conv_id = msg_doc.get("conversation_id")
+    inc: Dict[str, float] = {"messages": 1, direction: 1}
+
+    if conv_id is not None and awaiting is not None:
+        if direction == "inbound":
+            if conv_id not in awaiting:
+                awaiting[conv_id] = created_at
+                if len(awaiting) > MAX_PENDING_CONVERSATIONS:
+                    awaiting.popitem(last=False)
+        elif direction == "outbound":
+            awaiting_since = awaiting.pop(conv_id, None)
+    if direction == "outbound" and awaiting_since is not None:
+        seconds = max((created_at - awaiting_since).total_seconds(), 0.0)
+        inc["rt_count"] = 1
+        inc["rt_sum_ms"] = round(seconds * 1000)
+        inc[f"rt_hist.{histogram_field(seconds)}"] = 1
+
+    contact_id = msg_doc.get("contact_id")
+    maximum = None
+    if contact_id is not None:
+        register, rank = hll_register(contact_id)
+        maximum = {f"contacts_hll.{register}": rank}
+
+    for granularity in GRANULARITIES:
+        buffer.add(
+            {"tenant_id": tenant_id, "granularity": granularity, "bucket": bucket_start(created_at, granularity)},
+            inc,
+            maximum,
+        )
+
+
+def _percentile_from_histogram(hist: Dict[str, int], q: float) -> Optional[float]:
+    """Upper bound (seconds) of the histogram bucket containing the q-quantile.
+
+    None when there are no samples or the quantile falls past the largest bucket.
+    """
+    total = sum(hist.values())
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for bound in RESPONSE_TIME_BUCKETS:
+        seen += hist.get(f"le_{bound}", 0)
+        if seen >= target:
+            return float(bound)
+    return None
+
+
+async def get_stats(tenant_id, start: datetime, end: datetime, granularity: str = "day") -> Dict[str, Any]:
+    """Range query over pre-aggregated buckets in [start, end)."""
+    cursor = stats_rollups_collection.find(
+        {
+            "tenant_id": tenant_id,
+            "granularity": granularity,
+            "bucket": {"$gte": bucket_start(start, granularity), "$lt": end},
+        },
+        # "contacts" held raw id sets in older buckets; rebuild_stats replaces them
+        {"_id": 0, "tenant_id": 0, "granularity": 0, "contacts": 0},
+    ).sort("bucket", 1)
+
+    buckets: List[Dict[str, Any]] = []
+    contacts: Dict[str, int] = {}
+    totals = {"messages": 0, "inbound": 0, "outbound": 0, "rt_count": 0, "rt_sum_ms": 0}
+    hist: Dict[str, int] = {}
+
+    async for doc in cursor:
+        bucket_contacts = doc.pop("contacts_hll", {})
+        hll_merge(contacts, bucket_contacts)
+        for name in totals:
+            totals[name] += doc.get(name, 0)
+        for name, count in (doc.get("rt_hist") or {}).items():
+            hist[name] = hist.get(name, 0) + count
+
+        rt_count = doc.get("rt_count", 0)
+        buckets.append({
+            "bucket": doc["bucket"],
+            "messages": doc.get("messages", 0),
+            "inbound": doc.get("inbound", 0),
+            "outbound": doc.get("outbound", 0),
+            "active_contacts": hll_count(bucket_contacts),
+            "avg_response_ms": round(doc.get("rt_sum_ms", 0) / rt_count) if rt_count else None,
+            "rt_hist": doc.get("rt_hist", {}),
+        })
+
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "buckets": buckets,
+        "totals": {
+            "messages": totals["messages"],
+            "inbound": totals["inbound"],
+            "outbound": totals["outbound"],
+            "active_contacts": hll_count(contacts),
+            "avg_response_ms": round(totals["rt_sum_ms"] / totals["rt_count"]) if totals["rt_count"] else None,
+            "response_p50_s": _percentile_from_histogram(hist, 0.50),
+            "response_p95_s": _percentile_from_histogram(hist, 0.95),
+            "rt_hist": hist,
+        },
+    }
+
+
+async def rebuild_stats(tenant_id, since: Optional[datetime] = None, batch_size: int = 1000) -> int:
+    """Regenerate a tenant's rollups from raw messages, archived and hot. Returns the number of messages scanned."""
+    delete_query: Dict[str, Any] = {"tenant_id": tenant_id}
+    message_query: Dict[str, Any] = {"tenant_id": tenant_id}
+    if since is not None:
+        since = bucket_start(since, "day")
+        delete_query["bucket"] = {"$gte": since}
+        message_query["created_at"] = {"$gte": since}
+
+    await stats_rollups_collection.delete_many(delete_query)
+
+    buffer = IncrementBuffer(stats_rollups_collection, name="stats_rebuild")
+    awaiting: OrderedDict = OrderedDict()
+    scanned = 0
+
+    async def _feed(msg):
+        nonlocal scanned
+        record_message(msg, buffer, awaiting)
+        scanned += 1
+        if buffer.pending_count() >= batch_size:
+            await buffer.flush()
+
+    # Archived messages are older than anything still in the hot collection
+    async for msg in iter_archived_messages(tenant_id, since):
+        if since is None or msg["created_at"] >= since:
+            await _feed(msg)
+
+    projection = {"tenant_id": 1, "conversation_id": 1, "contact_id": 1, "direction": 1, "created_at": 1}
+    cursor = messages_collection.find(message_query, projection).sort("created_at", 1).batch_size(batch_size)
+    async for msg in cursor:
+        await _feed(msg)
+    await buffer.flush()
+    return scanned
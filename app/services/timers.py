@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.db.mongo_connection import timers_collection
+from app.utils.timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# Wheel resolution; timers fire at most this late
+TIMER_TICK_SECONDS = float(os.getenv("TIMER_TICK_SECONDS", 1.0))
+# Only timers due within this window are held in memory; the rest stay in Mongo until they get close
+TIMER_HORIZON_SECONDS = float(os.getenv("TIMER_HORIZON_SECONDS", 6 * 3600))
+# How often the next slice of the horizon is pulled from Mongo
+TIMER_LOAD_INTERVAL = float(os.getenv("TIMER_LOAD_INTERVAL", 300))
+TIMER_LOAD_BATCH = 5000
+# Handlers running at once (e.g. a backlog of overdue timers after a restart)
+TIMER_MAX_CONCURRENT_FIRES = int(os.getenv("TIMER_MAX_CONCURRENT_FIRES", 32))
+# On shutdown, how long handlers that already claimed their timer get to finish
+TIMER_STOP_SECONDS = float(os.getenv("TIMER_STOP_SECONDS", 10))
+
+# WhatsApp only allows free-form replies within 24h of the customer's last message
+SESSION_WINDOW = timedelta(hours=24)
+
+TimerHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_handlers: Dict[str, TimerHandler] = {}
+# Wheel time is wall-clock seconds so persisted due_at values map onto it directly
+timer_wheel = TimerWheel(tick=TIMER_TICK_SECONDS, now=time.time())
+_loaded_until: float = 0.0
+_tasks: list = []
+_firing: set = set()
+_fire_slots: Optional[asyncio.Semaphore] = None
+_stopping = False
+
+
+def register_timer_handler(kind: str, handler: TimerHandler) -> None:
+    _handlers[kind] = handler
+
+
+def _ts(due_at: datetime) -> float:
+    return due_at.timestamp()
+
+
+async def schedule_timer(key: str, kind: str, due_at: datetime, **fields: Any) -> None:
+    """Persist a timer (replacing any timer with the same key) and arm it if it falls in the loaded window."""
+    # Mongo keeps milliseconds; the stored value must compare equal when the timer is claimed
+    due_at = due_at.replace(microsecond=due_at.microsecond // 1000 * 1000)
+    doc = {"kind": kind, "due_at": due_at, "updated_at": datetime.now(), **fields}
+    await timers_collection.update_one(
+        {"_id": key}, {"$set": doc, "$setOnInsert": {"created_at": datetime.now()}}, upsert=True
+    )
+    if _ts(due_at) < _loaded_until:
+        timer_wheel.schedule(key, _ts(due_at), due_at)
+    else:
+        # Moved out of the window (e.g. a session extended past the horizon)
+        timer_wheel.cancel(key)
+
+
+async def cancel_timer(key: str) -> bool:
+    timer_wheel.cancel(key)
+    result = await timers_collection.delete_one({"_id": key})
+    return result.deleted_count > 0
+
+
+async def _load_window() -> None:
+    """Arm every persisted timer due before now + TIMER_HORIZON_SECONDS that isn't armed yet."""
+    global _loaded_until
+    since, until = _loaded_until, time.time() + TIMER_HORIZON_SECONDS
+    # Widen the window first so timers scheduled while the query runs are armed by schedule_timer
+    _loaded_until = until
+    query: Dict[str, Any] = {"due_at": {"$lt": datetime.fromtimestamp(until)}}
+    if since:
+        query["due_at"]["$gte"] = datetime.fromtimestamp(since)
+    count = 0
+    cursor = timers_collection.find(query, {"due_at": 1}).batch_size(TIMER_LOAD_BATCH)
+    async for doc in cursor:
+        timer_wheel.schedule(doc["_id"], _ts(doc["due_at"]), doc["due_at"])
+        count += 1
+        if count % TIMER_LOAD_BATCH == 0:
+            await asyncio.sleep(0)
+    if count:
+        logger.info("Armed %d timers (%d pending in memory)", count, len(timer_wheel))
+
+
+async def _restore(key: str, doc: Dict[str, Any]) -> None:
+    try:
+        await timers_collection.insert_one(doc)
+    except DuplicateKeyError:
+        # Rescheduled while the handler ran; the newer timer wins
+        pass
+    except Exception:
+        logger.exception("Could not put back timer %s", key)
+
+
+async def _fire(key: str, due_at: datetime) -> None:
+    async with _fire_slots:
+        if _stopping:
+            # Not claimed yet: it stays in Mongo and fires after the restart
+            return
+        doc = None
+        try:
+            # Claiming by (key, due_at) makes each timer fire once across workers and
+            # skips timers that were rescheduled or cancelled through another worker.
+            doc = await timers_collection.find_one_and_delete({"_id": key, "due_at": due_at})
+            if doc is None:
+                return
+            handler = _handlers.get(doc.get("kind"))
+            if handler is None:
+                logger.warning("No handler for timer %s of kind %s", key, doc.get("kind"))
+                return
+            await handler(doc)
+        except asyncio.CancelledError:
+            if doc is not None:
+                # Cut off at shutdown after claiming: put the timer back so it fires after the restart
+                await _restore(key, doc)
+            raise
+        except Exception:
+            logger.exception("Timer %s failed", key)
+
+
+async def _run_wheel() -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await asyncio.sleep(TIMER_TICK_SECONDS)
+            for timer in timer_wheel.advance(time.time()):
+                task = loop.create_task(_fire(timer.key, timer.payload))
+                _firing.add(task)
+                task.add_done_callback(_firing.discard)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Timer wheel iteration failed")
+
+
+async def _run_loader() -> None:
+    while True:
+        try:
+            await asyncio.sleep(TIMER_LOAD_INTERVAL)
+            await _load_window()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Loading timers failed")
+
+
+async def start_timers() -> None:
+    """Reload persisted timers (including overdue ones missed while down) and start the wheel."""
+    global _loaded_until, _fire_slots, _stopping
+    if _tasks:
+        return
+    _stopping = False
+    _fire_slots = asyncio.Semaphore(TIMER_MAX_CONCURRENT_FIRES)
+    timer_wheel.current = int(time.time() // timer_wheel.tick)
+    _loaded_until = 0.0
+    try:
+        await _load_window()
+    except Exception:
+        logger.exception("Failed to load persisted timers")
+    loop = asyncio.get_running_loop()
+    _tasks.extend([loop.create_task(_run_wheel()), loop.create_task(_run_loader())])
+
+
+async def stop_timers(timeout: float = TIMER_STOP_SECONDS) -> None:
+    """Stop the wheel, then give handlers that already claimed their timer `timeout` seconds to finish.
+
+    Armed timers that were not claimed yet stay in Mongo and fire after the
+    restart. A handler still running at the deadline is cancelled and puts
+    its timer back, so it runs again after the restart (at least once).
+    """
+    global _stopping
+    _stopping = True
+    for task in _tasks:
+        task.cancel()
+    for task in _tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _tasks.clear()
+    if _firing:
+        _, pending = await asyncio.wait(list(_firing), timeout=timeout)
+        if pending:
+            logger.warning("Cancelling %d timer handlers still running after %.0fs", len(pending), timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    _firing.clear()
+
+
+def session_timer_key(conversation_id) -> str:
+    return f"session:{conversation_id}"
+
+
+def followup_timer_key(followup_id) -> str:
+    return f"followup:{followup_id}"
+
@@ -0,0 +1,71 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from app.db.mongo_connection import usage_daily_collection
+from app.utils.aggregation import IncrementBuffer
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", 10.0))
+
+# Per-tenant per-day AI usage counters, flushed periodically as $inc upserts
+usage_buffer = IncrementBuffer(usage_daily_collection, flush_interval=USAGE_FLUSH_INTERVAL, name="usage_daily")
+
+_COUNTERS = ("requests", "errors", "prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens", "cache_hits", "latency_ms")
+
+
+def _day(ts: Optional[datetime] = None) -> str:
+    return (ts or datetime.now()).strftime("%Y-%m-%d")
+
+
+def _model_key(model: str) -> str:
+    # Field names can't contain dots in update paths
+    return model.replace(".", "_")
+
+
+def record_usage(tenant_id, ai_doc: Dict[str, Any], ts: Optional[datetime] = None) -> None:
+    """Add one AI call (the outbound message's `ai` field) to the tenant's daily counters."""
+    if tenant_id is None or not ai_doc:
+        return
+    usage = ai_doc.get("usage") or {}
+    inc = {
+        "requests": 1,
+        "errors": 1 if ai_doc.get("error") else 0,
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+        "cached_tokens": usage.get("cached_tokens", 0),
+        "cache_hits": 1 if ai_doc.get("cache_hit") else 0,
+        "latency_ms": ai_doc.get("latency_ms") or 0,
+    }
+    model = ai_doc.get("model")
+    if model:
+        prefix = f"models.{_model_key(model)}"
+        inc[f"{prefix}.requests"] = 1
+        inc[f"{prefix}.prompt_tokens"] = inc["prompt_tokens"]
+        inc[f"{prefix}.completion_tokens"] = inc["completion_tokens"]
+        inc[f"{prefix}.latency_ms"] = inc["latency_ms"]
+
+    usage_buffer.add({"tenant_id": tenant_id, "day": _day(ts)}, inc)
+
+
+async def get_usage(tenant_id, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    """Daily usage documents and totals for `tenant_id` between `start` and `end` (YYYY-MM-DD, inclusive)."""
+    end = end or _day()
+    start = start or (datetime.strptime(end, "%Y-%m-%d") - timedelta(days=29)).strftime("%Y-%m-%d")
+
+    cursor = usage_daily_collection.find(
+        {"tenant_id": tenant_id, "day": {"$gte": start, "$lte": end}},
+        {"_id": 0, "tenant_id": 0},
+    ).sort("day", 1)
+    days = await cursor.to_list(length=None)
+
+    totals = {name: 0 for name in _COUNTERS}
+    for day in days:
+        for name in _COUNTERS:
+            totals[name] += day.get(name, 0)
+    totals["avg_latency_ms"] = round(totals["latency_ms"] / totals["requests"], 1) if totals["requests"] else 0.0
+
+    return {"start": start, "end": end, "days": days, "totals": totals}
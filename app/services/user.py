@@ -85,6 +85,7 @@ import httpx
 import os
 import logging
 from passlib.context import CryptContext
+from app.utils.offload import OffloadPool, WindowThrottle
 
 logger = logging.getLogger(__name__)
 
@@ -96,6 +97,18 @@ FACEBOOK_GRAPH_URL = os.getenv("FACEBOOK_GRAPH_URL", "https://graph.facebook.com
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt takes ~100-300ms of CPU per call; it runs on this bounded pool instead of the event loop
+AUTH_POOL_WORKERS = int(os.getenv("AUTH_POOL_WORKERS", 2))
+AUTH_POOL_QUEUE = int(os.getenv("AUTH_POOL_QUEUE", 32))
+AUTH_POOL_KIND = os.getenv("AUTH_POOL_KIND", "thread")
+auth_pool = OffloadPool("auth", max_workers=AUTH_POOL_WORKERS, max_queue=AUTH_POOL_QUEUE, kind=AUTH_POOL_KIND)
+
+# Login attempts per minute, counted per client IP and per phone number
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", 20))
+LOGIN_MAX_ATTEMPTS_PER_PHONE = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_PHONE", 5))
+login_ip_throttle = WindowThrottle(LOGIN_MAX_ATTEMPTS_PER_IP, window=60)
+login_phone_throttle = WindowThrottle(LOGIN_MAX_ATTEMPTS_PER_PHONE, window=60)
+
 class UserRegistrationError(Exception):
     pass
 
@@ -105,11 +118,15 @@ def get_password_hash(password):
 def verify_password_sync(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password(password: str) -> str:
+    """get_password_hash on the auth pool (raises OffloadRejected when saturated)."""
+    return await auth_pool.run(get_password_hash, password)
+
 async def verify_password(phone_number: str, plain_password: str):
     tenant = await tenants_collection.find_one({"phone_e164_enc": phone_number})
-    if not tenant:
+    if not tenant or not tenant.get("password"):
         return None
-    if not verify_password_sync(plain_password, tenant["password"]):
+    if not await auth_pool.run(verify_password_sync, plain_password, tenant["password"]):
         return None
     return tenant
 
@@ -188,7 +205,7 @@ async def upsert_user_with_onboarding(
     slug_base = f"{waba_id or phone_number_id or whatsapp_number}"
     slug = _slugify(slug_base)
     phone_hash = _phone_hash(phone_e164)
-    hashed_password = get_password_hash(password) if password else None
+    hashed_password = await hash_password(password) if password else None
 
     tenant_query = {"$or": [
         {"phone_number_id": phone_number_id},
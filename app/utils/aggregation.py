@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+def _key(filter_doc: Dict[str, Any]) -> Tuple[Tuple[str, Hashable], ...]:
+    return tuple(sorted(filter_doc.items()))
+
+
+class IncrementBuffer:
+    """Accumulate counter updates in memory and write them as batched `$inc` upserts.
+
+    Many small increments against the same document (e.g. one per message) are
+    merged into a single UpdateOne per document per flush; fields passed as
+    `maximum` (e.g. sketch registers) keep their largest value via `$max`. Flushing happens
+    periodically from a background task, when the buffer grows past `max_keys`,
+    and on shutdown via `stop()`.
+    """
+
+    def __init__(self, collection, flush_interval: float = 5.0, max_keys: int = 5000, name: str = "buffer"):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self.name = name
+        self._pending: Dict[tuple, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def add(
+        self,
+        filter_doc: Dict[str, Any],
+        inc: Dict[str, float],
+        maximum: Optional[Dict[str, float]] = None,
+        set_on_insert: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        key = _key(filter_doc)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = {"filter": dict(filter_doc), "inc": {}, "max": {}, "set_on_insert": {}}
+
+        counters = entry["inc"]
+        for field, value in inc.items():
+            counters[field] = counters.get(field, 0) + value
+        if maximum:
+            highest = entry["max"]
+            for field, value in maximum.items():
+                if field not in highest or value > highest[field]:
+                    highest[field] = value
+        if set_on_insert:
+            entry["set_on_insert"].update(set_on_insert)
+
+        if len(self._pending) >= self.max_keys and (self._flushing is None or self._flushing.done()):
+            try:
+                self._flushing = asyncio.get_running_loop().create_task(self.flush())
+            except RuntimeError:
+                # No running loop (e.g. offline scripts); the caller flushes explicitly
+                pass
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write all pending increments. Returns the number of documents updated."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+
+        keys, updates, ops = [], [], []
+        for key, entry in batch.items():
+            update: Dict[str, Any] = {}
+            if entry["inc"]:
+                update["$inc"] = entry["inc"]
+            if entry["max"]:
+                update["$max"] = entry["max"]
+            if entry["set_on_insert"]:
+                update["$setOnInsert"] = entry["set_on_insert"]
+            if update:
+                keys.append(key)
+                updates.append(update)
+                ops.append(UpdateOne(entry["filter"], update, upsert=True))
+
+        if not ops:
+            return 0
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every op not listed in writeErrors was applied and must not be written again
+            failed = [(err["index"], err.get("code")) for err in e.details.get("writeErrors", [])]
+            # Two workers upserting the same new document: one insert loses on the unique index,
+            # but the document exists now, so the increment goes through as a plain update
+            racing = [i for i, code in failed if code == DUPLICATE_KEY]
+            retry_failed = set()
+            if racing:
+                retries = [UpdateOne(batch[keys[i]]["filter"], updates[i]) for i in racing]
+                try:
+                    await self.collection.bulk_write(retries, ordered=False)
+                except BulkWriteError as retry_error:
+                    retry_failed = {racing[err["index"]] for err in retry_error.details.get("writeErrors", [])}
+                except Exception:
+                    retry_failed = set(racing)
+            requeue = {i for i, code in failed if code != DUPLICATE_KEY} | retry_failed
+            if requeue:
+                logger.error("Failed to flush %d of %d %s docs; keeping them for the next flush", len(requeue), len(ops), self.name)
+            for i in requeue:
+                self._merge_back(keys[i], batch[keys[i]])
+            return len(ops) - len(requeue)
+        except Exception:
+            # Nothing says which ops reached the server; keep them all (at worst an increment is counted twice)
+            logger.exception("Failed to flush %s (%d docs); keeping them for the next flush", self.name, len(ops))
+            for key, entry in batch.items():
+                self._merge_back(key, entry)
+            return 0
+        except asyncio.CancelledError:
+            # The batch is already out of _pending; put it back so a later flush still writes it
+            for key, entry in batch.items():
+                self._merge_back(key, entry)
+            raise
+        return len(ops)
+
+    def _merge_back(self, key: tuple, entry: Dict[str, Any]) -> None:
+        current = self._pending.get(key)
+        if current is None:
+            self._pending[key] = entry
+            return
+        for field, value in entry["inc"].items():
+            current["inc"][field] = current["inc"].get(field, 0) + value
+        for field, value in entry["max"].items():
+            if field not in current["max"] or value > current["max"][field]:
+                current["max"][field] = value
+        for field, value in entry["set_on_insert"].items():
+            current["set_on_insert"].setdefault(field, value)
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Periodic flush of %s failed", self.name)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic task, letting a flush already in progress finish, then write what is left."""
+        if self._task is not None:
+            # Not cancelled: a flush in progress has already taken its batch out of _pending
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        await self.flush()
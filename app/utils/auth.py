@@ -1,13 +1,21 @@
 import os
+import hmac
+import time
+import hashlib
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
 from jose import JWTError, jwt
 from pydantic import BaseModel
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette import status
 
+from app.utils.cache import TTLCache
+
 # Token data model
 class TokenData(BaseModel):
     tenant_id: Optional[str] = None
@@ -16,9 +24,24 @@ class TokenData(BaseModel):
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Shared secret for operator-only endpoints (/debug/*); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Verified tokens kept in memory so dashboard polling doesn't re-verify the signature every request
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
 
 security = HTTPBearer()
 
+# sha256(token) -> tenant id; entries expire with the token's own `exp`
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+@dataclass
+class TenantContext:
+    """The authenticated tenant, resolved once per request."""
+    tenant_id: str
+    oid: ObjectId
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -30,6 +53,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def verify_token(token: str, credentials_exception) -> TokenData:
+    key = hashlib.sha256(token.encode()).digest()
+    tenant_id = token_cache.get(key)
+    if tenant_id is not None:
+        return TokenData(tenant_id=tenant_id)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         tenant_id: str = payload.get("sub")
@@ -38,12 +65,33 @@ def verify_token(token: str, credentials_exception) -> TokenData:
         token_data = TokenData(tenant_id=tenant_id)
     except JWTError:
         raise credentials_exception
+    exp = payload.get("exp")
+    if exp is not None:
+        remaining = float(exp) - time.time()
+        if remaining > 0:
+            token_cache.set(key, tenant_id, ttl=min(remaining, token_cache.ttl))
     return token_data
 
-async def get_current_tenant(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
+async def get_current_tenant(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> TenantContext:
+    # Router-level and endpoint-level declarations share the context resolved first
+    context = getattr(request.state, "tenant", None)
+    if context is not None:
+        return context
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    return verify_token(credentials.credentials, credentials_exception)
+    token_data = verify_token(credentials.credentials, credentials_exception)
+    try:
+        oid = ObjectId(token_data.tenant_id)
+    except (InvalidId, TypeError):
+        raise credentials_exception
+    context = request.state.tenant = TenantContext(tenant_id=token_data.tenant_id, oid=oid)
+    return context
+
+async def require_admin(credentials: HTTPAuthorizationCredentials = Depends(security)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not hmac.compare_digest(credentials.credentials, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
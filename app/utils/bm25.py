@@ -0,0 +1,213 @@
+import sys
+import json
+import math
+import zlib
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import nlargest
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class BM25Index:
+    """In-process BM25 index with compact array-backed postings.
+
+    Every term owns two parallel arrays: internal document ids (uint32) and
+    term frequencies (uint16). Documents are appended incrementally; removals
+    are tombstoned and the postings are compacted once tombstones dominate.
+    Each document carries a small payload (the chunk text) so retrieval needs
+    no database round trip.
+    """
+
+    # A term whose postings outnumber the candidates by this factor only rescores candidates
+    RESCORE_RATIO = 8
+    # Layout written by to_bytes; older snapshots fail to load and are rebuilt from the chunks
+    SNAPSHOT_FORMAT = 1
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.post_docs: List[array] = []
+        self.post_tfs: List[array] = []
+        self.doc_len = array("I")
+        self.keys: List[Any] = []
+        self.payloads: List[Any] = []
+        self.key_to_doc: Dict[Any, int] = {}
+        self.deleted: set = set()
+        self.total_len = 0
+        self._norm: Optional[array] = None
+        self._impacts: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys) - len(self.deleted)
+
+    def add(self, key: Any, tokens: Iterable[str], payload: Any = None) -> None:
+        if key in self.key_to_doc:
+            self.remove(key)
+        doc = len(self.keys)
+        counts = Counter(tokens)
+        length = sum(counts.values())
+        for term, tf in counts.items():
+            tid = self.vocab.get(term)
+            if tid is None:
+                tid = self.vocab[term] = len(self.post_docs)
+                self.post_docs.append(array("I"))
+                self.post_tfs.append(array("H"))
+            self.post_docs[tid].append(doc)
+            self.post_tfs[tid].append(min(tf, 65535))
+        self.doc_len.append(length)
+        self.keys.append(key)
+        self.payloads.append(payload)
+        self.key_to_doc[key] = doc
+        self.total_len += length
+        self._norm = None
+
+    def remove(self, key: Any) -> bool:
+        doc = self.key_to_doc.pop(key, None)
+        if doc is None:
+            return False
+        self.deleted.add(doc)
+        self.total_len -= self.doc_len[doc]
+        self.payloads[doc] = None
+        self._norm = None
+        if len(self.deleted) > 64 and len(self.deleted) * 4 > len(self.keys):
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        """Rebuild postings without tombstoned documents."""
+        live = [(self.keys[d], self.payloads[d]) for d in range(len(self.keys)) if d not in self.deleted]
+        tokens_by_doc: Dict[int, List[str]] = {}
+        terms = {tid: term for term, tid in self.vocab.items()}
+        for tid, docs in enumerate(self.post_docs):
+            for doc, tf in zip(docs, self.post_tfs[tid]):
+                if doc not in self.deleted:
+                    tokens_by_doc.setdefault(doc, []).extend([terms[tid]] * tf)
+        old_ids = [d for d in range(len(self.keys)) if d not in self.deleted]
+        self.__init__(self.k1, self.b)
+        for old, (key, payload) in zip(old_ids, live):
+            self.add(key, tokens_by_doc.get(old, []), payload)
+
+    def _norms(self) -> array:
+        # k1 * (1 - b + b * dl / avgdl), recomputed lazily after the corpus changes
+        if self._norm is None:
+            live = max(len(self), 1)
+            avgdl = (self.total_len / live) or 1.0
+            k1, b = self.k1, self.b
+            self._norm = array("f", (k1 * (1 - b + b * dl / avgdl) for dl in self.doc_len))
+            self._impacts = {}
+        return self._norm
+
+    def _term_impacts(self, tid: int, n: int) -> array:
+        # Per-posting BM25 contribution of a term, cached until the corpus changes
+        impacts = self._impacts.get(tid)
+        if impacts is None:
+            docs, tfs, norms = self.post_docs[tid], self.post_tfs[tid], self._norm
+            df = len(docs)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            k1p1 = self.k1 + 1
+            impacts = self._impacts[tid] = array("f", (idf * tf * k1p1 / (tf + norms[doc]) for doc, tf in zip(docs, tfs)))
+        return impacts
+
+    def search(self, tokens: Iterable[str], k: int = 5) -> List[Tuple[Any, float, Any]]:
+        """Top-k (key, score, payload) for the query tokens.
+
+        Terms are scored rarest first. Once there are candidates, a term whose
+        posting list is much longer than the candidate set only rescores those
+        candidates (binary search over its doc-ordered postings), and a term
+        found in over a quarter of the corpus is skipped outright when the
+        candidate set is too large to rescore; such terms carry little idf,
+        so documents matching only them cannot outrank the candidates by much.
+        """
+        n = len(self)
+        if not n:
+            return []
+        self._norms()
+        vocab, post_docs = self.vocab, self.post_docs
+        tids = sorted({vocab[t] for t in tokens if t in vocab}, key=lambda tid: len(post_docs[tid]))
+        scores: Dict[int, float] = {}
+        for tid in tids:
+            docs = post_docs[tid]
+            impacts = self._term_impacts(tid, n)
+            df = len(docs)
+            if not scores:
+                scores = dict(zip(docs, impacts))
+            elif len(scores) >= k and df > self.RESCORE_RATIO * len(scores):
+                for doc in scores:
+                    i = bisect_left(docs, doc)
+                    if i < df and docs[i] == doc:
+                        scores[doc] += impacts[i]
+            elif len(scores) >= k and df * 4 > n:
+                continue
+            else:
+                get = scores.get
+                for doc, impact in zip(docs, impacts):
+                    scores[doc] = get(doc, 0.0) + impact
+        if self.deleted:
+            for doc in self.deleted & scores.keys():
+                del scores[doc]
+        best = nlargest(k, scores.items(), key=itemgetter(1))
+        return [(self.keys[doc], score, self.payloads[doc]) for doc, score in best]
+
+    def to_bytes(self) -> bytes:
+        """Compressed snapshot: a JSON header (terms, keys, payloads) followed by the raw arrays.
+
+        Postings are concatenated into one docs and one tfs array with per-term
+        offsets. Keys are stored as strings and payloads must be JSON values.
+        Nothing in the snapshot is executable, so loading one from the database
+        is as safe as parsing JSON.
+        """
+        offsets, docs, tfs = array("I", [0]), array("I"), array("H")
+        for term_docs, term_tfs in zip(self.post_docs, self.post_tfs):
+            docs.extend(term_docs)
+            tfs.extend(term_tfs)
+            offsets.append(len(docs))
+        header = {
+            "format": self.SNAPSHOT_FORMAT, "byteorder": sys.byteorder, "k1": self.k1, "b": self.b,
+            "total_len": self.total_len, "terms": sorted(self.vocab, key=self.vocab.__getitem__),
+            "keys": [str(key) for key in self.keys], "payloads": self.payloads, "deleted": sorted(self.deleted),
+        }
+        head = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode()
+        body = b"".join(a.tobytes() for a in (offsets, docs, tfs, self.doc_len))
+        return zlib.compress(struct.pack("<I", len(head)) + head + body, 6)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, key: Callable[[str], Any] = str) -> "BM25Index":
+        """Load a `to_bytes` snapshot; `key` turns the stored key strings back into keys (e.g. ObjectId)."""
+        raw = memoryview(zlib.decompress(data))
+        (size,) = struct.unpack_from("<I", raw)
+        header = json.loads(bytes(raw[4:4 + size]))
+        if header.get("format") != cls.SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported index snapshot format {header.get('format')!r}")
+        terms, keys = header["terms"], header["keys"]
+        pos = 4 + size
+
+        def take(code: str, count: int) -> array:
+            nonlocal pos
+            a = array(code)
+            a.frombytes(raw[pos:pos + count * a.itemsize])
+            pos += count * a.itemsize
+            if header["byteorder"] != sys.byteorder:
+                a.byteswap()
+            return a
+
+        offsets = take("I", len(terms) + 1)
+        docs, tfs = take("I", offsets[-1]), take("H", offsets[-1])
+        doc_len = take("I", len(keys))
+        if pos != len(raw) or len(doc_len) != len(keys):
+            raise ValueError("Truncated index snapshot")
+
+        index = cls(header["k1"], header["b"])
+        index.vocab = {term: tid for tid, term in enumerate(terms)}
+        index.post_docs = [docs[offsets[tid]:offsets[tid + 1]] for tid in range(len(terms))]
+        index.post_tfs = [tfs[offsets[tid]:offsets[tid + 1]] for tid in range(len(terms))]
+        index.doc_len = doc_len
+        index.keys = [key(k) for k in keys]
+        index.payloads = header["payloads"]
+        index.deleted = set(header["deleted"])
+        index.total_len = header["total_len"]
+        index.key_to_doc = {k: doc for doc, k in enumerate(index.keys) if doc not in index.deleted}
+        return index
@@ -1,6 +1,13 @@
-from typing import Dict, Any, List
+import json
+from typing import Dict, Any
 from bson.objectid import ObjectId
 from datetime import datetime
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib encoder is used otherwise
+    orjson = None
 
 def serialize_doc(doc: Any) -> Any:
     """
@@ -35,4 +42,54 @@ def serialize_doc(doc: Any) -> Any:
     return out
 
 def serialize_tenant(doc: Dict[str, Any]) -> Dict[str, Any]:
-    return serialize_doc(doc)
\ No newline at end of file
+    return serialize_doc(doc)
+
+
+def rename_ids(doc: Any) -> Any:
+    """
+    In-place equivalent of serialize_doc's "_id" -> "id" renaming.
+
+    Only dicts and lists are visited; ObjectId and datetime values are left for
+    the JSON encoder hooks in `dumps`, so no document is rebuilt.
+    """
+    t = type(doc)
+    if t is list:
+        for item in doc:
+            if type(item) is dict or type(item) is list:
+                rename_ids(item)
+        return doc
+    if t is not dict:
+        return doc
+
+    for v in doc.values():
+        if type(v) is dict or type(v) is list:
+            rename_ids(v)
+    if "_id" in doc:
+        doc["id"] = doc.pop("_id")
+    return doc
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return obj.hex()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode trusted DB output straight to JSON bytes (ObjectId -> str, datetime -> ISO string)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response for Mongo documents that skips FastAPI's jsonable_encoder and model validation."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
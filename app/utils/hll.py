@@ -0,0 +1,41 @@
+import math
+import hashlib
+from typing import Any, Dict, Tuple
+
+# 2**10 registers: about 3% standard error, and at most 1024 small ints per stored sketch.
+# Changing it invalidates every stored sketch.
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+_RANK_BITS = 64 - HLL_PRECISION
+
+
+def hll_register(value: Any) -> Tuple[str, int]:
+    """Register (as a field name) and rank that `value` sets in a HyperLogLog sketch.
+
+    Sketches are sparse maps of register -> rank. Two sketches merge by taking
+    the larger rank per register, which is what Mongo's `$max` does, so a
+    counter document can fold in one value per update without reading it.
+    """
+    # Unlike hash(), stable across processes: a contact must land in the same register in every worker
+    h = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+    rest = h & ((1 << _RANK_BITS) - 1)
+    return str(h >> _RANK_BITS), _RANK_BITS - rest.bit_length() + 1
+
+
+def hll_merge(into: Dict[str, int], registers: Dict[str, int]) -> None:
+    for register, rank in registers.items():
+        if rank > into.get(register, 0):
+            into[register] = rank
+
+
+def hll_count(registers: Dict[str, int]) -> int:
+    """Estimated number of distinct values folded into the sketch."""
+    m = HLL_REGISTERS
+    zeros = m - len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / (zeros + sum(2.0 ** -rank for rank in registers.values()))
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate while most registers are still empty
+        estimate = m * math.log(m / zeros)
+    return round(estimate)
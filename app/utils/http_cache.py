@@ -0,0 +1,115 @@
+import os
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.utils.helpers import dumps, rename_ids
+
+RESPONSE_CACHE_TENANTS = int(os.getenv("RESPONSE_CACHE_TENANTS", 500))
+RESPONSE_CACHE_ENTRIES_PER_TENANT = int(os.getenv("RESPONSE_CACHE_ENTRIES_PER_TENANT", 32))
+
+
+class ResponseCache:
+    """Small per-tenant LRU of encoded response bodies keyed by (cache key, ETag).
+
+    Entries are only served when their ETag matches the current validator, so
+    a stale entry (e.g. written by another worker) is never returned; the
+    explicit invalidation on message insert just frees memory early.
+    """
+
+    def __init__(self, max_tenants: int = RESPONSE_CACHE_TENANTS, max_entries: int = RESPONSE_CACHE_ENTRIES_PER_TENANT):
+        self.max_tenants = max_tenants
+        self.max_entries = max_entries
+        self._tenants: "OrderedDict[str, OrderedDict[str, Tuple[str, bytes]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tenant_key: str, cache_key: str, etag: str) -> Optional[bytes]:
+        entries = self._tenants.get(tenant_key)
+        entry = entries.get(cache_key) if entries is not None else None
+        if entry is None or entry[0] != etag:
+            self.misses += 1
+            return None
+        self._tenants.move_to_end(tenant_key)
+        entries.move_to_end(cache_key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, tenant_key: str, cache_key: str, etag: str, body: bytes) -> None:
+        entries = self._tenants.get(tenant_key)
+        if entries is None:
+            entries = self._tenants[tenant_key] = OrderedDict()
+            if len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+        else:
+            self._tenants.move_to_end(tenant_key)
+        entries[cache_key] = (etag, body)
+        entries.move_to_end(cache_key)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def invalidate(self, tenant_key: str) -> None:
+        self._tenants.pop(tenant_key, None)
+
+
+response_cache = ResponseCache()
+
+
+def make_etag(cache_key: str, validator: Optional[datetime]) -> str:
+    stamp = validator.isoformat() if validator else "none"
+    return '"' + hashlib.blake2b(f"{cache_key}|{stamp}".encode(), digest_size=12).hexdigest() + '"'
+
+
+def _http_date(ts: datetime) -> str:
+    return formatdate(ts.timestamp(), usegmt=True)
+
+
+def _not_modified(request: Request, etag: str, validator: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = {c.strip().removeprefix("W/") for c in if_none_match.split(",")}
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validator is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(validator.timestamp()) <= int(since.timestamp())
+    return False
+
+
+async def conditional_json(
+    request: Request,
+    tenant_key: str,
+    validator: Optional[datetime],
+    build: Callable[[], Awaitable[Any]],
+) -> Response:
+    """Answer a dashboard read with 304, a cached body, or a freshly built one.
+
+    `validator` is the newest modification time of the data behind the
+    response (conversation `updated_at`); `build` is only awaited when neither
+    the client nor the cache already has the current representation. Document
+    "_id" keys become "id".
+    """
+    cache_key = request.url.path + "?" + str(request.query_params)
+    etag = make_etag(cache_key, validator)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if validator is not None:
+        headers["Last-Modified"] = _http_date(validator)
+
+    if _not_modified(request, etag, validator):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(tenant_key, cache_key, etag)
+    if body is None:
+        content = await build()
+        body = dumps(rename_ids(content))
+        response_cache.put(tenant_key, cache_key, etag, body)
+    return Response(body, media_type="application/json", headers=headers)
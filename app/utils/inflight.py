@@ -0,0 +1,59 @@
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Optional
+
+# Seconds a stopping worker gives in-flight webhooks to finish, counted from the stop signal
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", 25))
+
+
+class InFlight:
+    """Work currently being handled, so shutdown can refuse new work and wait for the rest.
+
+    After `begin_drain()` (on the stop signal) `draining` is set and callers
+    are expected to turn new work away: the webhook answers 503 so Meta
+    redelivers it, to another worker or after the restart. `drain()` returns
+    once nothing is in flight or the deadline, counted from the stop signal,
+    has passed.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.draining_since: Optional[float] = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def draining(self) -> bool:
+        return self.draining_since is not None
+
+    @contextmanager
+    def track(self):
+        self.count += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.count -= 1
+            if self.count == 0:
+                self._idle.set()
+
+    def begin_drain(self) -> None:
+        if self.draining_since is None:
+            self.draining_since = time.monotonic()
+
+    async def drain(self, timeout: float = SHUTDOWN_DRAIN_SECONDS) -> int:
+        """Stop accepting work and wait for what is running; returns how many are still in flight."""
+        self.begin_drain()
+        remaining = timeout - (time.monotonic() - self.draining_since)
+        if self.count and remaining > 0:
+            try:
+                await asyncio.wait_for(self._idle.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return self.count
+
+
+# Inbound webhook deliveries; each is processed inline, so this covers the messages in them
+webhooks_in_flight = InFlight()
@@ -0,0 +1,252 @@
+import os
+import re
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from app.utils.tracing import current_span
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for one JSON object per line, "text" for the classic format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread; when full new records are dropped, never waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Mask customer text, phone numbers, emails and credentials in log output
+LOG_REDACT = os.getenv("LOG_REDACT", "true").lower() in ("1", "true", "yes")
+# Per-category sample rates for INFO/DEBUG records, e.g. "payload=0,content=0.1"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "payload=0,content=0.1")
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id", "span_id"}
+
+# Keys whose values are customer content or secrets, wherever they appear in logged dicts
+_SENSITIVE_KEYS = {"text", "body", "content", "caption", "access_token", "access_token_enc", "password", "token", "authorization"}
+_PATTERNS = [
+    (re.compile(r"(?i)bearer\s+[A-Za-z0-9._~+/=-]+"), "Bearer [REDACTED]"),
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[EMAIL]"),
+    # Unbroken runs of 10+ digits (optional leading +): E.164 and WhatsApp ids, not dates or times
+    (re.compile(r"(?<![\w.])\+?\d{10,}(?!\w)"), "[PHONE]"),
+]
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """Copy of `value` with sensitive keys masked and phone numbers, emails and bearer tokens scrubbed."""
+    if isinstance(value, str):
+        for pattern, replacement in _PATTERNS:
+            value = pattern.sub(replacement, value)
+        return value
+    if depth > 6:
+        return value
+    if isinstance(value, dict):
+        return {
+            k: ("[REDACTED]" if isinstance(k, str) and k.lower() in _SENSITIVE_KEYS and v is not None else redact(v, depth + 1))
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v, depth + 1) for v in value)
+    return value
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        if "=" in part:
+            category, rate = part.split("=", 1)
+            try:
+                rates[category.strip()] = float(rate)
+            except ValueError:
+                pass
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of INFO/DEBUG records per `category` (passed via extra={"category": ...}).
+
+    Runs on the calling thread before anything is queued, so dropped records cost almost nothing.
+    Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = rates if rates is not None else _parse_rates(LOG_SAMPLE_RATES)
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "category", None), 1.0)
+        if rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+            return True
+        self.dropped += 1
+        return False
+
+
+def _redact_args(record: logging.LogRecord) -> None:
+    # Customer and AI text ("content" records) is dropped outright; everything else is scrubbed
+    if not record.args:
+        return
+    if getattr(record, "category", None) == "content" and isinstance(record.args, tuple):
+        record.args = tuple(
+            f"[REDACTED {len(arg)} chars]" if isinstance(arg, str) and i > 0 else redact(arg)
+            for i, arg in enumerate(record.args)
+        )
+    elif isinstance(record.args, (dict, tuple)):
+        record.args = redact(record.args)
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, trace ids and any `extra` fields."""
+
+    def __init__(self, redact_content: bool = LOG_REDACT):
+        super().__init__()
+        self.redact_content = redact_content
+
+    def format(self, record: logging.LogRecord) -> str:
+        if self.redact_content:
+            _redact_args(record)
+        message = record.getMessage()
+        if self.redact_content:
+            message = redact(message)
+        doc: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": message,
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            doc["trace_id"] = trace_id
+            doc["span_id"] = record.span_id
+        for key, value in _extra_fields(record).items():
+            doc[key] = redact(value) if self.redact_content else value
+        if record.exc_info:
+            doc["exc"] = "".join(traceback.format_exception(*record.exc_info))
+        elif record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Classic single-line format with `extra` fields and the trace id appended as key=value pairs."""
+
+    def __init__(self, redact_content: bool = LOG_REDACT):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.redact_content = redact_content
+
+    def format(self, record: logging.LogRecord) -> str:
+        if self.redact_content:
+            _redact_args(record)
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if self.redact_content:
+            fields = redact(fields)
+        if getattr(record, "trace_id", None):
+            fields["trace_id"] = record.trace_id
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        # Only the message is scrubbed; the timestamp and logger name are ours and stay intact
+        if self.redact_content:
+            record.message = redact(record.message)
+        return super().formatMessage(record)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting them.
+
+    The stock QueueHandler renders the message on the calling thread; here the
+    caller only stamps the current trace ids (contextvars don't cross threads)
+    and enqueues. Formatting, redaction and the write happen on the listener
+    thread. A full queue drops the record instead of blocking the event loop.
+    """
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span = current_span()
+        if span is not None:
+            record.trace_id = "%032x" % span.trace_id
+            record.span_id = "%016x" % span.span_id
+        if record.exc_info and not record.exc_text:
+            # Tracebacks reference live frames; render them before the caller moves on
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+queue_handler: Optional[AsyncQueueHandler] = None
+sampling_filter: Optional[SamplingFilter] = None
+
+
+def setup_logging(stream=None) -> None:
+    """Route all logging through a bounded queue to a background writer thread. Safe to call more than once."""
+    global _listener, queue_handler, sampling_filter
+    if _listener is not None:
+        return
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    queue_handler = AsyncQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    sampling_filter = SamplingFilter()
+    queue_handler.addFilter(sampling_filter)
+
+    # Skip per-record work nothing downstream reads: caller frame lookup, thread and process names
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(queue_handler.queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Drain the queue and stop the writer thread; records logged afterwards are written directly."""
+    global _listener
+    if _listener is None:
+        return
+    # Swap handlers before stopping so nothing lands in a queue nobody reads any more
+    root = logging.getLogger()
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    root.removeHandler(queue_handler)
+    _listener.stop()
+    _listener = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    return {
+        "queued": queue_handler.queue.qsize() if queue_handler else 0,
+        "dropped_queue_full": queue_handler.dropped if queue_handler else 0,
+        "dropped_sampled": sampling_filter.dropped if sampling_filter else 0,
+    }
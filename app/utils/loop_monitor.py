@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from app.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() in ("1", "true", "yes")
+# How often the heartbeat coroutine wakes up to measure scheduling lag
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.1))
+# A tick this late counts as a stall and the blocking stack is captured
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", 100))
+# Lag samples kept for the percentiles reported by /health (600 x 100ms = last minute)
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", 600))
+
+LOOP_LAG_SECONDS = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer scheduled for now",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = registry.counter("event_loop_stalls_total", "Loop stalls longer than the lag threshold")
+
+
+class LoopMonitor:
+    """Measures event-loop lag and catches whatever is blocking the loop.
+
+    A heartbeat coroutine sleeps for `interval` and records how late it woke
+    up. A watchdog thread checks that heartbeat; when the loop hasn't come
+    back for `threshold` beyond the expected interval it grabs the loop
+    thread's current stack, which is the code doing the blocking, while the
+    stall is still happening. Cost while healthy is one timer per interval
+    and one thread wake-up per half threshold.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold_ms: float = LOOP_LAG_THRESHOLD_MS,
+                 window: int = LOOP_LAG_WINDOW, max_stalls: int = 20):
+        self.interval = interval
+        self.threshold = threshold_ms / 1000
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=max_stalls)
+        self.enabled = False
+        self.last_tick = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._captured_tick = 0.0
+
+    def start(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.last_tick = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    def configure(self, threshold_ms: Optional[float] = None, interval: Optional[float] = None) -> None:
+        if threshold_ms is not None:
+            self.threshold = threshold_ms / 1000
+        if interval is not None:
+            self.interval = interval
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(now - expected, 0.0)
+            self.last_tick = now
+            self.samples.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.threshold:
+                LOOP_STALLS.inc()
+                stall = self.stalls[-1] if self.stalls and self.stalls[-1]["tick"] == self._captured_tick else None
+                if stall is not None:
+                    stall["lag_ms"] = round(1000 * lag, 1)
+                logger.warning(
+                    "Event loop blocked for %.0fms", 1000 * lag,
+                    extra={"blocking_stack": stall["stack"][-6:] if stall else None, "task": stall["task"] if stall else None},
+                )
+
+    def _watchdog(self) -> None:
+        while not self._stop.wait(min(self.interval, self.threshold) / 2):
+            tick = self.last_tick
+            if time.perf_counter() - tick > self.interval + self.threshold and tick != self._captured_tick:
+                self._captured_tick = tick
+                self._capture(tick)
+
+    def _capture(self, tick: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        self.stalls.append({
+            "tick": tick,
+            "at": time.time(),
+            "lag_ms": None,  # filled in by the heartbeat once the loop recovers
+            "task": task.get_name() if task is not None else None,
+            "coroutine": getattr(task.get_coro(), "__qualname__", None) if task is not None else None,
+            "stack": [line.rstrip() for line in traceback.format_stack(frame)],
+        })
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        samples = sorted(self.samples)
+        if not samples:
+            return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+        pick = lambda q: round(1000 * samples[min(len(samples) - 1, int(q * len(samples)))], 2)
+        return {"p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": round(1000 * samples[-1], 2)}
+
+    def snapshot(self, stacks: bool = False) -> Dict[str, Any]:
+        doc: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "interval_ms": round(1000 * self.interval, 1),
+            "threshold_ms": round(1000 * self.threshold, 1),
+            "samples": len(self.samples),
+            "stalls_total": int(LOOP_STALLS.get()),
+            **self.percentiles(),
+        }
+        if stacks:
+            doc["recent_stalls"] = [{k: v for k, v in s.items() if k != "tick"} for s in reversed(self.stalls)]
+        return doc
+
+    def healthy(self) -> bool:
+        p99 = self.percentiles()["p99_ms"]
+        return p99 is None or p99 < 1000 * self.threshold
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,240 @@
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Label combinations kept per metric; anything beyond is folded into an "other" series
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", 5000))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), max_series: int = METRICS_MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: Dict[Labels, object] = {}
+        self._overflow: Labels = ("other",) * len(self.labelnames)
+
+    def _key(self, labels: Labels) -> Labels:
+        # Callers pass label values positionally; only unseen combinations pay for the size check
+        if labels in self._series or len(self._series) < self.max_series:
+            return labels
+        return self._overflow
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        # list() snapshots the dict in one step, so rendering off the event loop is safe
+        for labels, value in sorted(list(self._series.items())):
+            lines.extend(self._render_series(labels, value))
+        return lines
+
+    def _render_series(self, labels: Labels, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+    def clear(self) -> None:
+        self._series.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        series = self._series
+        try:
+            series[labels] += amount
+        except KeyError:
+            key = self._key(labels)
+            series[key] = series.get(key, 0.0) + amount
+
+    def set_total(self, value: float, *labels: str) -> None:
+        """Mirror a running total kept by another component (read at scrape time)."""
+        self._series[self._key(labels)] = value
+
+    def get(self, *labels: str) -> float:
+        return self._series.get(labels, 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._series[self._key(labels)] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        key = self._key(labels)
+        self._series[key] = self._series.get(key, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels: str) -> float:
+        return self._series.get(labels, 0.0)
+
+    def track(self, *labels: str) -> "_InFlight":
+        """Context manager counting the block as in flight while it runs."""
+        return _InFlight(self, labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = METRICS_MAX_SERIES):
+        super().__init__(name, help, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets))
+        self._le = [f'le="{_format_value(bound)}"' for bound in self.buckets + (float("inf"),)]
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Per series: one (non-cumulative) count per bucket, the +Inf bucket, then the sum
+        series = self._series.get(labels)
+        if series is None:
+            key = self._key(labels)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels: str) -> "_Span":
+        """Context manager observing the block's wall time in seconds."""
+        return _Span(self, labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def _render_series(self, labels: Labels, series) -> List[str]:
+        suffix = _format_labels(self.labelnames, labels)
+        prefix = f"{self.name}_bucket{suffix[:-1]}," if suffix else f"{self.name}_bucket{{"
+        lines = []
+        cumulative = 0
+        for le, count in zip(self._le, series):
+            cumulative += count
+            lines.append(f"{prefix}{le}}} {cumulative}")
+        lines.append(f"{self.name}_sum{suffix} {_format_value(series[-1])}")
+        lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class _Span:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class _InFlight:
+    __slots__ = ("gauge", "labels")
+
+    def __init__(self, gauge: Gauge, labels: Labels):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self) -> "_InFlight":
+        self.gauge.inc(*self.labels)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.gauge.dec(*self.labels)
+
+
+class Registry:
+    """Process-wide set of metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served", ("method",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, labelled by the matched route template (not the raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(method)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method, getattr(route, "path", "unmatched"), str(status)
+            )
@@ -0,0 +1,97 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OffloadRejected(Exception):
+    """Raised when an offload pool's queue is full."""
+    pass
+
+
+class OffloadPool:
+    """Bounded executor for CPU-heavy calls (password hashing) kept off the event loop.
+
+    At most `max_workers` calls run at once and at most `max_queue` more wait
+    for a worker; anything beyond that is rejected immediately instead of
+    piling up behind a burst. Threads suffice for bcrypt, which releases the
+    GIL while hashing; use kind="process" for pure-Python work.
+    """
+
+    def __init__(self, name: str, max_workers: int = 2, max_queue: int = 32, kind: str = "thread"):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise OffloadRejected(f"{self.name} pool is saturated ({self.pending} pending)")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+class WindowThrottle:
+    """Fixed-window attempt counter per key (phone number, client IP), bounded to `max_keys`."""
+
+    def __init__(self, limit: int, window: float = 60.0, max_keys: int = 100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[Hashable, list]" = OrderedDict()
+
+    def hit(self, key: Hashable) -> Optional[float]:
+        """Count an attempt; returns seconds until retry if `key` is over its limit, else None."""
+        now = time.monotonic()
+        entry = self._windows.get(key)
+        if entry is None or now - entry[0] >= self.window:
+            entry = self._windows[key] = [now, 0]
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        self._windows.move_to_end(key)
+        if entry[1] >= self.limit:
+            return max(entry[0] + self.window - now, 0.0)
+        entry[1] += 1
+        return None
+
+    def reset(self, key: Hashable) -> None:
+        self._windows.pop(key, None)
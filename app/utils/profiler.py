@@ -0,0 +1,282 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.utils.tracing import TraceRing, trace_buffer
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for one on-demand profile
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+# Keep a profile of every trace slower than this (0 disables slow-request mode)
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", 0))
+# Sampling period of the always-on sampler behind slow-request mode
+PROFILE_SLOW_INTERVAL_MS = float(os.getenv("PROFILE_SLOW_INTERVAL_MS", 20))
+# Root span names slow-request mode looks at, comma separated
+PROFILE_SLOW_TRACES = os.getenv("PROFILE_SLOW_TRACES", "whatsapp.message")
+# Seconds of samples held for attribution; traces longer than this are only partly covered
+PROFILE_SLOW_WINDOW = float(os.getenv("PROFILE_SLOW_WINDOW", 60))
+PROFILE_SLOW_KEEP = int(os.getenv("PROFILE_SLOW_KEEP", 20))
+
+# Innermost Python frames of a thread that is waiting rather than running
+_IDLE_LEAVES = {
+    "selectors.py:select", "threading.py:wait", "threading.py:_wait_for_tstate_lock",
+    "queue.py:get", "thread.py:_worker",
+}
+
+Stack = Tuple[str, ...]
+Sample = Tuple[str, Stack]
+
+_labels: Dict[Any, str] = {}
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+    return label
+
+
+def _walk(frame) -> Stack:
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+def is_idle(stack: Stack) -> bool:
+    return bool(stack) and stack[-1] in _IDLE_LEAVES
+
+
+class _ThreadNames:
+    """ident -> thread name, refreshed at most once a second."""
+
+    def __init__(self):
+        self._names: Dict[int, str] = {}
+        self._refreshed = 0.0
+
+    def get(self, ident: int) -> str:
+        name = self._names.get(ident)
+        if name is None or time.monotonic() - self._refreshed > 1.0:
+            self._names = {t.ident: t.name for t in threading.enumerate()}
+            self._refreshed = time.monotonic()
+            name = self._names.get(ident, f"thread-{ident}")
+        return name
+
+
+def take_sample(names: _ThreadNames, skip: int) -> List[Sample]:
+    """Current stack of every thread except `skip` (the sampling thread itself)."""
+    return [(names.get(ident), _walk(frame)) for ident, frame in sys._current_frames().items() if ident != skip]
+
+
+class Profile:
+    """Aggregated samples: (thread name, stack) -> count."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.started = time.time()
+        self.duration = 0.0
+
+    def add(self, sample: List[Sample]) -> None:
+        self.samples += 1
+        self.counts.update(sample)
+
+    def collapsed(self, include_idle: bool = False) -> str:
+        """Brendan Gregg's collapsed-stack format (thread;outer;...;inner count), for flamegraph.pl or speedscope."""
+        lines = [
+            f"{';'.join((thread,) + stack)} {count}"
+            for (thread, stack), count in self.counts.most_common()
+            if include_idle or not is_idle(stack)
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def to_dict(self, limit: int = 30, include_idle: bool = False) -> Dict[str, Any]:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        threads: Counter = Counter()
+        busy = 0
+        for (thread, stack), count in self.counts.items():
+            if not include_idle and is_idle(stack):
+                continue
+            busy += count
+            threads[thread] += count
+            if stack:
+                own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        ms = 1000 * self.interval
+        return {
+            "started": self.started,
+            "duration_s": round(self.duration, 3),
+            "interval_ms": round(ms, 2),
+            "samples": self.samples,
+            "busy_samples": busy,
+            "threads": {name: round(count * ms) for name, count in threads.most_common()},
+            "top_self_ms": [{"frame": f, "ms": round(c * ms)} for f, c in own.most_common(limit)],
+            "top_total_ms": [{"frame": f, "ms": round(c * ms)} for f, c in total.most_common(limit)],
+        }
+
+
+class ProfilerBusy(Exception):
+    """Raised when an on-demand profile is already running in this worker."""
+    pass
+
+
+_profile_lock = threading.Lock()
+
+
+def profile(seconds: float, interval: float = 0.005) -> Profile:
+    """Sample every thread of this process for `seconds`. Blocking: call it via asyncio.to_thread.
+
+    Only stacks are captured (no tracing hooks), so the cost to the rest of
+    the process is one sys._current_frames() walk per interval.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        result = Profile(interval)
+        names = _ThreadNames()
+        me = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_at = started
+        while True:
+            result.add(take_sample(names, me))
+            next_at += interval
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if next_at > now:
+                time.sleep(next_at - now)
+            else:
+                next_at = now
+        result.duration = time.perf_counter() - started
+        # The sampler waits for the GIL, so the real spacing is usually wider than asked for
+        result.interval = result.duration / result.samples
+        return result
+    finally:
+        _profile_lock.release()
+
+
+class SlowRequestProfiler:
+    """Always-on low-rate sampler that keeps profiles of slow traces.
+
+    A thread samples every thread's stack each `interval` into a ring covering
+    the last `window` seconds. It follows the trace buffer like the exporter
+    does; when a finished trace named in `trace_names` took longer than
+    `threshold`, the samples taken while it ran become that trace's profile.
+    Samples cover the whole process during that time, so concurrent requests
+    show up too; the frames under the webhook handler are the request's own.
+    """
+
+    def __init__(self, ring: TraceRing, threshold_ms: float = PROFILE_SLOW_REQUEST_MS,
+                 interval_ms: float = PROFILE_SLOW_INTERVAL_MS, window: float = PROFILE_SLOW_WINDOW,
+                 trace_names: str = PROFILE_SLOW_TRACES, keep: int = PROFILE_SLOW_KEEP):
+        self.ring = ring
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.trace_names = {n.strip() for n in trace_names.split(",") if n.strip()}
+        self.samples: Deque[Tuple[float, List[Sample]]] = deque(maxlen=max(1, int(window / self.interval)))
+        self.kept: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self.cursor = ring.written
+        self._stacks: Dict[Stack, Stack] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def start(self, threshold_ms: Optional[float] = None) -> None:
+        if threshold_ms is not None:
+            self.threshold = threshold_ms / 1000
+        if self._thread is not None or self.threshold <= 0:
+            return
+        self.cursor = self.ring.written
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(1.0)
+        self._thread = None
+        self.samples.clear()
+
+    def _intern(self, sample: List[Sample]) -> List[Sample]:
+        # The same few hundred stacks repeat; share one tuple per distinct stack
+        if len(self._stacks) > 50000:
+            self._stacks.clear()
+        return [(thread, self._stacks.setdefault(stack, stack)) for thread, stack in sample]
+
+    def _run(self) -> None:
+        names = _ThreadNames()
+        me = threading.get_ident()
+        checked = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self.samples.append((now, self._intern(take_sample(names, me))))
+            if now - checked >= 0.5:
+                checked = now
+                try:
+                    self._check_traces()
+                except Exception:
+                    logger.exception("Slow request profiler failed")
+
+    def _check_traces(self) -> None:
+        traces, self.cursor, _ = self.ring.since(self.cursor)
+        for trace in traces:
+            root = trace.root
+            if root.duration < self.threshold or (self.trace_names and root.name not in self.trace_names):
+                continue
+            end = root.started + root.duration
+            result = Profile(self.interval)
+            result.started = time.time() - (time.perf_counter() - root.started)
+            result.duration = root.duration
+            for at, sample in list(self.samples):
+                if root.started <= at <= end:
+                    result.add(sample)
+            if result.samples:
+                result.interval = root.duration / result.samples
+            self.kept.append({
+                "trace_id": root.trace_hex,
+                "name": root.name,
+                "duration_ms": round(1000 * root.duration, 1),
+                "attrs": root.attrs,
+                "profile": result,
+            })
+            logger.warning(
+                "Slow %s (%.0fms), kept a %d-sample profile", root.name, 1000 * root.duration, result.samples,
+                extra={"slow_trace_id": root.trace_hex},
+            )
+
+    def find(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        for entry in reversed(list(self.kept)):
+            if entry["trace_id"] == trace_id:
+                return entry
+        return None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": round(1000 * self.threshold, 1),
+            "interval_ms": round(1000 * self.interval, 1),
+            "profiles": [
+                {k: v for k, v in entry.items() if k != "profile"} | {"samples": entry["profile"].samples}
+                for entry in reversed(list(self.kept))
+            ],
+        }
+
+
+slow_request_profiler = SlowRequestProfiler(trace_buffer)
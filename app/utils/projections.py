@@ -0,0 +1,54 @@
+from typing import Any, Dict, Iterable, Optional, Set
+from fastapi import HTTPException
+
+# Compact list views: what the dashboard needs to render a row
+MESSAGE_LIST_FIELDS = ("_id", "conversation_id", "contact_id", "direction", "wa_type", "content.text", "status", "created_at")
+# Extra message fields a client can ask for with ?fields=
+MESSAGE_DETAIL_FIELDS = {"tenant_id", "channel", "content", "ai", "wa_message_id", "wa_timestamp", "error_code", "error_message"}
+
+CONVERSATION_LIST_FIELDS = ("_id", "contact_id", "mode", "status", "last_message_at", "updated_at")
+CONVERSATION_DETAIL_FIELDS = {"tenant_id", "channel", "created_at", "metadata", "session_window_expires_at", "contact_info", "last_message"}
+
+CONTACT_SUMMARY_FIELDS = ("_id", "display_name", "wa_phone_hash")
+LAST_MESSAGE_SUMMARY_FIELDS = ("_id", "direction", "content.text", "status", "created_at")
+
+FIELDS_DESCRIPTION = "Comma separated extra fields to include beyond the compact list view"
+
+
+def parse_fields(fields: Optional[str], allowed: Set[str]) -> Set[str]:
+    """Parse a comma separated ?fields= value. Unknown fields are a 400."""
+    if not fields:
+        return set()
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(sorted(allowed))}",
+        )
+    return requested
+
+
+def build_projection(base: Iterable[str], extra: Iterable[str] = ()) -> Dict[str, int]:
+    """Inclusion projection for `base` + `extra`, dropping paths covered by a parent (e.g. content.text under content)."""
+    paths = set(base) | set(extra)
+    return {
+        p: 1 for p in sorted(paths)
+        if not any(p.startswith(parent + ".") for parent in paths if parent != p)
+    }
+
+
+def project_doc(doc: Dict[str, Any], projection: Dict[str, int]) -> Dict[str, Any]:
+    """Apply an inclusion projection in Python (for documents not read through a Mongo query)."""
+    out: Dict[str, Any] = {}
+    for path in projection:
+        head, _, rest = path.partition(".")
+        if head not in doc:
+            continue
+        if not rest:
+            out[head] = doc[head]
+        elif isinstance(doc[head], dict):
+            nested = project_doc(doc[head], {rest: 1})
+            if nested:
+                out.setdefault(head, {}).update(nested)
+    return out
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+
+class Subscription:
+    """One subscriber's bounded event buffer."""
+    __slots__ = ("topic", "queue", "closed", "reason", "delivered")
+
+    def __init__(self, topic: str, buffer_size: int):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.closed = False
+        self.reason: Optional[str] = None
+        self.delivered = 0
+
+    def close(self, reason: str) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.reason = reason
+        try:
+            # Wake a consumer blocked on an empty queue
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def next(self, timeout: Optional[float] = None) -> Any:
+        """Next event, or None on timeout or once the subscription is closed."""
+        if self.closed:
+            return None
+        try:
+            if timeout is None:
+                return await self.queue.get()
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """In-process topic pub/sub with bounded per-subscriber buffers.
+
+    Publishing never blocks: a subscriber whose buffer is full is considered a
+    slow consumer and is disconnected instead of growing memory or delaying
+    everyone else.
+    """
+
+    def __init__(self, buffer_size: int = 100):
+        self.buffer_size = buffer_size
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, topic: str) -> Subscription:
+        sub = Subscription(topic, self.buffer_size)
+        self._topics.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._topics.get(sub.topic)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._topics[sub.topic]
+
+    def publish(self, topic: str, event: Any) -> int:
+        """Deliver `event` to every subscriber of `topic`. Returns the number of subscribers reached."""
+        subs = self._topics.get(topic)
+        if not subs:
+            return 0
+        self.published += 1
+        delivered = 0
+        for sub in list(subs):
+            try:
+                sub.queue.put_nowait(event)
+                sub.delivered += 1
+                delivered += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+                sub.close("slow consumer")
+                self.unsubscribe(sub)
+        return delivered
+
+    def close_all(self, reason: str = "server shutting down") -> None:
+        for subs in list(self._topics.values()):
+            for sub in list(subs):
+                sub.close(reason)
+        self._topics.clear()
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        if topic is not None:
+            return len(self._topics.get(topic, ()))
+        return sum(len(s) for s in self._topics.values())
@@ -0,0 +1,258 @@
+import os
+import time
+import logging
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.utils.metrics import registry
+from app.utils.tracing import current_span, current_trace_id
+
+logger = logging.getLogger(__name__)
+
+MONGO_QUERY_ACCOUNTING = os.getenv("MONGO_QUERY_ACCOUNTING", "true").lower() in ("1", "true", "yes")
+# Commands allowed per request/trace before it is flagged; per-scope overrides as "scope=n,..."
+MONGO_QUERY_BUDGET = int(os.getenv("MONGO_QUERY_BUDGET", 20))
+MONGO_QUERY_BUDGETS = os.getenv("MONGO_QUERY_BUDGETS", "POST /webhook=12,whatsapp.message=10")
+# Reads of the same shape (same filter keys, any values) in one scope before it is flagged as N+1
+MONGO_NPLUS1_THRESHOLD = int(os.getenv("MONGO_NPLUS1_THRESHOLD", 5))
+
+# Handshakes, auth and cursor housekeeping: not queries the application asked for
+_IGNORED = {"hello", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "killCursors", "buildInfo"}
+_READS = {"find", "aggregate", "count", "countDocuments", "distinct"}
+
+MONGO_COMMANDS = registry.counter("mongo_commands_total", "Mongo commands by request route or trace name", ("scope", "command"))
+MONGO_COMMAND_SECONDS = registry.histogram(
+    "mongo_command_duration_seconds", "Mongo command round-trip time", ("command", "collection"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+MONGO_QUERIES_PER_SCOPE = registry.histogram(
+    "mongo_queries_per_request", "Mongo commands issued per request or trace", ("scope",),
+    buckets=(0, 1, 2, 3, 4, 6, 8, 10, 15, 20, 30, 50, 100),
+)
+MONGO_FLAGGED = registry.counter(
+    "mongo_query_flags_total", "Requests or traces flagged for query budget, identical repeats or N+1", ("scope", "reason")
+)
+
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for part in spec.split(","):
+        if "=" in part:
+            scope, budget = part.rsplit("=", 1)
+            try:
+                budgets[scope.strip()] = int(budget)
+            except ValueError:
+                pass
+    return budgets
+
+
+_budgets = _parse_budgets(MONGO_QUERY_BUDGETS)
+
+
+class CommandRecord(NamedTuple):
+    command: str
+    collection: str
+    shape: str
+    fingerprint: Optional[str]
+    duration: float
+    docs: int
+    failed: bool
+
+
+def _shape(value: Any, depth: int = 0) -> Any:
+    """The structure of a filter with the values blanked: {"tenant_id": 1, "_id": {"$in": [..]}} -> "{_id:{$in},tenant_id}"."""
+    if isinstance(value, dict) and depth < 4:
+        return "{" + ",".join(k if not isinstance(v, dict) else f"{k}:{_shape(v, depth + 1)}" for k, v in sorted(value.items())) + "}"
+    return "?"
+
+
+def _filter_of(name: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if name in ("find", "count", "distinct"):
+        return command.get("filter") or command.get("query") or {}
+    if name == "findAndModify":
+        return command.get("query") or {}
+    if name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        return pipeline[0].get("$match", {}) if pipeline and isinstance(pipeline[0], dict) else {}
+    if name in ("update", "delete"):
+        statements = command.get("updates" if name == "update" else "deletes") or []
+        return statements[0].get("q", {}) if len(statements) == 1 else None
+    return None
+
+
+def _returned(reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    if "value" in reply:
+        return 1 if reply["value"] is not None else 0
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+
+class QueryLedger:
+    """Mongo commands issued inside one request or trace. Nested ledgers also count toward their parent."""
+    __slots__ = ("name", "parent", "records", "started")
+
+    def __init__(self, name: str, parent: Optional["QueryLedger"]):
+        self.name = name
+        self.parent = parent
+        self.records: List[CommandRecord] = []
+        self.started = time.perf_counter()
+
+    def add(self, record: CommandRecord) -> None:
+        ledger = self
+        while ledger is not None:
+            ledger.records.append(record)
+            ledger = ledger.parent
+
+    def summary(self) -> Dict[str, Any]:
+        records = list(self.records)
+        return {
+            "queries": len(records),
+            "mongo_ms": round(1000 * sum(r.duration for r in records), 2),
+            "docs": sum(r.docs for r in records),
+            "by_command": dict(Counter(f"{r.command} {r.collection}" for r in records)),
+        }
+
+    def flags(self) -> List[Tuple[str, str]]:
+        """(reason, detail) for each problem: over budget, identical reads repeated, N+1 read shapes."""
+        records = list(self.records)
+        found = []
+        budget = _budgets.get(self.name, MONGO_QUERY_BUDGET)
+        if budget and len(records) > budget:
+            found.append(("budget", f"{len(records)} commands, budget {budget}"))
+        identical = Counter(r.fingerprint for r in records if r.fingerprint is not None)
+        for fingerprint, count in identical.items():
+            if count > 1:
+                found.append(("identical", f"{count}x {fingerprint}"))
+        shapes = Counter(r.shape for r in records if r.command in _READS)
+        for shape, count in shapes.items():
+            if count >= MONGO_NPLUS1_THRESHOLD:
+                found.append(("n_plus_one", f"{count}x {shape}"))
+        return found
+
+
+_ledger: ContextVar[Optional[QueryLedger]] = ContextVar("mongo_query_ledger", default=None)
+
+# Most recent flagged scopes, for /debug/queries
+flagged_scopes: Deque[Dict[str, Any]] = deque(maxlen=100)
+
+
+class query_scope:
+    """Attribute Mongo commands issued inside the block to `name` (a route or trace name).
+
+    On exit the count is recorded per scope, the enclosing span gets
+    mongo_queries/mongo_ms attributes and the scope is flagged if it went
+    over budget or repeated queries.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ledger: Optional[QueryLedger] = None
+
+    def __enter__(self) -> QueryLedger:
+        self.ledger = QueryLedger(self.name, _ledger.get())
+        self._token = _ledger.set(self.ledger)
+        return self.ledger
+
+    def __exit__(self, *exc) -> None:
+        _ledger.reset(self._token)
+        finish_scope(self.ledger)
+
+
+def finish_scope(ledger: QueryLedger) -> None:
+    name = ledger.name
+    count = len(ledger.records)
+    MONGO_QUERIES_PER_SCOPE.observe(count, name)
+    if not count:
+        return
+    summary = ledger.summary()
+    span = current_span()
+    if span is not None:
+        span.set(mongo_queries=count, mongo_ms=summary["mongo_ms"])
+    flags = ledger.flags()
+    if not flags:
+        return
+    for reason, _ in flags:
+        MONGO_FLAGGED.inc(name, reason)
+    flagged_scopes.append({
+        "scope": name,
+        "at": time.time(),
+        "trace_id": current_trace_id(),
+        "flags": [{"reason": reason, "detail": detail} for reason, detail in flags],
+        **summary,
+    })
+    logger.warning(
+        "%s issued %d Mongo commands (%s)", name, count, "; ".join(detail for _, detail in flags),
+        extra={"mongo_by_command": summary["by_command"]},
+    )
+
+
+class QueryListener(monitoring.CommandListener):
+    """pymongo command listener feeding the ledger of the request or trace that issued each command.
+
+    Motor runs pymongo on executor threads with a copy of the caller's
+    context, so the ledger contextvar set on the event loop is visible here.
+    Commands outside any scope (timers, compaction, startup) count as "background".
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[Optional[QueryLedger], str, str, str, Optional[str]]] = {}
+
+    def started(self, event: "monitoring.CommandStartedEvent") -> None:
+        name = event.command_name
+        if name in _IGNORED:
+            return
+        collection = event.command.get("collection" if name == "getMore" else name)
+        collection = collection if isinstance(collection, str) else event.database_name
+        query = _filter_of(name, event.command)
+        shape = f"{name} {collection} {_shape(query) if query is not None else ''}".rstrip()
+        # Only reads count as repeats; two updates of the same document are usually two different writes
+        fingerprint = f"{name} {collection} {query!r}" if name in _READS else None
+        self._pending[(event.connection_id, event.request_id)] = (_ledger.get(), name, collection, shape, fingerprint)
+
+    def succeeded(self, event: "monitoring.CommandSucceededEvent") -> None:
+        self._finish(event, _returned(event.reply), False)
+
+    def failed(self, event: "monitoring.CommandFailedEvent") -> None:
+        self._finish(event, 0, True)
+
+    def _finish(self, event, docs: int, failed: bool) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        ledger, name, collection, shape, fingerprint = pending
+        duration = event.duration_micros / 1e6
+        MONGO_COMMAND_SECONDS.observe(duration, name, collection)
+        MONGO_COMMANDS.inc(ledger.name if ledger is not None else "background", name)
+        if ledger is not None:
+            ledger.add(CommandRecord(name, collection, shape, fingerprint, duration, docs, failed))
+
+
+query_listener = QueryListener()
+
+
+class QueryAccountingMiddleware:
+    """ASGI middleware opening a query scope per HTTP request, named "METHOD /route/template" once routing is done."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        ledger = QueryLedger("unmatched", _ledger.get())
+        token = _ledger.set(ledger)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _ledger.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                ledger.name = f"{scope['method']} {route.path}"
+            finish_scope(ledger)
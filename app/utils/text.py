@@ -0,0 +1,56 @@
+import re
+import unicodedata
+from typing import List
+
+# Latin letters/digits and the Devanagari block (letters, vowel signs, virama)
+_TOKEN_RE = re.compile(r"[0-9a-zऀ-ॣ०-ॿ]+")
+# Only letters: repeated digits are meaningful ("1000" is not "10")
+_REPEAT_RE = re.compile(r"([a-z])\1+")
+
+_NUKTA = "़"
+_CHANDRABINDU = "ँ"
+_ANUSVARA = "ं"
+
+# Very common English / Hinglish / Hindi words that would otherwise dominate postings
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "for", "from", "i", "in", "is", "it", "me", "my",
+    "of", "on", "or", "so", "the", "to", "we", "you", "your",
+    "hai", "hain", "ha", "ka", "ki", "ke", "ko", "se", "mein", "main", "aur", "ye", "yeh", "vo", "voh",
+    "ji", "bhi", "na", "kya", "hi",
+    "है", "हैं", "का", "की", "के", "को", "से", "में", "और", "भी", "तो", "ही", "जी", "क्या",
+})
+
+
+def _normalize_latin(token: str) -> str:
+    # Romanized Hindi is spelled freely: "kyaaa"/"kya", "wala"/"vala", "phone"/"fone".
+    # Prices, order numbers, pincodes and SKUs are kept exactly as written
+    if any(c.isdigit() for c in token):
+        return token
+    token = _REPEAT_RE.sub(r"\1", token)
+    return token.replace("ph", "f").replace("w", "v").replace("q", "k")
+
+
+def _normalize_devanagari(token: str) -> str:
+    return token.replace(_NUKTA, "").replace(_CHANDRABINDU, _ANUSVARA)
+
+
+def tokenize(text: str, max_tokens: int = 64) -> List[str]:
+    """Unique search tokens for Hinglish / Devanagari / English text, in order of appearance."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFC", text).lower()
+    seen = {}
+    for raw in _TOKEN_RE.findall(text):
+        if raw[0] >= "ऀ":
+            token = _normalize_devanagari(raw)
+        else:
+            token = _normalize_latin(raw)
+        # The raw spelling too: normalizing can turn a stopword into a non-stopword ("we" -> "ve")
+        if raw in STOPWORDS or token in STOPWORDS or token in seen:
+            continue
+        if len(token) < 2 and not token.isdigit():
+            continue
+        seen[token] = None
+        if len(seen) >= max_tokens:
+            break
+    return list(seen)
@@ -0,0 +1,118 @@
+import math
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+
+class Timer:
+    __slots__ = ("key", "due", "payload", "expires", "level", "slot")
+
+    def __init__(self, key: Hashable, due: float, payload: Any, expires: int):
+        self.key = key
+        self.due = due
+        self.payload = payload
+        self.expires = expires  # absolute tick
+        self.level = 0
+        self.slot = 0
+
+    def __repr__(self) -> str:
+        return f"Timer({self.key!r}, due={self.due})"
+
+
+class TimerWheel:
+    """Hierarchical timing wheel with O(1) schedule, cancel and reschedule.
+
+    Level 0 has one slot per tick; each higher level covers a whole
+    revolution of the level below per slot. Timers are placed by how far
+    away they are and cascade down one level whenever the lower wheel wraps,
+    so every timer is touched at most once per level. Slots are dicts keyed
+    by timer key, which makes cancellation a single delete. Timers beyond the
+    top level's range wait in its last slot and are re-placed on cascade.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: Sequence[int] = (256, 64, 64, 64), now: float = 0.0):
+        self.tick = tick
+        self.slots = tuple(slots)
+        self.wheels: List[List[Dict[Hashable, Timer]]] = [[{} for _ in range(n)] for n in self.slots]
+        self.spans: List[int] = []
+        span = 1
+        for n in self.slots:
+            self.spans.append(span)
+            span *= n
+        self.range = span
+        self.timers: Dict[Hashable, Timer] = {}
+        self.current = int(now // tick)
+
+    def __len__(self) -> int:
+        return len(self.timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.timers
+
+    def get(self, key: Hashable) -> Optional[Timer]:
+        return self.timers.get(key)
+
+    def _place(self, timer: Timer, cascading: bool = False) -> None:
+        delta = timer.expires - self.current
+        # While cascading, the current level-0 slot is still to be expired on this tick
+        if delta < (0 if cascading else 1):
+            # Already due: fire on the next tick
+            level, slot = 0, (self.current + 1) % self.slots[0]
+        else:
+            level = len(self.slots) - 1
+            for i, n in enumerate(self.slots):
+                if delta < self.spans[i] * n:
+                    level = i
+                    break
+            if delta >= self.range:
+                slot = (self.current // self.spans[level] - 1) % self.slots[level]
+            else:
+                slot = (timer.expires // self.spans[level]) % self.slots[level]
+        timer.level, timer.slot = level, slot
+        self.wheels[level][slot][timer.key] = timer
+
+    def schedule(self, key: Hashable, due: float, payload: Any = None) -> Timer:
+        """Add (or move) the timer `key` to fire at time `due`."""
+        self.cancel(key)
+        timer = Timer(key, due, payload, math.ceil(due / self.tick))
+        self.timers[key] = timer
+        self._place(timer)
+        return timer
+
+    def cancel(self, key: Hashable) -> Optional[Timer]:
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            self.wheels[timer.level][timer.slot].pop(key, None)
+        return timer
+
+    def _cascade(self, level: int) -> None:
+        bucket = self.wheels[level][(self.current // self.spans[level]) % self.slots[level]]
+        if not bucket:
+            return
+        timers = list(bucket.values())
+        bucket.clear()
+        for timer in timers:
+            self._place(timer, cascading=True)
+
+    def advance(self, now: float) -> List[Timer]:
+        """Move the wheel to `now` and return the timers that became due, in order."""
+        target = int(now // self.tick)
+        fired: List[Timer] = []
+        while self.current < target:
+            self.current += 1
+            for level in range(1, len(self.slots)):
+                if self.current % self.spans[level]:
+                    break
+                self._cascade(level)
+            bucket = self.wheels[0][self.current % self.slots[0]]
+            if bucket:
+                due = [t for t in bucket.values() if t.expires <= self.current]
+                for timer in due:
+                    del bucket[timer.key]
+                    del self.timers[timer.key]
+                fired.extend(sorted(due, key=lambda t: t.due))
+        return fired
+
+    def next_expiry(self) -> Optional[float]:
+        """Time of the earliest pending timer (O(n); for diagnostics)."""
+        if not self.timers:
+            return None
+        return min(t.due for t in self.timers.values())
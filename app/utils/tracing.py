@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import heapq
+import itertools
+import asyncio
+import logging
+from contextvars import ContextVar
+from random import getrandbits
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Completed traces kept in memory for /debug/traces and the exporter
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 4096))
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", 5))
+# JSON-lines file of OTLP-shaped batches; empty disables file export
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+# OTLP/HTTP JSON collector, e.g. http://localhost:4318/v1/traces
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "whatsapp-ai-assistant")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+# Wall-clock anchor so spans only read the cheaper perf_counter on the hot path
+_WALL_ANCHOR = time.time() - time.perf_counter()
+_span_ids = itertools.count(getrandbits(62))
+
+
+class SpanRecord(NamedTuple):
+    """A finished span: one immutable tuple instead of the live Span and its slots."""
+    trace_id: int
+    span_id: int
+    parent_id: Optional[int]
+    name: str
+    started: float
+    duration: float
+    error: Optional[str]
+    attrs: Dict[str, Any]
+
+    @property
+    def start_ns(self) -> int:
+        return int((_WALL_ANCHOR + self.started) * 1e9)
+
+    @property
+    def trace_hex(self) -> str:
+        return "%032x" % self.trace_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_hex,
+            "span_id": "%016x" % self.span_id,
+            "parent_id": "%016x" % self.parent_id if self.parent_id is not None else None,
+            "name": self.name,
+            "start": _WALL_ANCHOR + self.started,
+            "duration_ms": round(1000 * self.duration, 3),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "started", "duration",
+                 "children", "histogram", "labels", "_token")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any], histogram=None, labels: Sequence[str] = ()):
+        # Ids are kept as ints and only formatted as hex when a trace is read or exported
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.attrs = attrs
+        self.duration = 0.0
+        self.histogram = histogram
+        self.labels = labels
+        if parent is None:
+            self.trace_id = getrandbits(128)
+            self.parent_id = None
+            # The root span collects every finished span of its trace
+            self.children: List[SpanRecord] = []
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.children = parent.children
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self.started
+        _current_span.reset(self._token)
+        if self.histogram is not None:
+            self.histogram.observe(self.duration, *self.labels)
+        record = SpanRecord(
+            self.trace_id, self.span_id, self.parent_id, self.name, self.started, self.duration,
+            f"{exc_type.__name__}: {exc}" if exc is not None else None, self.attrs,
+        )
+        if self.parent_id is None:
+            trace_buffer.append(Trace(record, self.children))
+        else:
+            self.children.append(record)
+
+
+class _NoopSpan:
+    """Stand-in outside a trace: only feeds the optional histogram."""
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram=None, labels: Sequence[str] = ()):
+        self.histogram = histogram
+        self.labels = labels
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Trace:
+    __slots__ = ("root", "spans")
+
+    def __init__(self, root: SpanRecord, spans: List[SpanRecord]):
+        self.root = root
+        self.spans = spans
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.root.to_dict(),
+            "spans": [s.to_dict() for s in sorted(self.spans, key=lambda s: s.started)],
+        }
+
+
+class TraceRing:
+    """Fixed-size ring of completed traces.
+
+    Only the event loop thread appends, so a plain index bump is enough: no
+    lock, no allocation beyond the slot write. Readers copy what they need
+    using the monotonically increasing `written` counter as a cursor.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._slots: List[Optional[Trace]] = [None] * capacity
+        self.written = 0
+
+    def append(self, trace: Trace) -> None:
+        self._slots[self.written % self.capacity] = trace
+        self.written += 1
+
+    def since(self, cursor: int) -> "tuple[List[Trace], int, int]":
+        """Traces written after `cursor`, the new cursor and how many were overwritten before being read."""
+        end = self.written
+        start = max(cursor, end - self.capacity)
+        return [self._slots[i % self.capacity] for i in range(start, end)], end, start - cursor
+
+    def recent(self) -> List[Trace]:
+        return self.since(0)[0]
+
+
+trace_buffer = TraceRing(TRACE_BUFFER_SIZE)
+
+
+def start_trace(name: str, **attrs: Any) -> Span:
+    """Root span for a unit of work (one webhook message); everything awaited inside joins it."""
+    return Span(name, None, attrs)
+
+
+def span(name: str, histogram=None, labels: Sequence[str] = (), **attrs: Any):
+    """Child span of the current trace. `histogram`/`labels` also record the duration as a metric."""
+    parent = _current_span.get()
+    if parent is None:
+        return _NoopSpan(histogram, labels)
+    return Span(name, parent, attrs, histogram, labels)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return "%032x" % current.trace_id if current is not None else None
+
+
+def traceparent() -> Optional[str]:
+    """W3C trace context header for outbound calls made inside a trace."""
+    current = _current_span.get()
+    if current is None:
+        return None
+    return "00-%032x-%016x-01" % (current.trace_id, current.span_id)
+
+
+def slowest_traces(limit: int = 20, name: Optional[str] = None) -> List[Dict[str, Any]]:
+    traces = trace_buffer.recent()
+    if name:
+        traces = [t for t in traces if t.root.name == name]
+    return [t.to_dict() for t in heapq.nlargest(limit, traces, key=lambda t: t.root.duration)]
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(s: SpanRecord) -> Dict[str, Any]:
+    start_ns = s.start_ns
+    doc = {
+        "traceId": s.trace_hex,
+        "spanId": "%016x" % s.span_id,
+        "name": s.name,
+        "kind": 1,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int(s.duration * 1e9)),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items() if v is not None],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id is not None:
+        doc["parentSpanId"] = "%016x" % s.parent_id
+    return doc
+
+
+def to_otlp(traces: List[Trace]) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest for a batch of traces."""
+    spans = [_otlp_span(s) for t in traces for s in (t.root, *t.spans)]
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "app.utils.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    """Background task shipping finished traces in batches to a file and/or an OTLP collector."""
+
+    def __init__(self, ring: TraceRing, interval: float = TRACE_EXPORT_INTERVAL,
+                 path: str = TRACE_EXPORT_FILE, endpoint: str = TRACE_OTLP_ENDPOINT):
+        self.ring = ring
+        self.interval = interval
+        self.path = path
+        self.endpoint = endpoint
+        self.cursor = ring.written
+        self.exported = 0
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.endpoint)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Trace export failed")
+
+    async def flush(self) -> int:
+        traces, self.cursor, dropped = self.ring.since(self.cursor)
+        self.dropped += dropped
+        if not traces:
+            return 0
+        batch = to_otlp(traces)
+        if self.path:
+            line = json.dumps(batch, separators=(",", ":"), default=str) + "\n"
+            await asyncio.to_thread(self._append, line)
+        if self.endpoint:
+            import httpx
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                resp = await client.post(self.endpoint, json=batch)
+                if resp.status_code >= 300:
+                    logger.warning("OTLP collector rejected %d traces: HTTP %s", len(traces), resp.status_code)
+        self.exported += len(traces)
+        return len(traces)
+
+    def _append(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+trace_exporter = TraceExporter(trace_buffer)
@@ -1,6 +1,7 @@
 import logging
-import httpx
 from typing import Optional, Dict, Any
+from app.utils.tracing import span, traceparent
+from app.utils.http_client import get_client
 
 logger = logging.getLogger(__name__)
 
@@ -21,19 +22,25 @@ async def send_message(phone_number_id: str, to: str, payload: Dict[str, Any], a
     url = f"{api_url}/{phone_number_id}/messages"
     headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
 
-    logger.info("WhatsApp send -> phone_number_id=%s token=%s to=%s payload=%s", phone_number_id, _mask_token(access_token), to, {k: v for k, v in payload.items() if k != 'text'})
+    logger.debug("WhatsApp send -> phone_number_id=%s token=%s to=%s payload=%s", phone_number_id, _mask_token(access_token), to, {k: v for k, v in payload.items() if k != 'text'}, extra={"category": "payload"})
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    client = get_client()
+    with span("whatsapp.send", phone_number_id=phone_number_id) as send_span:
+        # Read inside the span so the Graph API call is parented to whatsapp.send
+        parent = traceparent()
+        if parent:
+            headers["traceparent"] = parent
         resp = await client.post(url, json=payload, headers=headers)
-        content = None
-        try:
-            content = resp.json()
-        except Exception:
-            content = {"raw": resp.text}
-
-        if resp.status_code == 200 or resp.status_code == 201:
-            logger.info("WhatsApp API success status=%s", resp.status_code)
-            return content
-        else:
-            logger.error("WhatsApp API error status=%s body=%s", resp.status_code, content)
-            raise Exception({"status_code": resp.status_code, "body": content})
+        send_span.set(status=resp.status_code)
+    content = None
+    try:
+        content = resp.json()
+    except Exception:
+        content = {"raw": resp.text}
+
+    if resp.status_code == 200 or resp.status_code == 201:
+        logger.info("WhatsApp API success status=%s", resp.status_code)
+        return content
+    else:
+        logger.error("WhatsApp API error status=%s body=%s", resp.status_code, content)
+        raise Exception({"status_code": resp.status_code, "body": content})
@@ -0,0 +1,92 @@
+"""Load test: noisy vs quiet tenant sharing the AI call budget.
+
+A noisy tenant dumps a burst of requests while a quiet tenant sends a steady
+trickle. Each "AI call" is simulated with a sleep. The quiet tenant's queue
+wait is compared between a plain shared semaphore (FIFO, what we get without
+the scheduler) and the deficit round robin FairScheduler.
+
+    python -m benchmarks.fair_scheduler_load
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.scheduler import FairScheduler, _percentile
+
+
+async def _fifo_run(args) -> dict:
+    sem = asyncio.Semaphore(args.concurrency)
+    waits = {"noisy": [], "quiet": []}
+
+    async def call(tenant):
+        start = time.monotonic()
+        async with sem:
+            waits[tenant].append(time.monotonic() - start)
+            await asyncio.sleep(args.call_ms / 1000)
+
+    return await _drive(args, call, waits)
+
+
+async def _fair_run(args) -> dict:
+    scheduler = FairScheduler(max_concurrency=args.concurrency)
+    scheduler.configure("noisy", {"ai_max_concurrency": args.concurrency, "ai_max_queue": args.noisy_burst})
+    scheduler.configure("quiet", {"ai_max_concurrency": args.concurrency})
+    waits = {"noisy": [], "quiet": []}
+
+    async def call(tenant):
+        waited = await scheduler.acquire(tenant)
+        waits[tenant].append(waited)
+        try:
+            await asyncio.sleep(args.call_ms / 1000)
+        finally:
+            scheduler.release(tenant)
+
+    return await _drive(args, call, waits)
+
+
+async def _drive(args, call, waits) -> dict:
+    started = time.monotonic()
+    noisy = [asyncio.create_task(call("noisy")) for _ in range(args.noisy_burst)]
+    quiet = []
+    for _ in range(args.quiet_requests):
+        quiet.append(asyncio.create_task(call("quiet")))
+        await asyncio.sleep(args.quiet_interval_ms / 1000)
+    await asyncio.gather(*noisy, *quiet)
+    elapsed = time.monotonic() - started
+
+    return {
+        tenant: {
+            "requests": len(samples),
+            "wait_p50_ms": round(1000 * _percentile(samples, 0.50), 2),
+            "wait_p95_ms": round(1000 * _percentile(samples, 0.95), 2),
+            "wait_max_ms": round(1000 * max(samples), 2) if samples else 0.0,
+        }
+        for tenant, samples in waits.items()
+    } | {"elapsed_s": round(elapsed, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--call-ms", type=float, default=20)
+    parser.add_argument("--noisy-burst", type=int, default=400)
+    parser.add_argument("--quiet-requests", type=int, default=40)
+    parser.add_argument("--quiet-interval-ms", type=float, default=25)
+    args = parser.parse_args()
+
+    results = {
+        "fifo": asyncio.run(_fifo_run(args)),
+        "fair": asyncio.run(_fair_run(args)),
+    }
+    print(json.dumps(results, indent=2))
+
+    fifo_quiet = results["fifo"]["quiet"]["wait_p95_ms"]
+    fair_quiet = results["fair"]["quiet"]["wait_p95_ms"]
+    isolated = fair_quiet <= max(2 * args.call_ms, fifo_quiet / 10)
+    print(f"quiet tenant p95 wait: fifo={fifo_quiet}ms fair={fair_quiet}ms -> {'ISOLATED' if isolated else 'NOT ISOLATED'}")
+    raise SystemExit(0 if isolated else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Fake WhatsApp Cloud API (Graph) send endpoint.
+
+POST /{version}/{phone_number_id}/messages returns what Meta returns for an
+accepted message (contacts + a wamid). Over the per-number rate limit it
+answers 429 with Graph error code 130429 ("Rate limit hit"); a fraction of
+sends fail with a 500 "Something went wrong" (code 131000). Every accepted
+message is kept in `sent` (up to `keep`) so replays can diff the replies.
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from benchmarks.fakes.server import Faults, FakeServer, LatencyModel, Request, Response
+
+_MESSAGES = re.compile(r"^/(v[\d.]+)/([^/]+)/messages$")
+
+
+class FakeGraph:
+    def __init__(self, latency: LatencyModel, faults: Faults, keep: int = 100_000,
+                 on_send: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.latency = latency
+        self.faults = faults
+        self.ids = 0
+        self.sent: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        # Called with each accepted message, e.g. to time replies as they arrive
+        self.on_send = on_send
+
+    async def __call__(self, request: Request) -> Response:
+        match = _MESSAGES.match(request.path)
+        if request.method != "POST" or match is None:
+            return Response(404, {"error": {"message": "Unsupported request", "type": "GraphMethodException", "code": 100}})
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return Response(401, {"error": {"message": "An access token is required to request this resource.",
+                                            "type": "OAuthException", "code": 104}})
+        phone_number_id = match.group(2)
+        await asyncio.sleep(self.latency.sample())
+
+        if self.faults.throttle(phone_number_id):
+            return Response(429, {"error": {"message": "(#130429) Rate limit hit", "type": "OAuthException", "code": 130429,
+                                            "error_data": {"messaging_product": "whatsapp", "details": "Cloud API message throughput has been reached."}}})
+        if self.faults.should_fail():
+            return Response(500, {"error": {"message": "(#131000) Something went wrong", "type": "OAuthException", "code": 131000}})
+
+        payload = request.json() or {}
+        to = str(payload.get("to", ""))
+        self.ids += 1
+        wamid = f"wamid.FAKE{self.ids:012d}"
+        record = {
+            "id": wamid,
+            "phone_number_id": phone_number_id,
+            "to": to,
+            "type": payload.get("type", "text"),
+            "text": (payload.get("text") or {}).get("body"),
+            "traceparent": request.headers.get("traceparent"),
+            "at": time.time(),
+        }
+        self.sent.append(record)
+        if self.on_send is not None:
+            self.on_send(record)
+        return Response(200, {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": wamid}],
+        })
+
+
+def create(latency: str = "lognormal:120,600", error_rate: float = 0.0, mps: float = 0.0,
+           seed: Optional[int] = 1, host: str = "127.0.0.1", port: int = 0) -> FakeServer:
+    """A FakeServer running FakeGraph; `mps` is messages per second per phone number (0 = unlimited)."""
+    handler = FakeGraph(LatencyModel.parse(latency, seed), Faults(error_rate, mps, seed))
+    return FakeServer(handler, host, port)
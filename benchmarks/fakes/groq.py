@@ -0,0 +1,129 @@
+"""Fake Groq (OpenAI-compatible) chat-completions endpoint.
+
+POST /openai/v1/chat/completions, answered like Groq does:
+
+- `usage` with prompt/completion token counts and Groq's timing fields;
+- `stream: true` sends SSE chunks at --tokens-per-s, usage in the last chunk's `x_groq`;
+- over the per-key rate limit, a 429 whose message ends "Please try again in 1.234s."
+  (the format bot.py parses) plus a retry-after header;
+- a fraction of requests fail with 503, like an over-capacity model.
+
+Latency is drawn per request from a LatencyModel. Replies are deterministic
+per prompt so runs with the same seed compare cleanly.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from benchmarks.fakes.server import Faults, FakeServer, LatencyModel, Request, Response
+
+PATH = "/openai/v1/chat/completions"
+
+_REPLIES = [
+    "Thanks for reaching out! Yes, that item is in stock and ships within 2-3 business days.",
+    "Happy to help. Our store is open 10am to 8pm, Monday to Saturday.",
+    "Sure! The price is 1299 including taxes, and delivery is free above 999.",
+    "Got it. I've noted your request and a team member will follow up shortly.",
+]
+
+
+def _tokens(text: str) -> int:
+    # Close enough to a BPE count for usage accounting
+    return max(1, len(text) // 4)
+
+
+class FakeGroq:
+    def __init__(self, latency: LatencyModel, faults: Faults, tokens_per_s: float = 400.0,
+                 require_key: bool = False, cached_ratio: float = 0.0):
+        self.latency = latency
+        self.faults = faults
+        self.tokens_per_s = tokens_per_s
+        self.require_key = require_key
+        self.cached_ratio = cached_ratio
+        self.ids = 0
+
+    async def __call__(self, request: Request) -> Response:
+        if request.method != "POST" or request.path != PATH:
+            return Response(404, {"error": {"message": f"Unknown path {request.path}", "type": "invalid_request_error"}})
+        auth = request.headers.get("authorization", "")
+        if self.require_key and not auth.startswith("Bearer "):
+            return Response(401, {"error": {"message": "Invalid API Key", "type": "invalid_request_error", "code": "invalid_api_key"}})
+        payload = request.json() or {}
+        model = payload.get("model", "llama3-8b-8192")
+
+        retry_after = self.faults.throttle(auth)
+        if retry_after:
+            return Response(429, {"error": {
+                "message": f"Rate limit reached for model `{model}` on requests per minute (RPM). Please try again in {retry_after:.3f}s.",
+                "type": "requests",
+                "code": "rate_limit_exceeded",
+            }}, headers={"retry-after": str(max(1, round(retry_after)))})
+        if self.faults.should_fail():
+            await asyncio.sleep(self.latency.sample() / 4)
+            return Response(503, {"error": {"message": f"{model} is currently over capacity. Please try again.", "type": "internal_server_error"}})
+
+        prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        digest = hashlib.sha1(prompt.encode()).digest()
+        reply = _REPLIES[digest[0] % len(_REPLIES)]
+        prompt_tokens = _tokens(prompt)
+        completion_tokens = _tokens(reply)
+        self.ids += 1
+        completion_id = f"chatcmpl-fake-{self.ids}"
+        generate = completion_tokens / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+        total = max(self.latency.sample(), generate)
+        queue_time = max(0.0, total - generate)
+        usage = {
+            "queue_time": round(queue_time, 4),
+            "prompt_tokens": prompt_tokens,
+            "prompt_time": round(prompt_tokens / 20000, 4),
+            "completion_tokens": completion_tokens,
+            "completion_time": round(generate, 4),
+            "total_tokens": prompt_tokens + completion_tokens,
+            "total_time": round(total, 4),
+        }
+        if self.cached_ratio:
+            usage["prompt_tokens_details"] = {"cached_tokens": int(prompt_tokens * self.cached_ratio)}
+
+        if payload.get("stream"):
+            return Response(200, stream=self._stream(completion_id, model, reply, queue_time, usage),
+                            headers={"content-type": "text/event-stream", "x-request-id": completion_id})
+
+        await asyncio.sleep(total)
+        return Response(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "logprobs": None, "finish_reason": "stop"}],
+            "usage": usage,
+            "system_fingerprint": "fp_fake",
+            "x_groq": {"id": completion_id},
+        }, headers={"x-request-id": completion_id})
+
+    async def _stream(self, completion_id: str, model: str, reply: str, first_token: float, usage: Dict[str, Any]) -> AsyncIterator[bytes]:
+        created = int(time.time())
+
+        def event(delta: Dict[str, Any], finish: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> bytes:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}], **(extra or {})}
+            return b"data: " + json.dumps(chunk).encode() + b"\n\n"
+
+        await asyncio.sleep(first_token)
+        yield event({"role": "assistant", "content": ""})
+        words = reply.split(" ")
+        per_word = len(reply) / 4 / self.tokens_per_s / len(words) if self.tokens_per_s > 0 else 0.0
+        for i, word in enumerate(words):
+            if per_word:
+                await asyncio.sleep(per_word)
+            yield event({"content": word if i == 0 else " " + word})
+        yield event({}, "stop", {"x_groq": {"id": completion_id, "usage": usage}})
+        yield b"data: [DONE]\n\n"
+
+
+def create(latency: str = "lognormal:400,2500", error_rate: float = 0.0, rpm: float = 0.0, tokens_per_s: float = 400.0,
+           seed: Optional[int] = 1, host: str = "127.0.0.1", port: int = 0) -> FakeServer:
+    """A FakeServer running FakeGroq; `rpm` is requests per minute per API key (0 = unlimited)."""
+    handler = FakeGroq(LatencyModel.parse(latency, seed), Faults(error_rate, rpm / 60, seed, burst=rpm), tokens_per_s)
+    return FakeServer(handler, host, port)
@@ -0,0 +1,56 @@
+"""Run the fake Groq and Graph servers for offline load tests.
+
+    python -m benchmarks.fakes.serve [--groq-port 8901] [--graph-port 8902]
+        [--groq-latency lognormal:400,2500] [--groq-error-rate 0.01] [--groq-rpm 300]
+        [--graph-latency lognormal:120,600] [--graph-error-rate 0] [--graph-mps 80] [--seed 1]
+
+Prints the settings that point the app at them; export those (or put them
+in .env) before starting the app. Ctrl-C prints per-status request counts.
+Latency specs: "fixed:MS", "uniform:LO,HI" or "lognormal:MEDIAN,P99" in ms.
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.fakes import graph, groq
+
+
+async def serve(args) -> None:
+    groq_server = await groq.create(args.groq_latency, args.groq_error_rate, args.groq_rpm, args.groq_tokens_per_s,
+                                    args.seed, args.host, args.groq_port).start()
+    graph_server = await graph.create(args.graph_latency, args.graph_error_rate, args.graph_mps,
+                                      args.seed, args.host, args.graph_port).start()
+    print(f"GROQ_API_URL={groq_server.url}{groq.PATH}")
+    print("GROQ_API_KEY=fake-key")
+    print(f"WHATSAPP_API_URL={graph_server.url}/v19.0")
+    print(f"FACEBOOK_GRAPH_URL={graph_server.url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await groq_server.stop()
+        await graph_server.stop()
+        print(json.dumps({"groq": dict(groq_server.stats), "graph": dict(graph_server.stats)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--groq-port", type=int, default=8901)
+    parser.add_argument("--groq-latency", default="lognormal:400,2500")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0)
+    parser.add_argument("--groq-rpm", type=float, default=0.0, help="requests per minute per API key, 0 = unlimited")
+    parser.add_argument("--groq-tokens-per-s", type=float, default=400.0)
+    parser.add_argument("--graph-port", type=int, default=8902)
+    parser.add_argument("--graph-latency", default="lognormal:120,600")
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--graph-mps", type=float, default=0.0, help="messages per second per phone number, 0 = unlimited")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Minimal asyncio HTTP/1.1 server for the fake upstreams, plus latency and fault models.
+
+Stdlib only, so the fakes run wherever the benchmarks do and never become the
+bottleneck being measured: keep-alive connections, JSON bodies, fixed-length
+or chunked (streaming) responses. Latency, errors and rate limits come from
+seeded random generators so a run can be reproduced exactly.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 429: "Too Many Requests",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class LatencyModel:
+    """Sampled response time in seconds.
+
+    Spec strings: "0" or "fixed:120" (ms), "uniform:50,300", "lognormal:400,2500"
+    (median and p99 in ms, the long-tailed shape LLM APIs actually have).
+    """
+
+    def __init__(self, kind: str = "fixed", a: float = 0.0, b: float = 0.0, seed: Optional[int] = None):
+        self.kind = kind
+        self.a = a
+        self.b = b
+        self.rng = random.Random(seed)
+        if kind == "lognormal":
+            self.mu = math.log(a)
+            self.sigma = math.log(b / a) / 2.326 if b > a else 0.0
+
+    @classmethod
+    def parse(cls, spec: str, seed: Optional[int] = None) -> "LatencyModel":
+        kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        values = [float(v) for v in args.split(",") if v.strip()] or [0.0]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency model {kind!r}")
+        return cls(kind, values[0], values[1] if len(values) > 1 else values[0], seed)
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            return self.rng.uniform(self.a, self.b) / 1000
+        if self.kind == "lognormal":
+            return math.exp(self.rng.gauss(self.mu, self.sigma)) / 1000
+        return self.a / 1000
+
+    def __repr__(self) -> str:
+        return f"{self.kind}:{self.a:g},{self.b:g}"
+
+
+class TokenBucket:
+    """Per-key request rate limit; `take` returns 0 when allowed, otherwise seconds until a token is free."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1.0:
+            self._buckets[key] = (tokens - 1.0, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1.0 - tokens) / self.rate
+
+
+@dataclass
+class Faults:
+    """Error injection shared by the fakes: a fraction of requests fail, and a per-key rate limit."""
+    error_rate: float = 0.0
+    rate_limit: float = 0.0  # requests per second per key; 0 = unlimited
+    seed: Optional[int] = None
+    burst: Optional[float] = None  # requests allowed at once before the rate applies
+    rng: random.Random = field(init=False)
+    bucket: TokenBucket = field(init=False)
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.bucket = TokenBucket(self.rate_limit, self.burst)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+    def throttle(self, key: str) -> float:
+        return self.bucket.take(key)
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, list]
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else None
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: Union[bytes, Dict[str, Any], list, None] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Chunks sent with Transfer-Encoding: chunked instead of `body`
+    stream: Optional[AsyncIterator[bytes]] = None
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class FakeServer:
+    """Serves `handler` on host:port. `stats` counts responses by status code."""
+
+    def __init__(self, handler: Handler, host: str = "127.0.0.1", port: int = 0):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.stats: Counter = Counter()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> "FakeServer":
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, limit=1 << 20, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                try:
+                    response = await self.handler(request)
+                except Exception as e:
+                    response = Response(500, {"error": {"message": f"fake server error: {e}"}})
+                self.stats[response.status] += 1
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                await self._write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        body = await reader.readexactly(length) if length else b""
+        url = urlsplit(target)
+        return Request(method, url.path, parse_qs(url.query), headers, body)
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+        head = [f"HTTP/1.1 {response.status} {_REASONS.get(response.status, 'Unknown')}"]
+        headers = {"connection": "keep-alive" if keep_alive else "close", **response.headers}
+        if response.stream is not None:
+            headers.setdefault("content-type", "text/event-stream")
+            headers["transfer-encoding"] = "chunked"
+            writer.write(("\r\n".join(head + [f"{k}: {v}" for k, v in headers.items()]) + "\r\n\r\n").encode("latin-1"))
+            async for chunk in response.stream:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        else:
+            body = response.body
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode() if body is not None else b""
+                headers.setdefault("content-type", "application/json")
+            headers["content-length"] = str(len(body))
+            writer.write(("\r\n".join(head + [f"{k}: {v}" for k, v in headers.items()]) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
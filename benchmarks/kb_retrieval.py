@@ -0,0 +1,119 @@
+"""Knowledge-base retrieval latency for large catalogues.
+
+    python -m benchmarks.kb_retrieval [--items 50000] [--queries 2000] [--k 4] [--products 3000] [--brands 400]
+
+Builds the same BM25 index the reply path uses over a synthetic grocery
+catalogue (one chunk per item) and reports build time, snapshot size,
+postings size and per-query latency for customer questions about items in
+the catalogue. Lower --products/--brands to see how latency grows when every
+query word matches thousands of items.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+
+from app.utils.bm25 import BM25Index
+from app.utils.text import tokenize
+
+PRODUCTS = ["mustard oil", "basmati rice", "atta", "toor dal", "moong dal", "paneer", "dahi", "ghee", "sugar", "besan",
+            "poha", "maida", "chana", "rajma", "haldi", "jeera", "namak", "chai patti", "biscuit", "sabun"]
+BRANDS = ["fortune", "tata", "aashirvaad", "amul", "patanjali", "india gate", "daawat", "mother dairy", "saffola", "everest"]
+UNITS = ["250g", "500g", "1kg", "2kg", "5kg", "1 litre", "2 litre", "5 litre"]
+VARIANTS = ["premium", "gold", "organic", "kachi ghani", "classic", "select", "low fat", "double toned", "extra long",
+            "rozana", "super", "pure", "desi", "family pack", "jar", "pouch", "combo", "value pack", "lite", "fresh"]
+FILLER = ["ka price kya hai", "available hai kya", "stock me hai?", "rate batao", "kitne ki hai", "discount milega", ""]
+_SYLLABLES = ["ka", "ri", "mo", "ta", "su", "ne", "la", "pi", "do", "ru", "ve", "shi", "ga", "no", "bha", "ti"]
+
+
+def _words(rng: random.Random, n: int, base):
+    # Real catalogues have thousands of distinct product and brand words, not a handful
+    words = list(base)
+    while len(words) < n:
+        words.append("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return words[:n]
+
+
+def make_catalogue(n: int, products: int, brands: int):
+    rng = random.Random(7)
+    product_words, brand_words = _words(rng, products, PRODUCTS), _words(rng, brands, BRANDS)
+    for i in range(n):
+        product, brand, unit = rng.choice(product_words), rng.choice(brand_words), rng.choice(UNITS)
+        yield {
+            "sku": f"SKU{i:06d}",
+            "name": f"{brand} {rng.choice(VARIANTS)} {product} {unit}",
+            "price": f"Rs {rng.randint(20, 2000)}",
+            "stock": rng.choice(["in stock", "out of stock", "few left"]),
+            "category": product,
+        }
+
+
+def make_queries(items, n: int):
+    rng = random.Random(11)
+    queries = []
+    for _ in range(n):
+        name = rng.choice(items)["name"].split()
+        words = rng.sample(name, k=min(len(name), rng.randint(2, 4)))
+        queries.append(" ".join(words) + " " + rng.choice(FILLER))
+    return queries
+
+
+def run(args) -> dict:
+    items = list(make_catalogue(args.items, args.products, args.brands))
+    queries = make_queries(items, 200)
+    started = time.perf_counter()
+    index = BM25Index()
+    for i, item in enumerate(items):
+        # Same split as app.services.knowledge: "key: value" text for the prompt, values for search
+        text = "; ".join(f"{k}: {v}" for k, v in item.items())
+        index.add(i, tokenize(" ".join(item.values()), 256), text)
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    snapshot = index.to_bytes()
+    dump_s = time.perf_counter() - started
+    started = time.perf_counter()
+    BM25Index.from_bytes(snapshot, int)
+    load_s = time.perf_counter() - started
+
+    index.search(tokenize(queries[0]), args.k)  # norms are computed lazily on the first search
+    gc.collect()
+    samples = []
+    for i in range(args.queries):
+        tokens = tokenize(queries[i % len(queries)], 16)
+        started = time.perf_counter()
+        index.search(tokens, args.k)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+
+    postings = sum(len(p) for p in index.post_docs)
+    postings_bytes = sum(len(p) * p.itemsize for p in index.post_docs + index.post_tfs)
+    return {
+        "items": args.items,
+        "terms": len(index.vocab),
+        "postings": postings,
+        "build_s": round(build_s, 2),
+        "postings_mb": round(postings_bytes / 2 ** 20, 2),
+        "snapshot_mb": round(len(snapshot) / 2 ** 20, 2),
+        "snapshot_dump_ms": round(1000 * dump_s, 1),
+        "snapshot_load_ms": round(1000 * load_s, 1),
+        "query_p50_ms": round(1000 * samples[len(samples) // 2], 3),
+        "query_p99_ms": round(1000 * samples[int(len(samples) * 0.99)], 3),
+        "example": {queries[0]: [text for _, _, text in index.search(tokenize(queries[0]), 2)]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--products", type=int, default=3000, help="distinct product words in the catalogue")
+    parser.add_argument("--brands", type=int, default=400, help="distinct brand words in the catalogue")
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Bytes over the wire and BSON decode time per page: full documents vs list-view projections.
+
+    python -m benchmarks.list_projection [--rows 100] [--repeat 200]
+
+Pages are encoded to BSON once (what the server sends to the driver) and then
+decoded repeatedly, which is the per-page cost Motor pays on the event loop.
+Response size is measured with the app's JSON encoder.
+"""
+import argparse
+import time
+
+import bson
+from bson.objectid import ObjectId
+
+from app.utils.helpers import dumps, rename_ids
+from app.utils.projections import (
+    build_projection, project_doc,
+    MESSAGE_LIST_FIELDS, CONVERSATION_LIST_FIELDS, CONTACT_SUMMARY_FIELDS, LAST_MESSAGE_SUMMARY_FIELDS,
+)
+from benchmarks.serialization import make_page
+
+
+def make_conversations(rows: int):
+    messages = make_page(rows)
+    conversations = []
+    for msg in messages:
+        contact = {
+            "_id": msg["contact_id"],
+            "tenant_id": msg["tenant_id"],
+            "wa_phone_hash": "919812345678",
+            "wa_phone_e164_enc": "+919812345678",
+            "display_name": "Ramesh Kumar",
+            "locale": "hi_IN",
+            "timezone": "Asia/Kolkata",
+            "consents": ["marketing", "transactional"],
+            "attributes": {"city": "Gurugram", "sector": "15", "segment": "retail", "notes": "prefers COD " * 10},
+            "last_seen_at": msg["created_at"],
+            "created_at": msg["created_at"],
+            "updated_at": msg["created_at"],
+        }
+        conversations.append({
+            "_id": ObjectId(),
+            "tenant_id": msg["tenant_id"],
+            "contact_id": msg["contact_id"],
+            "channel": "whatsapp",
+            "mode": "bot",
+            "status": "open",
+            "metadata": {},
+            "last_message_at": msg["created_at"],
+            "created_at": msg["created_at"],
+            "updated_at": msg["created_at"],
+            "contact_info": contact,
+            "last_message": msg,
+        })
+    return messages, conversations
+
+
+def project_conversation(conv):
+    out = project_doc(conv, build_projection(CONVERSATION_LIST_FIELDS))
+    out["contact_info"] = project_doc(conv["contact_info"], build_projection(CONTACT_SUMMARY_FIELDS))
+    out["last_message"] = project_doc(conv["last_message"], build_projection(LAST_MESSAGE_SUMMARY_FIELDS))
+    return out
+
+
+def measure(name, docs, repeat):
+    raw = [bson.encode(d) for d in docs]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decoded = [bson.decode(r) for r in raw]
+    decode_ms = 1000 * (time.perf_counter() - started) / repeat
+    body = dumps(rename_ids(decoded))
+    print(f"{name:<28} bson={sum(map(len, raw)):>9,} B  json={len(body):>9,} B  decode={decode_ms:7.3f} ms/page")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    messages, conversations = make_conversations(args.rows)
+    message_projection = build_projection(MESSAGE_LIST_FIELDS)
+
+    measure("messages (full)", messages, args.repeat)
+    measure("messages (list view)", [project_doc(m, message_projection) for m in messages], args.repeat)
+    measure("conversations (full)", conversations, args.repeat)
+    measure("conversations (list view)", [project_conversation(c) for c in conversations], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
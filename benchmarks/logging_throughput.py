@@ -0,0 +1,160 @@
+"""Webhook throughput with the old synchronous logging vs the queue-backed JSON pipeline.
+
+    python -m benchmarks.logging_throughput [--messages 20000] [--concurrency 50] [--sink PATH]
+
+Each simulated message does what the reply path logs: the raw webhook
+payload, the incoming customer text, the Groq raw response, the AI reply and
+the send result, around a few short awaits standing in for I/O. "sync"
+reproduces the previous setup (f-strings built eagerly, a StreamHandler
+writing and flushing on the event loop, print() of the raw response);
+"queued" goes through setup_logging() (sampling and redaction per the LOG_*
+settings, formatting and writes on the listener thread). Both run against a
+plain file and against a sink whose flush blocks for --write-latency-us,
+like stdout piped to a busy log collector.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from app.utils import logging_config
+
+logger = logging.getLogger("bench.replies")
+
+PAYLOAD = {
+    "from": "919812345678", "id": "wamid.HBgMOTE5ODEyMzQ1Njc4FQIAEhgg", "timestamp": "1718000000",
+    "text": {"body": "Hi, do you have the blue kurta in size M? Please share price and delivery time to 560001."},
+    "type": "text", "phone_number_id": "109876543210",
+}
+RAW_RESPONSE = {
+    "id": "chatcmpl-1", "model": "llama3-8b-8192",
+    "choices": [{"message": {"role": "assistant", "content": "Yes! The blue kurta in M is 1299 and ships in 2-3 days." * 3}}],
+    "usage": {"prompt_tokens": 412, "completion_tokens": 58, "total_tokens": 470},
+}
+
+
+async def handle_sync(i: int) -> None:
+    tenant_id, conv_id = "64b7f0c2e1a4000000000001", f"64b7f0c2e1a4{i:012x}"
+    logger.info(f"[p:{PAYLOAD['phone_number_id']}] Processing message: {PAYLOAD}")
+    await asyncio.sleep(0)
+    logger.info(f"[t:{tenant_id}, conv:{conv_id}] 📩 Incoming from {PAYLOAD['from']}: {PAYLOAD['text']['body']}")
+    await asyncio.sleep(0)
+    print(f"Groq raw response: {RAW_RESPONSE}")
+    reply = RAW_RESPONSE["choices"][0]["message"]["content"]
+    logger.info(f"[t:{tenant_id}, conv:{conv_id}] 🤖 Reply to {PAYLOAD['from']}: {reply}")
+    await asyncio.sleep(0)
+    logger.info(f"[t:{tenant_id}, conv:{conv_id}] ✅ Message sent to {PAYLOAD['from']} resp=%s", {"messages": [{"id": "wamid.x"}]})
+
+
+async def handle_queued(i: int) -> None:
+    log_ctx = {"tenant_id": "64b7f0c2e1a4000000000001", "conversation_id": f"64b7f0c2e1a4{i:012x}"}
+    logger.info("Processing webhook message %s", PAYLOAD, extra={"phone_number_id": PAYLOAD["phone_number_id"], "category": "payload"})
+    await asyncio.sleep(0)
+    logger.info("📩 Incoming from %s: %s", PAYLOAD["from"], PAYLOAD["text"]["body"], extra={**log_ctx, "category": "content"})
+    await asyncio.sleep(0)
+    logger.debug("Groq raw response: %s", RAW_RESPONSE)
+    reply = RAW_RESPONSE["choices"][0]["message"]["content"]
+    logger.info("🤖 Reply to %s: %s", PAYLOAD["from"], reply, extra={**log_ctx, "category": "content"})
+    await asyncio.sleep(0)
+    logger.info("✅ Message sent to %s resp=%s", PAYLOAD["from"], {"messages": [{"id": "wamid.x"}]}, extra=log_ctx)
+
+
+async def drive(handler, messages: int, concurrency: int) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await handler(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "messages_per_s": round(messages / elapsed),
+        "p50_us": round(1e6 * latencies[len(latencies) // 2]),
+        "p99_us": round(1e6 * latencies[int(len(latencies) * 0.99)]),
+    }
+
+
+class SlowSink:
+    """File wrapper whose flush blocks like stdout piped to a busy log shipper or terminal."""
+
+    def __init__(self, f, latency: float):
+        self.f = f
+        self.latency = latency
+
+    def write(self, data: str) -> int:
+        return self.f.write(data)
+
+    def flush(self) -> None:
+        self.f.flush()
+        if self.latency:
+            time.sleep(self.latency)
+
+    def tell(self) -> int:
+        return self.f.tell()
+
+
+def scenario(sink, args) -> dict:
+    report = {}
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.handlers = [handler]
+    start = sink.tell()
+    with redirect_stdout(sink):
+        report["sync"] = asyncio.run(drive(handle_sync, args.messages, args.concurrency))
+    report["sync"]["bytes_per_message"] = round((sink.tell() - start) / args.messages)
+
+    start = sink.tell()
+    logging_config.setup_logging(stream=sink)
+    report["queued"] = asyncio.run(drive(handle_queued, args.messages, args.concurrency))
+    drain_started = time.perf_counter()
+    logging_config.stop_logging()
+    report["queued"]["drain_ms"] = round(1000 * (time.perf_counter() - drain_started), 1)
+    report["queued"].update(logging_config.logging_stats())
+    report["queued"]["bytes_per_message"] = round((sink.tell() - start) / args.messages)
+    report["speedup"] = round(report["queued"]["messages_per_s"] / report["sync"]["messages_per_s"], 2)
+
+    # Undo setup_logging so the next scenario starts from the stock logging module
+    root.handlers = []
+    logging._srcfile = os.path.normcase(logging.addLevelName.__code__.co_filename)
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = True
+    return report
+
+
+def run(args) -> dict:
+    sink_path = args.sink or tempfile.mktemp(suffix=".log")
+    report = {}
+    with open(sink_path, "a", encoding="utf-8") as f:
+        report["fast_sink"] = scenario(f, args)
+        report["slow_sink"] = scenario(SlowSink(f, args.write_latency_us / 1e6), args)
+    if not args.sink:
+        os.unlink(sink_path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sink", default=None, help="file the log output goes to (default: a temp file)")
+    parser.add_argument("--write-latency-us", type=float, default=200, help="blocking time per flush in the slow-sink scenario")
+    args = parser.parse_args()
+    report = run(args)
+    sys.stdout.write(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Cost of the sampling profiler and what slow-request mode keeps.
+
+    python -m benchmarks.profiler_overhead [--seconds 2] [--rounds 3] [--threads 8]
+
+"overhead" runs batches of short tasks (a few awaits and a small JSON encode
+each) for --seconds with --threads idle pool threads around, unprofiled,
+under an on-demand profile at 5ms and under the slow-request sampler at
+20ms, and reports the throughput cost of each along with the cost of one sample of
+every thread's stack, which bounds the overhead when the machine is noisy. "slow_request" runs traced messages of
+which one in fifty burns CPU in a helper, and reports what the kept profile
+attributes the time to.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils import profiler
+from app.utils.tracing import TraceRing, start_trace, trace_buffer
+
+DOC = {"_id": "64b7f0c2e1a4000000000001", "text": "hello", "tags": ["a", "b"], "count": 3}
+
+
+async def workload(seconds: float) -> float:
+    """Tasks per second completed over `seconds`."""
+    async def one(i):
+        await asyncio.sleep(0)
+        body = json.dumps(dict(DOC, count=i))
+        await asyncio.sleep(0)
+        return body
+
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        await asyncio.gather(*(one(i) for i in range(1000)))
+        done += 1000
+    return done / (time.perf_counter() - started)
+
+
+def build_prompt_slowly(ms: float) -> int:
+    # Stands in for an expensive serialize/prompt-building pass on the loop
+    deadline = time.perf_counter() + ms / 1000
+    n = 0
+    while time.perf_counter() < deadline:
+        n += len(json.dumps(DOC))
+    return n
+
+
+async def overhead(seconds: float, rounds: int) -> dict:
+    # Alternate the modes and keep the best of each so machine noise doesn't swamp the difference
+    bare = on_demand = slow = 0.0
+    loop = asyncio.get_running_loop()
+    for _ in range(rounds):
+        bare = max(bare, await workload(seconds))
+
+        run = loop.run_in_executor(None, profiler.profile, seconds, 0.005)
+        on_demand = max(on_demand, await workload(seconds))
+        samples = (await run).samples
+
+        sampler = profiler.SlowRequestProfiler(TraceRing(16), threshold_ms=1000, interval_ms=20)
+        sampler.start()
+        slow = max(slow, await workload(seconds))
+        sampler.stop()
+    names, me = profiler._ThreadNames(), threading.get_ident()
+    started = time.perf_counter()
+    for _ in range(2000):
+        profiler.take_sample(names, me)
+    sample_us = 1e6 * (time.perf_counter() - started) / 2000
+
+    pct = lambda rate: round(100 * (bare - rate) / bare, 2)
+    return {
+        "sample_us": round(sample_us, 1),
+        "tasks_per_s": round(bare),
+        "on_demand_5ms_overhead_pct": pct(on_demand),
+        "on_demand_samples": samples,
+        "slow_mode_20ms_overhead_pct": pct(slow),
+    }
+
+
+async def slow_request(messages: int) -> dict:
+    sampler = profiler.SlowRequestProfiler(trace_buffer, threshold_ms=100, interval_ms=5)
+    sampler.start()
+    for i in range(messages):
+        with start_trace("whatsapp.message", message_id=f"wamid.{i}"):
+            await asyncio.sleep(0.005)
+            if i % 50 == 49:
+                build_prompt_slowly(150)
+    await asyncio.sleep(0.6)
+    sampler.stop()
+    summary = sampler.summary()
+    report = {"messages": messages, "profiles_kept": len(summary["profiles"])}
+    if summary["profiles"]:
+        kept = sampler.find(summary["profiles"][0]["trace_id"])
+        detail = kept["profile"].to_dict(limit=3)
+        hottest = kept["profile"].collapsed().splitlines()[0]
+        report.update(
+            duration_ms=kept["duration_ms"], samples=detail["samples"], top_self_ms=detail["top_self_ms"],
+            hottest_stack=";".join(hottest.split(";")[-4:]),
+        )
+    return report
+
+
+async def run(args) -> dict:
+    pool = ThreadPoolExecutor(max_workers=args.threads, thread_name_prefix="idle")
+    barrier = threading.Event()
+    for _ in range(args.threads):
+        pool.submit(barrier.wait)
+    try:
+        return {"overhead": await overhead(args.seconds, args.rounds), "slow_request": await slow_request(200)}
+    finally:
+        barrier.set()
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="length of each measurement")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=8, help="idle pool threads whose stacks are sampled too")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
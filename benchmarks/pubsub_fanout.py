@@ -0,0 +1,85 @@
+"""Memory and publish cost with thousands of idle dashboard subscribers.
+
+    python -m benchmarks.pubsub_fanout [--subscribers 5000] [--tenants 50] [--events 200]
+
+Each subscriber is a task blocked on its buffer, like an idle SSE connection.
+Reports memory per subscriber, publish() time and end-to-end delivery latency.
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+from app.utils.pubsub import Broker
+
+
+async def run(args) -> dict:
+    broker = Broker(buffer_size=args.buffer)
+    received = 0
+    latencies = []
+
+    async def consumer(sub):
+        nonlocal received
+        while True:
+            event = await sub.next(timeout=3600)
+            if event is None:
+                return
+            received += 1
+            latencies.append(time.perf_counter() - event[0])
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    subs = [broker.subscribe(f"tenant-{i % args.tenants}") for i in range(args.subscribers)]
+    tasks = [asyncio.create_task(consumer(s)) for s in subs]
+    await asyncio.sleep(0.1)  # let every consumer block
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    publish_times = []
+    for n in range(args.events):
+        frame = b"event: message\ndata: {}\n\n"
+        started = time.perf_counter()
+        broker.publish(f"tenant-{n % args.tenants}", (started, frame))
+        publish_times.append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.2)
+
+    # Idle publish to a tenant with no subscribers should be ~free
+    started = time.perf_counter()
+    for _ in range(10000):
+        broker.publish("tenant-none", b"")
+    idle_publish_us = 1e6 * (time.perf_counter() - started) / 10000
+
+    broker.close_all()
+    await asyncio.gather(*tasks)
+
+    publish_times.sort()
+    latencies.sort()
+    per_topic = args.subscribers // args.tenants
+    return {
+        "subscribers": args.subscribers,
+        "subscribers_per_tenant": per_topic,
+        "memory_per_subscriber_bytes": round((after - before) / args.subscribers),
+        "publish_p50_us": round(1e6 * publish_times[len(publish_times) // 2], 1),
+        "publish_p99_us": round(1e6 * publish_times[int(len(publish_times) * 0.99)], 1),
+        "delivery_p50_ms": round(1000 * latencies[len(latencies) // 2], 3) if latencies else None,
+        "delivery_p99_ms": round(1000 * latencies[int(len(latencies) * 0.99)], 3) if latencies else None,
+        "delivered": received,
+        "expected": args.events * per_topic,
+        "publish_no_subscribers_us": round(idle_publish_us, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--buffer", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Search latency at millions of messages against a real MongoDB.
+
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.search_latency --messages 2000000 --tenants 20
+
+Seeds a scratch database (BENCH_DB_NAME, default whatsapp_ai_bench) with
+synthetic Hinglish/Devanagari/English traffic, builds the search index and
+times the same aggregation the /tenants/{tenant_id}/search endpoint runs.
+Use --skip-seed to rerun queries against an existing dataset.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DB_NAME", os.getenv("BENCH_DB_NAME", "whatsapp_ai_bench"))
+
+from bson.objectid import ObjectId
+
+from app.db import mongo_connection
+from app.services import search
+from app.utils.text import tokenize
+
+PHRASES = [
+    "2 litre mustard oil ka price kya hai",
+    "basmati rice 5kg available hai kya",
+    "cash on delivery milega",
+    "order kab tak deliver hoga sector 15 me",
+    "मुझे 10 किलो आटा चाहिए",
+    "सरसों तेल का दाम क्या है",
+    "refund chahiye product damaged tha",
+    "do you deliver in gurgaon today",
+    "paneer aur dahi fresh hai?",
+    "invoice with gst bhej dijiye",
+    "chawal ka rate kam karo bhaiya",
+    "kal subah 9 baje tak bhej dena",
+]
+QUERIES = ["mustard oil price", "basmati", "सरसों तेल", "delivery sector 15", "refund damaged", "gst invoice", "paneer"]
+
+
+async def seed(args, tenants):
+    coll = mongo_connection.messages_collection
+    await coll.drop()
+    await mongo_connection.ensure_indexes()
+    now = datetime.now()
+    batch, inserted = [], 0
+    for i in range(args.messages):
+        text = f"{random.choice(PHRASES)} {random.choice(PHRASES)} #{i}"
+        batch.append({
+            "tenant_id": tenants[i % len(tenants)],
+            "conversation_id": ObjectId(),
+            "contact_id": ObjectId(),
+            "direction": "inbound",
+            "wa_type": "text",
+            "content": {"text": text},
+            "search_tokens": tokenize(text),
+            "status": "received",
+            "created_at": now - timedelta(seconds=args.messages - i),
+        })
+        if len(batch) >= 10000:
+            await coll.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+            print(f"seeded {inserted:,}", end="\r", flush=True)
+    if batch:
+        await coll.insert_many(batch, ordered=False)
+    print()
+
+
+async def run(args) -> dict:
+    tenants_coll = mongo_connection.db["bench_tenants"]
+    if args.skip_seed:
+        tenants = [t["_id"] async for t in tenants_coll.find({}, {"_id": 1})]
+    else:
+        await tenants_coll.drop()
+        tenants = [ObjectId() for _ in range(args.tenants)]
+        await tenants_coll.insert_many([{"_id": t} for t in tenants])
+        await seed(args, tenants)
+
+    timings = {}
+    for q in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            tenant_id = random.choice(tenants)
+            started = time.perf_counter()
+            result = await search.search_messages(tenant_id, q, limit=20)
+            samples.append(time.perf_counter() - started)
+            if result["next_cursor"]:
+                started = time.perf_counter()
+                await search.search_messages(tenant_id, q, limit=20, cursor=result["next_cursor"])
+                samples.append(time.perf_counter() - started)
+        samples.sort()
+        timings[q] = {
+            "p50_ms": round(1000 * samples[len(samples) // 2], 2),
+            "p95_ms": round(1000 * samples[int(len(samples) * 0.95)], 2),
+        }
+    return {"messages": await mongo_connection.messages_collection.estimated_document_count(), "tenants": len(tenants), "queries": timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Rows/sec of the list-endpoint serialization paths on 1k-row message pages.
+
+    python -m benchmarks.serialization [--rows 1000] [--repeat 50]
+
+Compares:
+  * serialize_doc + json.dumps (the previous route code path)
+  * serialize_doc + FastAPI jsonable_encoder + json.dumps (what FastAPI adds for plain return values)
+  * rename_ids + dumps (FastJSONResponse, orjson when installed)
+"""
+import argparse
+import copy
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from app.utils.helpers import serialize_doc, rename_ids, dumps, orjson
+
+
+def make_page(rows: int):
+    tenant_id, conv_id, contact_id = ObjectId(), ObjectId(), ObjectId()
+    now = datetime.now()
+    page = []
+    for i in range(rows):
+        outbound = i % 2 == 1
+        doc = {
+            "_id": ObjectId(),
+            "tenant_id": tenant_id,
+            "conversation_id": conv_id,
+            "contact_id": contact_id,
+            "direction": "outbound" if outbound else "inbound",
+            "wa_type": "text",
+            "channel": "whatsapp",
+            "content": {"text": "2 litre mustard oil ka price kya hai? " * 3},
+            "status": "sent" if outbound else "received",
+            "created_at": now - timedelta(seconds=i),
+        }
+        if outbound:
+            doc["ai"] = {
+                "model": "llama3-70b-8192",
+                "route_reason": "default",
+                "routing": {"hint": "general", "length": 114, "queue_depth": 0, "budget_s": 11.2},
+                "usage": {"prompt_tokens": 812, "completion_tokens": 64, "total_tokens": 876, "cached_tokens": 0},
+                "latency_ms": 912.4,
+                "cache_hit": False,
+                "error": None,
+            }
+        else:
+            doc["wa_message_id"] = f"wamid.{i:020d}"
+            doc["wa_timestamp"] = now - timedelta(seconds=i)
+        page.append(doc)
+    return page
+
+
+def bench(name, fn, page, repeat):
+    pages = [copy.deepcopy(page) for _ in range(repeat)]  # rename_ids mutates
+    started = time.perf_counter()
+    size = 0
+    for p in pages:
+        size = len(fn(p))
+    elapsed = time.perf_counter() - started
+    rows_per_sec = len(page) * repeat / elapsed
+    print(f"{name:<44} {rows_per_sec:>12,.0f} rows/s  {1000 * elapsed / repeat:8.2f} ms/page  {size:>9,} bytes")
+    return rows_per_sec
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    page = make_page(args.rows)
+    print(f"encoder: {'orjson' if orjson else 'stdlib json'}")
+    baseline = bench("serialize_doc + json.dumps", lambda p: json.dumps([serialize_doc(d) for d in p]).encode(), page, args.repeat)
+    try:
+        from fastapi.encoders import jsonable_encoder
+        bench("serialize_doc + jsonable_encoder + json.dumps", lambda p: json.dumps(jsonable_encoder([serialize_doc(d) for d in p])).encode(), page, args.repeat)
+    except ImportError:
+        pass
+    fast = bench("rename_ids + dumps", lambda p: dumps(rename_ids(p)), page, args.repeat)
+    print(f"speedup vs serialize_doc + json.dumps: {fast / baseline:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
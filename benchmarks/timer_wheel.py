@@ -0,0 +1,87 @@
+"""Insert / cancel / expire cost of the timer wheel with millions of pending timers.
+
+    python -m benchmarks.timer_wheel [--timers 1000000] [--horizon 21600]
+
+Arms --timers timers spread over the horizon (the in-memory window the timer
+service keeps), reschedules and cancels a share of them like session
+extensions and cancelled follow-ups do, then advances the wheel through the
+whole horizon and reports per-operation cost, memory and firing lateness.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from app.utils.timer_wheel import TimerWheel
+
+
+def run(args) -> dict:
+    rng = random.Random(5)
+    start = 1_700_000_000.0
+    dues = [start + rng.uniform(0, args.horizon) for _ in range(args.timers)]
+
+    sample = min(args.timers, 200_000)
+    tracemalloc.start()
+    probe = TimerWheel(tick=1.0, now=start)
+    for i in range(sample):
+        probe.schedule(i, dues[i])
+    bytes_per_timer = tracemalloc.get_traced_memory()[0] / sample
+    tracemalloc.stop()
+    del probe
+
+    wheel = TimerWheel(tick=1.0, now=start)
+    started = time.perf_counter()
+    for i, due in enumerate(dues):
+        wheel.schedule(i, due)
+    insert_s = time.perf_counter() - started
+
+    moved = rng.sample(range(args.timers), args.timers // 10)
+    started = time.perf_counter()
+    for i in moved:
+        dues[i] = min(dues[i] + rng.uniform(0, 3600), start + args.horizon)
+        wheel.schedule(i, dues[i])
+    reschedule_s = time.perf_counter() - started
+
+    cancelled = rng.sample(range(args.timers), args.timers // 10)
+    started = time.perf_counter()
+    for i in cancelled:
+        wheel.cancel(i)
+    cancel_s = time.perf_counter() - started
+    expected = args.timers - len(set(cancelled))
+
+    fired, worst_late, advance_s = 0, 0.0, 0.0
+    now = start
+    while now < start + args.horizon + 2:
+        now += 1.0
+        t0 = time.perf_counter()
+        due = wheel.advance(now)
+        advance_s += time.perf_counter() - t0
+        fired += len(due)
+        for timer in due:
+            worst_late = max(worst_late, now - timer.due)
+
+    return {
+        "timers": args.timers,
+        "insert_ns": round(1e9 * insert_s / args.timers),
+        "reschedule_ns": round(1e9 * reschedule_s / len(moved)),
+        "cancel_ns": round(1e9 * cancel_s / len(cancelled)),
+        "bytes_per_timer": round(bytes_per_timer),
+        "advance_us_per_tick": round(1e6 * advance_s / args.horizon, 1),
+        "expire_ns_per_timer": round(1e9 * advance_s / max(fired, 1)),
+        "fired": fired,
+        "expected": expected,
+        "worst_lateness_s": round(worst_late, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timers", type=int, default=1_000_000)
+    parser.add_argument("--horizon", type=int, default=6 * 3600, help="seconds of timers held in memory")
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""End-to-end webhook benchmark: multi-tenant traffic through POST /webhook to the fake upstreams.
+
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.webhook_e2e --rate 50 --duration 30 \\
+        [--save benchmarks/baselines/local.json] [--compare benchmarks/baselines/local.json]
+
+Needs a MongoDB; everything goes to a scratch database (BENCH_DB_NAME,
+default whatsapp_ai_bench) that is dropped first. Groq and the Graph API are
+the fakes from benchmarks/fakes, started in-process; the app is driven
+in-process through httpx's ASGI transport, with its lifespan run as the
+server would.
+
+Traffic: --tenants tenants with --senders customers each. Webhooks arrive
+as a Poisson process at --rate messages/s. Some senders fire a burst of
+messages at once (--burst-prob), and one delivery can carry several
+messages (--batch-max). Meta's retries resend a message already delivered
+(--dup-rate), and delivery/read status callbacks with no message are mixed
+in (--status-rate).
+
+Reply latency is measured per message, from posting the webhook to the
+fake Graph API receiving the reply to that sender. Besides throughput and
+latency percentiles the report has Mongo commands per message (from the
+query accounting listener), upstream calls, errors and process memory.
+--save writes the report as a JSON baseline; --compare prints the change
+against one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import AsyncExitStack
+from datetime import datetime
+
+from benchmarks.fakes import graph, groq
+
+PHRASES = [
+    "Hi, is the blue kurta available in size M?",
+    "What is the price of 2 litre mustard oil",
+    "cash on delivery milega?",
+    "order kab tak deliver hoga sector 15 me",
+    "Do you deliver to 560001 today",
+    "I want to return the shoes, they are too small",
+    "send me the invoice with gst please",
+    "store timings kya hai sunday ko",
+]
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return 0.0
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _percentiles(samples) -> dict:
+    from app.services.scheduler import _percentile
+    return {f"p{q}_ms": round(1000 * _percentile(samples, q / 100), 1) for q in (50, 95, 99)}
+
+
+class Traffic:
+    """Seeded generator of webhook bodies shaped like Meta's deliveries."""
+
+    def __init__(self, args, tenants):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.tenants = tenants
+        self.seq = 0
+        self.delivered = deque(maxlen=1000)
+
+    def _message(self, sender: str) -> dict:
+        self.seq += 1
+        message = {
+            "from": sender,
+            "id": f"wamid.BENCH{self.seq:012d}",
+            "timestamp": str(int(time.time())),
+            "type": "text",
+            "text": {"body": f"{self.rng.choice(PHRASES)} #{self.seq}"},
+        }
+        return message
+
+    def _body(self, phone_number_id: str, messages=None, statuses=None) -> dict:
+        value = {"messaging_product": "whatsapp", "metadata": {"phone_number_id": phone_number_id}}
+        if messages:
+            value["messages"] = messages
+            value["contacts"] = [{"wa_id": m["from"], "profile": {"name": "Bench"}} for m in messages]
+        if statuses:
+            value["statuses"] = statuses
+        return {"object": "whatsapp_business_account", "entry": [{"id": "bench", "changes": [{"field": "messages", "value": value}]}]}
+
+    def next(self):
+        """(webhook body, messages in it, kind: "messages", "duplicate" or "status")."""
+        rng, args = self.rng, self.args
+        phone_number_id = rng.choice(self.tenants)
+        roll = rng.random()
+        if roll < args.status_rate:
+            status = {"id": f"wamid.BENCH{rng.randint(1, max(1, self.seq)):012d}", "status": rng.choice(("delivered", "read")),
+                      "timestamp": str(int(time.time())), "recipient_id": "bench"}
+            return self._body(phone_number_id, statuses=[status]), [], "status"
+        if roll < args.status_rate + args.dup_rate and self.delivered:
+            phone_number_id, message = rng.choice(self.delivered)
+            return self._body(phone_number_id, messages=[dict(message)]), [message], "duplicate"
+        sender = f"91{phone_number_id[-4:]}{rng.randrange(args.senders):06d}"
+        count = rng.randint(3, 5) if rng.random() < args.burst_prob else rng.randint(1, args.batch_max)
+        messages = [self._message(sender) for _ in range(count)]
+        self.delivered.extend((phone_number_id, m) for m in messages)
+        return self._body(phone_number_id, messages=messages), messages, "messages"
+
+
+async def seed_tenants(mongo_connection, count: int):
+    await mongo_connection.client.drop_database(mongo_connection.DB_NAME)
+    await mongo_connection.ensure_indexes()
+    tenants = [f"10{i:013d}" for i in range(count)]
+    await mongo_connection.tenants_collection.insert_many([{
+        "slug": f"bench-{i}",
+        "name": f"Bench tenant {i}",
+        "phone_number_id": pn,
+        "phone_hash": f"bench-hash-{i}",
+        "access_token": "fake-token",
+        "settings": {},
+        "created_at": datetime.now(),
+    } for i, pn in enumerate(tenants)])
+    return tenants
+
+
+async def run(args) -> dict:
+    groq_server = await groq.create(args.groq_latency, args.groq_error_rate, args.groq_rpm, seed=args.seed).start()
+    graph_server = await graph.create(args.graph_latency, args.graph_error_rate, seed=args.seed).start()
+
+    # The app reads its configuration at import time
+    os.environ["DB_NAME"] = os.getenv("BENCH_DB_NAME", "whatsapp_ai_bench")
+    os.environ.update({
+        "GROQ_API_URL": f"{groq_server.url}{groq.PATH}",
+        "GROQ_API_KEY": "fake-key",
+        "WHATSAPP_API_URL": f"{graph_server.url}/v19.0",
+        "WHATSAPP_TOKEN": "fake-token",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    })
+    if "bench" not in os.environ["DB_NAME"] and not args.force:
+        raise SystemExit(f"Refusing to drop database {os.environ['DB_NAME']!r}; use a *bench* name or --force")
+
+    import httpx
+    from app import main as app_main
+    from app.db import mongo_connection
+    from app.utils.query_accounting import MONGO_COMMANDS
+
+    tenants = await seed_tenants(mongo_connection, args.tenants)
+    # Run the app's lifespan as the server would
+    lifespan = AsyncExitStack()
+    await lifespan.enter_async_context(app_main.lifespan(app_main.app))
+
+    # sender -> (post time, kind) of each message still waiting for its reply, oldest first
+    pending = defaultdict(deque)
+    latencies = []
+    replies = defaultdict(int)
+
+    def on_reply(record):
+        queue = pending.get(record["to"])
+        if not queue:
+            replies["unmatched"] += 1
+            return
+        posted, kind = queue.popleft()
+        replies[kind] += 1
+        if kind == "measured":
+            latencies.append(record["at"] - posted)
+
+    graph_server.handler.on_send = on_reply
+    traffic = Traffic(args, tenants)
+    statuses = defaultdict(int)
+    kinds = defaultdict(int)
+    transport = httpx.ASGITransport(app=app_main.app)
+    tasks = set()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+        async def post(body, messages, kind):
+            posted = time.time()
+            for m in messages:
+                pending[m["from"]].append((posted, kind))
+            try:
+                response = await client.post("/webhook", json=body)
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+
+        rng = random.Random(args.seed + 1)
+        total = int(args.rate * args.duration)
+        sent_messages = measured_messages = 0
+        measuring = False
+        started = next_at = time.perf_counter()
+        while sent_messages < args.warmup + total:
+            if not measuring and sent_messages >= args.warmup:
+                measuring = True
+                mongo_before = sum(MONGO_COMMANDS._series.values())
+                rss_before = _rss_mb()
+                started = time.perf_counter()
+            body, messages, kind = traffic.next()
+            if measuring:
+                kinds[kind] += 1
+                if kind == "messages":
+                    measured_messages += len(messages)
+            sent_messages += max(1, len(messages))
+            tag = "duplicate" if kind == "duplicate" else ("measured" if measuring else "warmup")
+            task = asyncio.create_task(post(body, messages, tag))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_at += rng.expovariate(args.rate / max(1, len(messages)))
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        offered = time.perf_counter() - started
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    mongo_commands = sum(MONGO_COMMANDS._series.values()) - mongo_before
+    await lifespan.aclose()
+    await groq_server.stop()
+    await graph_server.stop()
+
+    return {
+        "commit": _git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("save", "compare", "force")},
+        "messages": measured_messages,
+        "webhooks": dict(kinds),
+        "offered_per_s": round(measured_messages / offered, 1) if offered else None,
+        "messages_per_s": round(measured_messages / elapsed, 1),
+        "replies": dict(replies),
+        "reply_latency": _percentiles(latencies),
+        "http_statuses": {str(k): v for k, v in statuses.items()},
+        "mongo_commands_per_message": round(mongo_commands / measured_messages, 2) if measured_messages else None,
+        "groq_calls": dict(groq_server.stats),
+        "graph_sends": dict(graph_server.stats),
+        "rss_mb": {"before": round(rss_before, 1), "after": round(_rss_mb(), 1), "peak": round(_peak_rss_mb(), 1)},
+    }
+
+
+# Metrics compared against a baseline, and which direction is better
+_COMPARED = {
+    "messages_per_s": "higher",
+    "reply_latency.p50_ms": "lower",
+    "reply_latency.p95_ms": "lower",
+    "reply_latency.p99_ms": "lower",
+    "mongo_commands_per_message": "lower",
+    "rss_mb.peak": "lower",
+}
+
+
+def _lookup(report: dict, dotted: str):
+    value = report
+    for part in dotted.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    changes = {}
+    for key, better in _COMPARED.items():
+        new, old = _lookup(report, key), _lookup(baseline, key)
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        pct = 100 * (new - old) / old
+        changes[key] = {"baseline": old, "now": new, "change_pct": round(pct, 1),
+                        "verdict": "same" if abs(pct) < 5 else ("better" if (pct > 0) == (better == "higher") else "worse")}
+    return {"baseline_commit": baseline.get("commit"), "changes": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=50, help="messages per second offered")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured traffic")
+    parser.add_argument("--warmup", type=int, default=100, help="messages sent before measuring")
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--senders", type=int, default=500, help="customers per tenant")
+    parser.add_argument("--burst-prob", type=float, default=0.05)
+    parser.add_argument("--batch-max", type=int, default=2, help="messages per webhook delivery, up to")
+    parser.add_argument("--dup-rate", type=float, default=0.02)
+    parser.add_argument("--status-rate", type=float, default=0.3)
+    parser.add_argument("--groq-latency", default="lognormal:300,1500")
+    parser.add_argument("--groq-error-rate", type=float, default=0.0)
+    parser.add_argument("--groq-rpm", type=float, default=0.0)
+    parser.add_argument("--graph-latency", default="lognormal:80,400")
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the report to this JSON file (a baseline)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--force", action="store_true", help="allow a DB_NAME without 'bench' in it (it is dropped)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in report.items() if k != "comparison"}, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()